@@ -0,0 +1,115 @@
+"""Сравнение потоковых перцентилей стакана с прежним расчётом по истории снимков.
+
+Запуск: python -m benchmarks.bench_order_book_settings [--ticks 2000] [--levels 500]
+"""
+import argparse
+import random
+import time
+import numpy as np
+
+from modules.order_book import OrderBook
+from modules.streaming_stats import OrderBookPercentiles
+
+
+def legacy_settings(history, book, depth=100):
+    """Прежний алгоритм: история полных снимков + np.percentile по всем уровням"""
+    history.append(book.snapshot())
+    if len(history) > depth:
+        del history[:-depth]
+    bid_volumes = []
+    ask_volumes = []
+    all_bid_orders = []
+    all_ask_orders = []
+    for ob in history:
+        bids = ob['bids']
+        asks = ob['asks']
+        bid_volumes.append(sum([price * amount for price, amount in bids]))
+        ask_volumes.append(sum([price * amount for price, amount in asks]))
+        all_bid_orders += [price * amount for price, amount in bids]
+        all_ask_orders += [price * amount for price, amount in asks]
+    return {
+        'CLUSTER_THRESHOLD': np.percentile(all_bid_orders + all_ask_orders, 90),
+        'WALL_THRESHOLD': np.percentile(all_bid_orders + all_ask_orders, 99),
+        'RATIO_MIN': np.percentile([b / a for b, a in zip(bid_volumes, ask_volumes) if a > 0], 50),
+    }
+
+
+def random_qty(rng):
+    # Объёмы уровней распределены лог-нормально, изредка встречаются "стены"
+    qty = rng.lognormvariate(2.0, 1.2)
+    if rng.random() < 0.01:
+        qty *= 50
+    return round(qty, 3)
+
+
+def generate_diffs(ticks, levels, changes_per_tick, seed=1):
+    """Синтетический поток diff-событий в стиле @depth@100ms"""
+    rng = random.Random(seed)
+    tick_size = 0.01
+    mid = 150.0
+    snapshot_bids = [[round(mid - tick_size * (i + 1), 2), random_qty(rng)] for i in range(levels)]
+    snapshot_asks = [[round(mid + tick_size * (i + 1), 2), random_qty(rng)] for i in range(levels)]
+    diffs = []
+    update_id = 1
+    for _ in range(ticks):
+        mid += rng.gauss(0, tick_size)
+        bids, asks = [], []
+        for _ in range(changes_per_tick):
+            offset = tick_size * (int(rng.expovariate(0.05)) + 1)
+            qty = 0.0 if rng.random() < 0.3 else random_qty(rng)
+            if rng.random() < 0.5:
+                bids.append([round(mid - offset, 2), qty])
+            else:
+                asks.append([round(mid + offset, 2), qty])
+        diffs.append((update_id + 1, update_id + len(bids) + len(asks), None, bids, asks))
+        update_id += len(bids) + len(asks)
+    return (1, snapshot_bids, snapshot_asks), diffs
+
+
+def run(ticks, levels, changes_per_tick, window):
+    snapshot, diffs = generate_diffs(ticks, levels, changes_per_tick)
+
+    book = OrderBook('BENCH')
+    book.load_snapshot(*snapshot)
+    history = []
+    legacy = []
+    start = time.perf_counter()
+    for diff in diffs:
+        book.apply_diff(*diff)
+        legacy.append(legacy_settings(history, book, depth=window))
+    legacy_time = time.perf_counter() - start
+
+    book = OrderBook('BENCH')
+    stats = OrderBookPercentiles(window=window)
+    stats.update(book.load_snapshot(*snapshot))
+    streaming = []
+    start = time.perf_counter()
+    for diff in diffs:
+        streaming.append(stats.update(book.apply_diff(*diff)))
+    streaming_time = time.perf_counter() - start
+
+    print(f"Тиков: {ticks}, уровней на сторону: {levels}, изменений за тик: {changes_per_tick}, окно: {window}")
+    print(f"{'метод':<12}{'всего, с':>12}{'на тик, мкс':>16}")
+    print(f"{'legacy':<12}{legacy_time:>12.3f}{legacy_time / ticks * 1e6:>16.1f}")
+    print(f"{'streaming':<12}{streaming_time:>12.3f}{streaming_time / ticks * 1e6:>16.1f}")
+    print(f"Ускорение: x{legacy_time / streaming_time:.1f}")
+
+    # Сравниваем после прогрева окна
+    print(f"{'порог':<20}{'медиана отн. ошибки':>22}{'p95 отн. ошибки':>18}")
+    for key in ('CLUSTER_THRESHOLD', 'WALL_THRESHOLD', 'RATIO_MIN'):
+        errors = [
+            abs(s[key] - l[key]) / abs(l[key])
+            for s, l in zip(streaming[window:], legacy[window:])
+            if s[key] is not None and l[key]
+        ]
+        print(f"{key:<20}{np.median(errors):>22.4f}{np.percentile(errors, 95):>18.4f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ticks', type=int, default=2000)
+    parser.add_argument('--levels', type=int, default=500)
+    parser.add_argument('--changes', type=int, default=20)
+    parser.add_argument('--window', type=int, default=100)
+    args = parser.parse_args()
+    run(args.ticks, args.levels, args.changes, args.window)
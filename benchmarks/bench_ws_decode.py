@@ -0,0 +1,100 @@
+"""Скорость разбора сообщений @depth: json + списки float против MessageDecoder.
+
+Запуск: python -m benchmarks.bench_ws_decode [--capture messages.txt] [--messages 20000]
+
+--capture — файл с записанными сообщениями combined-потока Binance, по одному
+на строку; без него сообщения синтезируются в том же формате. Замер идёт в
+одном потоке, поэтому сообщений в секунду — это пропускная способность ядра.
+"""
+import argparse
+import json
+import random
+import time
+import numpy as np
+
+from benchmarks.bench_order_book_settings import generate_diffs
+from modules.ws_decoder import MessageDecoder, msgspec, orjson
+
+
+def synthetic_messages(count, changes_per_tick, futures=False, seed=1):
+    """Сообщения combined-потока в формате Binance (цены и объёмы — строки)"""
+    _, diffs = generate_diffs(count, 500, changes_per_tick, seed=seed)
+    rng = random.Random(seed)
+    event_time = 1700000000000
+    messages = []
+    for first_id, last_id, _, bids, asks in diffs:
+        event_time += 100
+        data = {'e': 'depthUpdate', 'E': event_time}
+        if futures:
+            data['T'] = event_time - rng.randint(1, 5)
+        data.update({'s': 'SOLUSDT', 'U': first_id, 'u': last_id})
+        if futures:
+            data['pu'] = first_id - 1
+        data['b'] = [[f"{price:.2f}", f"{qty:.3f}"] for price, qty in bids]
+        data['a'] = [[f"{price:.2f}", f"{qty:.3f}"] for price, qty in asks]
+        stream = 'solusdt@depth@100ms'
+        messages.append(json.dumps({'stream': stream, 'data': data}, separators=(',', ':')))
+    return messages
+
+
+def legacy_decode(raw):
+    """Прежний путь: json.loads, список [float, float] на каждый уровень и перевод
+    списков в массивы float64 — так их получает OrderBook"""
+    data = json.loads(raw)['data']
+    bids = [[float(price), float(qty)] for price, qty in data['b']]
+    asks = [[float(price), float(qty)] for price, qty in data['a']]
+    return data, np.asarray(bids, dtype=float), np.asarray(asks, dtype=float)
+
+
+def decoder_path(decoder):
+    """MessageDecoder; уровни в итоге — массивы float64, как их принимает OrderBook"""
+    def decode(raw):
+        data = decoder.decode(raw)['data']
+        return data, np.asarray(data['b'], dtype=float), np.asarray(data['a'], dtype=float)
+    return decode
+
+
+def measure(decode, messages, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for raw in messages:
+            decode(raw)
+        best = min(best, time.perf_counter() - start)
+    return len(messages) / best
+
+
+def run(messages):
+    levels = sum(len(json.loads(raw)['data']['b']) + len(json.loads(raw)['data']['a']) for raw in messages[:1000])
+    print(f"Сообщений: {len(messages)}, уровней в сообщении: {levels / min(len(messages), 1000):.1f}")
+    paths = [('json + list[float]', legacy_decode)]
+    names = ['json'] + (['orjson'] if orjson is not None else []) + (['msgspec'] if msgspec is not None else [])
+    for name in names:
+        decoder = MessageDecoder(name)
+        decoder.fast_depth = False
+        paths.append((f"{name} (целиком)", decoder_path(decoder)))
+        decoder = MessageDecoder(name)
+        decoder.fast_depth = True
+        paths.append((f"{name} + numpy уровни", decoder_path(decoder)))
+
+    baseline = None
+    print(f"{'путь':<26}{'сообщ./с на ядро':>18}{'мкс/сообщ.':>12}{'ускорение':>11}")
+    for name, decode in paths:
+        rate = measure(decode, messages)
+        baseline = baseline or rate
+        print(f"{name:<26}{rate:>18,.0f}{1e6 / rate:>12.2f}{rate / baseline:>10.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--capture', help='файл с записанными сообщениями, по одному на строку')
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--changes', type=int, default=20, help='уровней в синтетическом сообщении')
+    parser.add_argument('--futures', action='store_true', help='синтетические сообщения в формате USDⓈ-M (T, pu)')
+    args = parser.parse_args()
+    if args.capture:
+        with open(args.capture) as f:
+            captured = [line.strip() for line in f if '"depthUpdate"' in line]
+        run(captured)
+    else:
+        run(synthetic_messages(args.messages, args.changes, futures=args.futures))
@@ -5,6 +5,7 @@ class Config:
     TIMEFRAME = '5m'     # Таймфрейм для свечей
     RISK_PER_TRADE = 0.005  # Риск на сделку (0.5%)
     MAX_POSITIONS = 5     # Макс. одновременных позиций
+    POSITION_TIMEOUT = 900  # Макс. время удержания позиции, сек (15 минут)
     
     # Параметры стратегии
     VOLUME_RATIO = 2.0    # Минимальное отношение объема к среднему
@@ -14,6 +15,118 @@ class Config:
     EMA_LONG = 20         # Длинная EMA
     BTC_DOM_THRESHOLD = 65 # Макс. доминирование BTC
     FUND_RATE_THRESHOLD = -0.0001  # Минимальный фандинг для входа
+    STOP_LOSS_PCT = 0.008   # Стоп-лосс от цены входа (0.8%)
+    TAKE_PROFIT_PCT = 0.016 # Тейк-профит от цены входа (1.6%)
+
+    # WebSocket
+    WS_TRANSPORT = 'asyncio'         # asyncio — combined-соединения в одном event loop, threads — поток на пару
+    WS_STREAMS_PER_CONNECTION = 200  # Потоков на одно combined-соединение (лимит Binance — 1024)
+    WS_JSON_DECODER = 'auto'         # auto, orjson, msgspec, json
+    WS_FAST_DEPTH = True             # Уровни depthUpdate разбираются сразу в numpy, минуя JSON-списки (только с orjson/msgspec)
+    REST_WORKERS = 8                 # Потоков для параллельных REST-запросов
+    REST_WEIGHT_USAGE = 0.8          # Доля минутного лимита весов Binance, которую может занять бот
+    MAILBOX_SIZE = 2000              # Макс. событий в очереди пары; старые вытесняются (стакан пересинхронизируется)
+    MAILBOX_WORKERS = 4              # Потоков обработки очередей пар
+    MAILBOX_REPORT_INTERVAL = 60     # Сводка по очередям в лог, сек
+
+    # Локальный стакан
+    ORDER_BOOK_SNAPSHOT_LIMIT = 1000  # Глубина REST-снимка для синхронизации с diff-потоком
+    ORDER_BOOK_STATS_WINDOW = 100     # Окно затухания (в обновлениях) для перцентилей стакана
+    ORDER_BOOK_CAPACITY = 5000        # Макс. уровней на сторону; дальние уровни отбрасываются
+    ORDER_BOOK_HISTORY_SIZE = 100     # Снимков верхних уровней в истории стакана на пару
+    ORDER_BOOK_HISTORY_DEPTH = 20     # Уровней на сторону в снимке истории
+
+    # Свечи
+    OHLCV_LIMIT = 1000         # Макс. свечей в одном REST-запросе (страница истории)
+    OHLCV_BUFFER_SIZE = 500    # Размер кольцевого буфера свечей на пару
+    OHLCV_HISTORY_BARS = 1500  # Глубина истории для прогрева индикаторов при первом запуске
+    OHLCV_CACHE_DIR = 'data/ohlcv'  # Кэш закрытых свечей (<пара>/<таймфрейм>.bin); None — без кэша
+
+    # Цены
+    PRICE_MAX_STALENESS = 3.0  # Макс. возраст WebSocket-цены, сек; старше — запрос через REST
+
+    # Ордера
+    ORDER_WORKERS = 4             # Потоков отправки ордеров (отдельно от пула рыночных REST-запросов)
+    ORDER_BATCH_SIZE = 5          # Макс. ордеров в одном batchOrders (лимит Binance Futures — 5)
+    ORDER_ACK_TIMEOUT = 10        # Макс. ожидание подтверждения ордера биржей, сек
+    ORDER_ENTRY_TIMEOUT = 30      # Неисполненный остаток ордера входа отменяется через, сек
+    ORDER_HISTORY_SIZE = 1000     # Завершённых ордеров в памяти шлюза
+    USER_STREAM = True            # Статусы ордеров из user-data stream (listenKey)
+    USER_STREAM_KEEPALIVE = 1800  # Продление listenKey, сек (ключ живёт 60 минут)
+    ACCOUNT_RECONCILE_INTERVAL = 60  # Сверка балансов и позиций через REST, сек (между сверками — user-data stream)
+
+    # Запись тиков
+    TICK_RECORDING = False        # Записывать стакан, свечи и фандинг на диск
+    TICK_STORE_DIR = 'data/ticks' # Каталог хранилища (<пара>/<YYYYMMDD>/<тип>.bin)
+    TICK_FLUSH_INTERVAL = 1.0     # Период сброса файлов на диск, сек
+    TICK_QUEUE_SIZE = 100000      # Макс. событий в очереди записи; лишние отбрасываются
+
+    # Планировщик
+    SIGNAL_WORKERS = 2              # Потоков для проверки условий входа
+    POSITION_CHECK_INTERVAL = 5     # Проверка активных позиций, сек
+    BTC_DOMINANCE_INTERVAL = 300    # Обновление BTC доминирования, сек
+    FUNDING_UPDATE_INTERVAL = 1800  # Обновление ставок финансирования, сек
+    CALIBRATION_INTERVAL = 1800     # Перекалибровка параметров, сек
+    OHLCV_SEED_INTERVAL = 60        # Проверка пар без загруженных свечей, сек
+    OHLCV_CACHE_INTERVAL = 60       # Запись закрытых свечей в кэш на диске, сек
+    WARMUP_TIMEOUT = 15             # Макс. ожидание синхронизации стаканов при запуске, сек
+    SCREENER_INTERVAL = 60          # Полный скрининг пар со статистикой отказов, сек
+
+    # Логирование
+    LOG_LEVEL = 'INFO'         # DEBUG, INFO, WARNING, ERROR
+    LOG_FILE = None            # Файл JSON-строк (None — stdout)
+    LOG_RATE_LIMIT = 50        # Макс. записей в секунду на модуль, кроме ERROR (None — без лимита)
+    LOG_MODULES = {}           # Настройки модулей: {'Strategy': {'level': 'DEBUG', 'sample': 100, 'rate': 5}}
+    LOG_QUEUE_SIZE = 100000    # Макс. записей в очереди; при переполнении теряются старые
+    LOG_FLUSH_INTERVAL = 0.2   # Период записи очереди на диск, сек
+
+    # Шардирование по процессам
+    SHARDS = 0                  # Процессов с WebSocket и DataHandler для своей части пар (0/1 — один процесс)
+    SHARD_POLL_INTERVAL = 0.005 # Период проверки обновлений общей таблицы координатором, сек
+    SHARD_PARAMS_INTERVAL = 30  # Проверка файла параметров пар шардами (калибровку ведёт координатор), сек
+
+    # Снимок состояния (быстрый перезапуск)
+    STATE_FILE = 'data/state.pkl'  # Позиции, свечи, индикаторы, статистика стакана; None — без снимков
+    STATE_SNAPSHOT_INTERVAL = 10   # Период записи снимка, сек
+    STATE_MAX_AGE = 600            # Рыночные данные из более старого снимка не используются, сек
+
+    # Метрики
+    METRICS_PORT = 9108          # HTTP-эндпоинт /metrics в формате Prometheus (None — выключен)
+    METRICS_FILE = None          # Файл для textfile-коллектора, например 'data/metrics.prom' (None — не писать)
+    METRICS_FILE_INTERVAL = 15   # Период записи файла метрик, сек
+
+    # Бэктест
+    BACKTEST_INITIAL_BALANCE = 10000  # Стартовый баланс, USDT
+    BACKTEST_FEE_RATE = 0.001         # Комиссия тейкера (0.1%)
+    BACKTEST_SLIPPAGE_BPS = 2         # Проскальзывание рыночного исполнения, б.п.
+
+    # Бумажная торговля
+    PAPER_TRADING = False             # Ордера исполняет локальный движок, а не биржа
+    PAPER_OFFLINE = False             # Без сети: рыночные данные из TickReplayer
+    PAPER_BALANCES = {'USDT': 10000.0}  # Стартовые балансы бумажного счёта
+    PAPER_MAKER_FEE = 0.001           # Комиссия мейкера (0.1%)
+    PAPER_TAKER_FEE = 0.001           # Комиссия тейкера (0.1%)
+    PAPER_LATENCY_MS = 50             # Задержка от отправки ордера до попадания в движок, мс
+
+    # Оптимизация параметров
+    OPTIMIZER_METHOD = 'random'        # grid, random, bayes
+    OPTIMIZER_TRIALS = 200             # Наборов параметров для random и bayes
+    OPTIMIZER_WORKERS = 4              # Процессов для бэктестов
+    OPTIMIZER_HISTORY_DAYS = 7         # Глубина истории для калибровки, дней
+    OPTIMIZER_TRAIN_BARS = 1152        # Обучающее окно walk-forward (4 дня на 5m)
+    OPTIMIZER_TEST_BARS = 288          # Тестовое окно walk-forward (1 день на 5m)
+    OPTIMIZER_MIN_TRADES = 5           # Меньше сделок — набор параметров не оценивается
+    OPTIMIZER_LOG_LEVEL = 'WARNING'    # Уровень логов в процессах оптимизатора
+    OPTIMIZER_SPACE = {                # Значения параметров для перебора
+        'EMA_SHORT': [5, 8, 13],
+        'EMA_LONG': [20, 30, 50],
+        'ATR_PERIOD': [5, 10, 14],
+        'ATR_THRESHOLD': [0.002, 0.005, 0.01, 0.02, 0.03],
+        'VOLUME_RATIO': [1.5, 2.0, 2.5, 3.0],
+        'STOP_LOSS_PCT': [0.005, 0.008, 0.012],
+        'TAKE_PROFIT_PCT': [0.01, 0.016, 0.024],
+    }
+    SYMBOL_PARAMS_FILE = 'data/symbol_params.json'  # Параметры пар после калибровки
 
     
 
@@ -0,0 +1,190 @@
+import threading
+import time
+from config import Config
+from utils.logger import get_logger, DEBUG
+
+log = get_logger('AccountState')
+
+
+# ====================== Состояние аккаунта ======================
+class AccountState:
+    """Балансы, зарезервированные средства и открытая экспозиция аккаунта.
+
+    Начальное состояние и периодическая сверка — fetch_balance (и позиции на
+    фьючерсах) через REST, между сверками состояние обновляют события
+    user-data stream: outboundAccountPosition (спот) и ACCOUNT_UPDATE
+    (фьючерсы). Сверка не затирает активы, обновлённые потоком после начала
+    REST-запроса. equity() и available() считаются по локальным данным без
+    обращений к сети: цены — из price_service, без котировки — цена последнего
+    исполнения пары.
+
+    На фьючерсах ACCOUNT_UPDATE несёт только баланс кошелька: маржа позиций и
+    ордеров в нём не видна, поэтому свободные средства и маржа берутся из сверки,
+    а изменение кошелька с неё (PnL, комиссии, фандинг) учитывается в equity()
+    целиком, в available() — только уменьшение.
+    """
+    def __init__(self, exchange, price_service=None, quote='USDT'):
+        self.exchange = exchange
+        self.price_service = price_service
+        self.quote = quote
+        self.futures = exchange.rest.futures
+        self.free = {}        # актив -> свободно
+        self.locked = {}      # актив -> в ордерах (спот) или в марже позиций и ордеров (фьючерсы)
+        self.wallet = {}      # актив -> баланс кошелька, фьючерсы
+        self.reconciled_wallet = {}  # актив -> баланс кошелька на момент сверки, фьючерсы
+        self.positions = {}   # пара -> (количество со знаком, цена входа, нереализованный PnL), фьючерсы
+        self.last_prices = {} # пара -> цена последнего исполнения
+        self.reconciled = 0   # Время последней сверки через REST
+        # Пары бота по базовому активу (спот) и по id биржи (SOLUSDT в событиях фьючерсов)
+        self.symbols = {symbol.split('/')[0]: symbol for symbol in Config.SYMBOLS}
+        self.market_ids = {symbol.replace('/', ''): symbol for symbol in Config.SYMBOLS}
+        self._updated = {}    # актив или пара -> время события потока, мс
+        self._lock = threading.Lock()
+
+    # ---------- Сверка через REST ----------
+    def reconcile(self):
+        """Полное состояние через REST (при запуске, по таймеру и после переподключения потока)"""
+        started = time.time() * 1000
+        balance = self.exchange.rest.fetch_balance()
+        positions = self.exchange.rest.fetch_positions() if self.futures else ()
+        wallets = self._wallet_balances(balance) if self.futures else {}
+        with self._lock:
+            for asset, free in (balance.get('free') or {}).items():
+                if self._updated.get(asset, 0) < started:
+                    self.free[asset] = float(free or 0)
+                    self.locked[asset] = float((balance.get('used') or {}).get(asset) or 0)
+                    if asset in wallets:
+                        self.wallet[asset] = self.reconciled_wallet[asset] = wallets[asset]
+            if self.futures:
+                # Позиции, которых нет в ответе, закрыты
+                current = {position['symbol'].split(':')[0]: position for position in positions}
+                for symbol in set(self.positions) | set(current):
+                    if self._updated.get(symbol, 0) >= started:
+                        continue
+                    position = current.get(symbol, {})
+                    contracts = float(position.get('contracts') or 0)
+                    self._set_position(symbol, contracts if position.get('side') != 'short' else -contracts,
+                                       position.get('entryPrice'), position.get('unrealizedPnl'))
+        self.reconciled = time.time()
+        if log.enabled(DEBUG):
+            log.debug("Сверка аккаунта", equity=self.equity(), available=self.available())
+
+    @staticmethod
+    def _wallet_balances(balance):
+        """Балансы кошелька фьючерсов: walletBalance из ответа биржи, без него — total ccxt"""
+        assets = (balance.get('info') or {}).get('assets')
+        if isinstance(assets, list):
+            return {item['asset']: float(item['walletBalance']) for item in assets if 'walletBalance' in item}
+        return {asset: float(total or 0) for asset, total in (balance.get('total') or {}).items()}
+
+    def _set_position(self, symbol, amount, entry_price, unrealized):
+        if amount:
+            self.positions[symbol] = (amount, float(entry_price or 0), float(unrealized or 0))
+        else:
+            self.positions.pop(symbol, None)
+
+    # ---------- События user-data stream ----------
+    def on_account_position(self, event):
+        """outboundAccountPosition (спот, бумажный счёт): балансы изменившихся активов целиком"""
+        updated = event.get('u') or event.get('E', 0)
+        with self._lock:
+            for item in event['B']:
+                asset, free, locked = item['a'], float(item['f']), float(item['l'])
+                self.free[asset] = free
+                self.locked[asset] = locked
+                if asset in self.wallet:
+                    # Баланс актива известен полностью — изменений кошелька после сверки нет
+                    self.wallet[asset] = self.reconciled_wallet[asset] = free + locked
+                self._updated[asset] = updated
+
+    def on_account_update(self, event):
+        """ACCOUNT_UPDATE (фьючерсы): wb — баланс кошелька; свободные средства и маржа — из сверки"""
+        updated = event.get('E', 0)
+        data = event['a']
+        with self._lock:
+            for item in data.get('B', ()):
+                wallet = float(item['wb'])
+                self.wallet[item['a']] = wallet
+                self.reconciled_wallet.setdefault(item['a'], wallet)
+                self._updated[item['a']] = updated
+            for item in data.get('P', ()):
+                symbol = self.market_ids.get(item['s'])
+                if symbol is not None:
+                    self._set_position(symbol, float(item['pa']), item['ep'], item['up'])
+                    self._updated[symbol] = updated
+
+    def on_execution_report(self, event):
+        """Цена исполнения (спот, executionReport) — для оценки актива без котировки"""
+        symbol = self.market_ids.get(event['s'])
+        if symbol is not None and event.get('x') == 'TRADE':
+            self.last_prices[symbol] = float(event['L'])
+
+    def on_order_trade_update(self, event):
+        """Цена исполнения (фьючерсы, ORDER_TRADE_UPDATE)"""
+        data = event['o']
+        symbol = self.market_ids.get(data['s'])
+        if symbol is not None and data.get('x') == 'TRADE':
+            self.last_prices[symbol] = float(data['L'])
+
+    # ---------- Оценка ----------
+    def price(self, symbol):
+        """Mid локального стакана, без него — цена последнего исполнения"""
+        quote = self.price_service.get_local_quote(symbol) if self.price_service is not None else None
+        if quote is not None:
+            return quote['mid']
+        return self.last_prices.get(symbol)
+
+    def total(self, asset):
+        if asset in self.wallet:
+            return self.wallet[asset]
+        return self.free.get(asset, 0.0) + self.locked.get(asset, 0.0)
+
+    def _wallet_change(self, asset):
+        """Изменение баланса кошелька фьючерсов со сверки"""
+        if asset not in self.wallet:
+            return 0.0
+        return self.wallet[asset] - self.reconciled_wallet.get(asset, self.wallet[asset])
+
+    def available(self):
+        """Свободные средства в котируемой валюте — на них можно открыть позицию.
+
+        На фьючерсах — значение сверки за вычетом потерь кошелька после неё;
+        прибыль добавится со следующей сверкой.
+        """
+        with self._lock:
+            return self.free.get(self.quote, 0.0) + min(self._wallet_change(self.quote), 0.0)
+
+    def reserved(self):
+        """Средства в открытых ордерах (спот) или в марже позиций и ордеров (фьючерсы, по сверке)"""
+        return self.locked.get(self.quote, 0.0)
+
+    def exposure(self):
+        """Стоимость открытых позиций: базовые активы пар бота и позиции фьючерсов"""
+        with self._lock:
+            holdings = [(symbol, self.total(asset)) for asset, symbol in self.symbols.items() if self.total(asset)]
+            positions = list(self.positions.items())
+        value = 0.0
+        for symbol, amount in holdings:
+            price = self.price(symbol)
+            if price is not None:
+                value += amount * price
+        for symbol, (amount, entry_price, _) in positions:
+            price = self.price(symbol) or entry_price
+            value += abs(amount) * price
+        return value
+
+    def equity(self):
+        """Капитал: котируемая валюта, базовые активы пар бота по текущей цене и PnL позиций фьючерсов.
+
+        Активы без известной цены не учитываются — оценка получается заниженной, не завышенной.
+        """
+        with self._lock:
+            equity = self.total(self.quote)
+            holdings = [(symbol, self.total(asset)) for asset, symbol in self.symbols.items()
+                        if asset != self.quote and self.total(asset)]
+            unrealized = sum(position[2] for position in self.positions.values())
+        for symbol, amount in holdings:
+            price = self.price(symbol)
+            if price is not None:
+                equity += amount * price
+        return equity + unrealized
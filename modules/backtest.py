@@ -0,0 +1,400 @@
+import heapq
+import math
+import numpy as np
+from config import Config
+from modules.data_handler import DataHandler
+from modules.indicators import ema_array, atr_array, sma_array
+from modules.order_executor import OrderExecutor
+from modules.position_monitor import PositionMonitor
+from modules.price_service import PriceService
+from modules.risk_manager import RiskManager
+from modules.tick_store import TickReplayer
+from modules.traiding_strategy import TradingStrategy, evaluate_conditions
+from utils.helpers import timeframe_to_ms
+
+# ====================== Модель исполнения ======================
+class FillModel:
+    """Исполнение по лучшей цене с проскальзыванием и комиссией тейкера"""
+    def __init__(self, fee_rate=None, slippage_bps=None):
+        self.fee_rate = Config.BACKTEST_FEE_RATE if fee_rate is None else fee_rate
+        self.slippage = (Config.BACKTEST_SLIPPAGE_BPS if slippage_bps is None else slippage_bps) / 10000
+
+    def buy_price(self, price):
+        return price * (1 + self.slippage)
+
+    def sell_price(self, price):
+        return price * (1 - self.slippage)
+
+    def fee(self, notional):
+        return notional * self.fee_rate
+
+
+class SimulatedExchange:
+    """Подмена Exchange для бэктеста: тот же интерфейс (exchange / rest), без сети.
+
+    Рыночные и пересекающие спред лимитные ордера исполняются сразу по лучшей
+    цене локального стакана DataHandler с учётом модели исполнения.
+    """
+    def __init__(self, data_handler, fill_model=None, initial_balance=None):
+        self.data_handler = data_handler
+        self.fill_model = fill_model or FillModel()
+        self.exchange = self
+        self.rest = self
+        self.markets = {}
+        self.cash = Config.BACKTEST_INITIAL_BALANCE if initial_balance is None else initial_balance
+        self.holdings = {}  # symbol -> количество базовой монеты
+        self.fees_paid = 0.0
+        self.now = 0.0      # Текущее время симуляции, unix-сек
+        self._order_id = 0
+
+    def request(self, weight, func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+    def best_prices(self, symbol):
+        book = self.data_handler.order_books.get(symbol)
+        if book is None or not book.synced or book.bids.best() is None or book.asks.best() is None:
+            return None, None
+        return book.bids.best()[0], book.asks.best()[0]
+
+    def equity(self):
+        total = self.cash
+        for symbol, amount in self.holdings.items():
+            bid, _ = self.best_prices(symbol)
+            if bid is not None:
+                total += amount * bid
+        return total
+
+    def fetch_balance(self):
+        return {'total': {'USDT': self.equity()}, 'free': {'USDT': self.cash}}
+
+    def fetch_ticker(self, symbol):
+        bid, ask = self.best_prices(symbol)
+        last = (bid + ask) / 2 if bid is not None else None
+        return {'symbol': symbol, 'bid': bid, 'ask': ask, 'last': last, 'timestamp': int(self.now * 1000)}
+
+    def fetch_tickers(self, symbols):
+        return {symbol: self.fetch_ticker(symbol) for symbol in symbols}
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        bid, ask = self.best_prices(symbol)
+        self._order_id += 1
+        order = {
+            'id': str(self._order_id), 'symbol': symbol, 'type': type, 'side': side,
+            'amount': amount, 'price': price, 'filled': 0.0, 'average': None,
+            'status': 'canceled', 'timestamp': int(self.now * 1000), 'fee': {'cost': 0.0, 'currency': 'USDT'},
+        }
+        if bid is None:
+            return order
+        if side == 'buy':
+            if type != 'market' and price < ask:
+                return order
+            fill_price = self.fill_model.buy_price(ask)
+        else:
+            if type != 'market' and price > bid:
+                return order
+            fill_price = self.fill_model.sell_price(bid)
+        notional = fill_price * amount
+        fee = self.fill_model.fee(notional)
+        if side == 'buy':
+            self.cash -= notional + fee
+            self.holdings[symbol] = self.holdings.get(symbol, 0.0) + amount
+        else:
+            self.cash += notional - fee
+            self.holdings[symbol] = self.holdings.get(symbol, 0.0) - amount
+        self.fees_paid += fee
+        order.update(filled=amount, average=fill_price, status='closed', fee={'cost': fee, 'currency': 'USDT'})
+        return order
+
+
+class SimulatedOrderExecutor(OrderExecutor):
+    """OrderExecutor для бэктеста: закрытие позиции — рыночная продажа и запись сделки"""
+    def __init__(self, exchange):
+        super().__init__(exchange)
+        self.trades = []
+
+    def close_position(self, position, on_failed=None):
+        order = self.exchange.create_order(position['symbol'], 'market', 'sell', position['size'])
+        if order['status'] != 'closed':
+            return None
+        entry_cost = position['entry_price'] * position['size']
+        self.trades.append({
+            'symbol': position['symbol'],
+            'entry_time': position['entry_time'],
+            'exit_time': self.exchange.now,
+            'entry_price': position['entry_price'],
+            'exit_price': order['average'],
+            'size': position['size'],
+            'pnl': (order['average'] - position['entry_price']) * position['size']
+                   - position.get('entry_fee', 0.0) - order['fee']['cost'],
+            'return': order['average'] / position['entry_price'] - 1 if entry_cost else 0.0,
+        })
+        return order
+
+
+# ====================== Результаты ======================
+class BacktestResult:
+    def __init__(self, trades, initial_balance):
+        self.trades = sorted(trades, key=lambda t: t['exit_time'])
+        self.initial_balance = initial_balance
+        self.equity = initial_balance + np.cumsum([t['pnl'] for t in self.trades]) if self.trades else np.array([])
+
+    def summary(self):
+        pnl = np.array([t['pnl'] for t in self.trades])
+        final = self.equity[-1] if len(self.equity) else self.initial_balance
+        curve = np.concatenate([[self.initial_balance], self.equity])
+        peaks = np.maximum.accumulate(curve)
+        gross_profit = pnl[pnl > 0].sum() if len(pnl) else 0.0
+        gross_loss = -pnl[pnl < 0].sum() if len(pnl) else 0.0
+        return {
+            'trades': len(pnl),
+            'total_return': float(final / self.initial_balance - 1),
+            'final_equity': float(final),
+            'win_rate': float((pnl > 0).mean()) if len(pnl) else 0.0,
+            'profit_factor': float(gross_profit / gross_loss) if gross_loss > 0 else math.inf if gross_profit > 0 else 0.0,
+            'max_drawdown': float(((peaks - curve) / peaks).max()),
+            'exits': {reason: sum(1 for t in self.trades if t.get('reason') == reason)
+                      for reason in ('stop_loss', 'take_profit', 'timeout', 'end_of_data')},
+        }
+
+
+# ====================== Быстрый бэктест по барам ======================
+class BarBacktester:
+    """Векторный бэктест по закрытым барам.
+
+    Индикаторы считаются по всему массиву, условия входа — той же функцией
+    evaluate_conditions, что и в TradingStrategy. Вход — по открытию следующего
+    бара, выход — по правилам PositionMonitor (стоп проверяется раньше тейка,
+    таймаут POSITION_TIMEOUT). Размер позиции — RiskManager по текущему equity.
+
+    Условия стакана на барах не проверяются (считаются выполненными), если не
+    переданы колонки ob_* в book_columns.
+    """
+    def __init__(self, params=None, fill_model=None, initial_balance=None, btc_dominance=60.0,
+                 timeframe=None):
+        self.params = params or {}
+        self.fill_model = fill_model or FillModel()
+        self.initial_balance = Config.BACKTEST_INITIAL_BALANCE if initial_balance is None else initial_balance
+        self.btc_dominance = btc_dominance
+        self.timeframe_ms = timeframe_to_ms(timeframe or Config.TIMEFRAME)
+        self.data_handler = DataHandler()
+        # Оцениваются ровно переданные параметры, без откалиброванных из файла
+        self.data_handler.symbol_params.clear()
+        self.risk_manager = RiskManager(SimulatedExchange(self.data_handler, self.fill_model, self.initial_balance))
+
+    def param(self, name):
+        return self.params.get(name, getattr(Config, name))
+
+    def indicator(self, symbol, bars, kind, period):
+        """Массив индикатора; точка расширения для кэша (см. оптимизатор)"""
+        if kind == 'ema':
+            return ema_array(bars['close'], period)
+        if kind == 'atr':
+            return atr_array(bars['high'], bars['low'], bars['close'], period)
+        if kind == 'sma_volume':
+            return sma_array(bars['volume'], period)
+        raise ValueError(kind)
+
+    def columns(self, symbol, bars, funding=None, book_columns=None):
+        """Колонки условий входа для всех баров пары"""
+        close = bars['close']
+        volume_sma = self.indicator(symbol, bars, 'sma_volume', 20)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            volume_ratio = np.where(np.isnan(volume_sma) | (volume_sma == 0), 0.0, bars['volume'] / volume_sma)
+        n = len(close)
+        columns = {
+            'ema_short': self.indicator(symbol, bars, 'ema', self.param('EMA_SHORT')),
+            'ema_long': self.indicator(symbol, bars, 'ema', self.param('EMA_LONG')),
+            'atr': self.indicator(symbol, bars, 'atr', self.param('ATR_PERIOD')),
+            'volume_ratio': volume_ratio,
+            'close': close,
+            'funding_rate': np.broadcast_to(np.asarray(0.0 if funding is None else funding, dtype=float), (n,)),
+            # Нейтральные значения стакана: условия стакана считаются выполненными
+            'ob_ratio': np.full(n, np.inf),
+            'ob_bid_volume': np.ones(n),
+            'ob_ask_volume': np.ones(n),
+            'ob_spread': np.zeros(n),
+            'ob_mid_price': close,
+            'ob_large_bids': np.ones(n),
+            'ob_walls': np.zeros(n),
+        }
+        if book_columns:
+            columns.update(book_columns)
+        return columns
+
+    def signals(self, symbol, bars, funding=None, book_columns=None):
+        """Индексы баров, на закрытии которых выполнены условия входа"""
+        spread_threshold, volume_ratio_threshold = self.data_handler.get_thresholds_for_symbol(symbol)
+        volume_ratio_threshold = self.params.get('VOLUME_RATIO', volume_ratio_threshold)
+        bits = evaluate_conditions(
+            self.columns(symbol, bars, funding, book_columns),
+            self.btc_dominance, spread_threshold, volume_ratio_threshold,
+            atr_threshold=self.param('ATR_THRESHOLD')
+        )
+        return np.flatnonzero(bits == 0)
+
+    def candidate_trades(self, symbol, bars, signals, end=None):
+        """Непересекающиеся сделки одной пары (до учёта лимитов портфеля), не дальше бара end"""
+        n = len(bars['close']) if end is None else min(end, len(bars['close']))
+        timestamps, opens, highs, lows, closes = (bars[k] for k in ('timestamp', 'open', 'high', 'low', 'close'))
+        hold_bars = max(1, int(math.ceil(self.param('POSITION_TIMEOUT') * 1000 / self.timeframe_ms)))
+        trades = []
+        i = 0
+        while i < len(signals):
+            entry_bar = signals[i] + 1
+            if entry_bar >= n:
+                break
+            entry_price = self.fill_model.buy_price(opens[entry_bar])
+            stop_loss = self.risk_manager.get_stop_loss_price(entry_price, symbol=symbol)
+            take_profit = self.risk_manager.get_take_profit_price(entry_price, symbol=symbol)
+            last_bar = min(entry_bar + hold_bars, n) - 1
+            stop_hits = np.flatnonzero(lows[entry_bar:last_bar + 1] <= stop_loss)
+            target_hits = np.flatnonzero(highs[entry_bar:last_bar + 1] >= take_profit)
+            first_stop = stop_hits[0] if len(stop_hits) else None
+            first_target = target_hits[0] if len(target_hits) else None
+            if first_stop is not None and (first_target is None or first_stop <= first_target):
+                exit_bar, exit_price, reason = entry_bar + first_stop, min(stop_loss, opens[entry_bar + first_stop]), 'stop_loss'
+            elif first_target is not None:
+                exit_bar, exit_price, reason = entry_bar + first_target, max(take_profit, opens[entry_bar + first_target]), 'take_profit'
+            else:
+                exit_bar, exit_price = last_bar, closes[last_bar]
+                reason = 'timeout' if last_bar == entry_bar + hold_bars - 1 else 'end_of_data'
+            trades.append({
+                'symbol': symbol,
+                'entry_time': timestamps[entry_bar] / 1000,
+                'exit_time': (timestamps[exit_bar] + self.timeframe_ms) / 1000,
+                'entry_price': entry_price,
+                'exit_price': self.fill_model.sell_price(exit_price),
+                'stop_loss': stop_loss,
+                'reason': reason,
+            })
+            # Следующий сигнал — не раньше бара выхода (вход по открытию следующего)
+            i = int(np.searchsorted(signals, exit_bar, side='left'))
+        return trades
+
+    def run(self, data, funding=None, book_columns=None, start=0, end=None):
+        """data: {symbol: {'timestamp', 'open', 'high', 'low', 'close', 'volume'} массивы}.
+
+        start/end — окно баров для сделок (индикаторы считаются по всей истории).
+        """
+        self.risk_manager.symbol_params = {symbol: self.params for symbol in data}
+        candidates = []
+        for symbol, bars in data.items():
+            signals = self.signals(
+                symbol, bars,
+                funding.get(symbol) if funding else None,
+                book_columns.get(symbol) if book_columns else None
+            )
+            signals = signals[(signals >= start) & (signals < (len(bars['close']) if end is None else end))]
+            candidates += self.candidate_trades(symbol, bars, signals, end)
+        return BacktestResult(self.apply_portfolio(candidates), self.initial_balance)
+
+    def apply_portfolio(self, candidates):
+        """Лимит MAX_POSITIONS и размер позиции по equity в хронологическом порядке"""
+        equity = self.initial_balance
+        open_exits = []  # куча (exit_time, pnl)
+        trades = []
+        max_positions = self.param('MAX_POSITIONS')
+        for trade in sorted(candidates, key=lambda t: t['entry_time']):
+            while open_exits and open_exits[0][0] <= trade['entry_time']:
+                equity += heapq.heappop(open_exits)[1]
+            if len(open_exits) >= max_positions:
+                continue
+            self.risk_manager.balance = equity
+            size = self.risk_manager.calculate_position_size(trade['entry_price'], trade['stop_loss'])
+            if size <= 0:
+                continue
+            fees = self.fill_model.fee(trade['entry_price'] * size) + self.fill_model.fee(trade['exit_price'] * size)
+            trade = dict(trade, size=size, pnl=(trade['exit_price'] - trade['entry_price']) * size - fees,
+                         **{'return': trade['exit_price'] / trade['entry_price'] - 1})
+            heapq.heappush(open_exits, (trade['exit_time'], trade['pnl']))
+            trades.append(trade)
+        return trades
+
+
+# ====================== Событийный бэктест по тикам ======================
+class EventBacktester:
+    """Прогон записанных тиков через настоящие DataHandler, TradingStrategy,
+    RiskManager и PositionMonitor с SimulatedExchange вместо биржи"""
+    def __init__(self, root=None, fill_model=None, initial_balance=None, btc_dominance=60.0):
+        self.data_handler = DataHandler()
+        self.exchange = SimulatedExchange(self.data_handler, fill_model, initial_balance)
+        self.initial_balance = self.exchange.cash
+        self.btc_dominance = btc_dominance
+        self.strategy = TradingStrategy(self.data_handler)
+        self.risk_manager = RiskManager(self.exchange)
+        self.order_executor = SimulatedOrderExecutor(self.exchange)
+        # Время в симуляции идёт по меткам событий, поэтому возраст цен не ограничиваем
+        self.price_service = PriceService(self.data_handler, self.exchange, max_staleness=math.inf)
+        self.position_monitor = PositionMonitor(self.exchange, self.order_executor, self.price_service)
+        self.replayer = TickReplayer(self.data_handler, root)
+
+    def run(self, symbols, days):
+        streams = [self.replayer.events(symbol, day) for day in days for symbol in symbols]
+        for ts, kind, symbol, payload in heapq.merge(*streams, key=lambda event: event[0]):
+            self.exchange.now = ts / 1000
+            self.replayer.dispatch(kind, symbol, payload)
+            self.on_update(symbol)
+        return BacktestResult(self.order_executor.trades, self.initial_balance)
+
+    def on_update(self, symbol):
+        quote = self.price_service.get_local_quote(symbol)
+        if quote is None:
+            return
+        trades = len(self.order_executor.trades)
+        closed = self.position_monitor.on_price(symbol, quote['bid'], now=self.exchange.now)
+        if len(closed) == len(self.order_executor.trades) - trades:
+            for trade, (_, status) in zip(self.order_executor.trades[trades:], closed):
+                trade['reason'] = status
+        if self.position_monitor.has_position(symbol):
+            return
+        if len(self.position_monitor.active_positions) >= Config.MAX_POSITIONS:
+            return
+        if not self.strategy.check_entry_conditions(symbol, self.btc_dominance):
+            return
+        entry_price = quote['ask']
+        stop_loss = self.risk_manager.get_stop_loss_price(entry_price)
+        self.risk_manager.balance = self.exchange.equity()
+        size = self.risk_manager.calculate_position_size(entry_price, stop_loss)
+        if size <= 0:
+            return
+        order = self.order_executor.place_order(symbol, 'buy', size, entry_price * 1.0005)
+        if not order or order['status'] != 'closed':
+            return
+        self.position_monitor.add_position({
+            'symbol': symbol,
+            'entry_price': order['average'],
+            'stop_loss': stop_loss,
+            'take_profit': self.risk_manager.get_take_profit_price(entry_price),
+            'size': size,
+            'entry_time': self.exchange.now,
+            'entry_fee': order['fee']['cost'],
+        })
+
+
+def bars_from_ohlcv(rows):
+    """Список [timestamp, open, high, low, close, volume] -> словарь массивов для BarBacktester"""
+    array = np.asarray(rows, dtype=float)
+    return {
+        'timestamp': array[:, 0].astype(np.int64),
+        'open': array[:, 1],
+        'high': array[:, 2],
+        'low': array[:, 3],
+        'close': array[:, 4],
+        'volume': array[:, 5],
+    }
+
+
+def fetch_history(rest, symbol, since, until=None, timeframe=None, limit=1000):
+    """Постраничная загрузка истории OHLCV через RestClient"""
+    timeframe = timeframe or Config.TIMEFRAME
+    step = timeframe_to_ms(timeframe)
+    rows = []
+    while until is None or since < until:
+        page = rest.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+        if not page:
+            break
+        rows += [row for row in page if until is None or row[0] < until]
+        since = page[-1][0] + step
+        if len(page) < limit:
+            break
+    return rows
@@ -1,42 +1,179 @@
 from config import Config
-import pandas as pd
 import talib
-import math
+import copy
+import json
+import os
 import time
 import numpy as np
 import threading  # <--- добавлено
+from modules.order_book import OrderBook, BookHistory
+from modules.streaming_stats import OrderBookPercentiles
+from modules.indicators import BarBuffer, IndicatorState
+from modules.indicator_table import IndicatorTable
+from modules.ohlcv_cache import OHLCVCache
+from modules.market_snapshot import MarketSnapshot
+from utils.helpers import timeframe_to_ms
+from utils.logger import get_logger
+
+log = get_logger('DataHandler')
+
+# Индикаторы по стакану: пока стакан не синхронизирован, они не определены (NaN в таблице)
+BOOK_INDICATORS = (
+    'ob_bid_volume', 'ob_ask_volume', 'ob_ratio', 'ob_large_bids', 'ob_large_asks', 'ob_walls',
+    'ob_mid_price', 'ob_spread', 'ob_best_bid', 'ob_best_ask', 'ob_time',
+)
+
+# Поля снимка состояния (capture_state) вида {symbol: значение}; шарды делят и собирают снимок по ним
+STATE_SYMBOL_FIELDS = (
+    'ohlcv', 'indicator_state', 'periods', 'book_history', 'indicators',
+    'order_book_stats', 'dynamic_order_book_settings', 'funding_rates',
+)
 
 # ====================== Обработка данных ======================
 class DataHandler:
-    def __init__(self):
+    def __init__(self, indicator_table=None):
         self.lock = threading.Lock()
-        self.ohlcv = {}         # Исторические данные OHLCV
+        self.ohlcv = {}         # Исторические данные OHLCV (кольцевые буферы)
+        self.indicator_state = {}  # Состояние инкрементальных индикаторов
+        self.timeframe_ms = timeframe_to_ms(Config.TIMEFRAME)
+        self.ohlcv_cache = OHLCVCache() if Config.OHLCV_CACHE_DIR else None  # Закрытые свечи на диске
         self.order_books = {}   # Стаканы ордеров
-        self.indicators = {}    # Рассчитанные индикаторы
+        self.book_history = {}  # Кольцевые буферы снимков верхних уровней стакана
+        self.indicators = {}    # Рассчитанные индикаторы (словарь пары заменяется целиком, не изменяется)
+        self.snapshots = {}     # symbol -> MarketSnapshot; ссылка подменяется, читается без блокировок
+        self.publish_locks = {}  # symbol -> блокировка писателей снимка пары
+        # Те же индикаторы по колонкам для векторного скрининга (в шардированном режиме — в shared memory)
+        self.indicator_table = indicator_table if indicator_table is not None else IndicatorTable(Config.SYMBOLS)
         self.funding_rates = {}  # Текущие ставки финансирования
         self.last_funding_update = 0  # Время последнего обновления ставок финансирования
-    def update_order_book(self, symbol, bids, asks):
-        """Обновление стакана ордеров (вызывается из WebSocket)"""
+        self.order_book_stats = {}  # Потоковые перцентили стакана
+        self.dynamic_order_book_settings = {}  # Динамические пороги стакана
+        self.listeners = []  # Подписчики на обновления данных по паре
+        self.book_listeners = []  # Подписчики на изменения уровней стакана
+        self.last_book_update = {}  # Время последнего обновления стакана (unix, сек)
+        self.book_applied = {}  # time.perf_counter() после применения последнего обновления стакана
+        self.last_trade = {}  # Цена последней сделки из потока свечей: (price, unix-время)
+        self.recorder = None  # TickRecorder, если включена запись тиков
+        self.symbol_params = {}  # Параметры стратегии по парам после калибровки (перекрывают Config)
+        self.params_version = 0  # Растёт при каждой смене параметров пар
+        self.params_mtime = None  # Время изменения файла параметров при последнем чтении
+        self.load_symbol_params()
+    def store_indicators(self, symbol, values, **book):
+        """Публикация индикаторов пары: новый словарь, строка таблицы и MarketSnapshot.
+
+        book — поля стакана снимка (bids, asks, update_id, book_time); без них
+        стакан берётся из предыдущего снимка. Писатели пары (поток очереди пары,
+        планировщик) сериализуются её блокировкой; читатели блокировок не берут.
+        """
+        with self.publish_lock(symbol):
+            previous = self.snapshots.get(symbol)
+            indicators = dict(previous.indicators) if previous is not None else {}
+            indicators.update(values)
+            self.indicator_table.update(symbol, values)
+            row = self.indicator_table.row(symbol)
+            now = time.time()
+            if previous is None:
+                snapshot = MarketSnapshot(symbol, 1, now, indicators, row, **book)
+            else:
+                snapshot = previous.evolve(now, indicators, row, **book)
+            self.indicators[symbol] = indicators
+            self.snapshots[symbol] = snapshot
+    def publish_lock(self, symbol):
+        """Блокировка писателей пары: публикация снимка и статистика стакана"""
+        lock = self.publish_locks.get(symbol)
+        if lock is None:
+            lock = self.publish_locks.setdefault(symbol, threading.Lock())
+        return lock
+    def snapshot(self, symbol):
+        """Последний MarketSnapshot пары или None"""
+        return self.snapshots.get(symbol)
+    def add_listener(self, callback):
+        """Подписка на обновления стакана и свечей: callback(symbol)"""
+        self.listeners.append(callback)
+    def add_book_listener(self, callback):
+        """Подписка на изменения уровней стакана: callback(symbol, changes)"""
+        self.book_listeners.append(callback)
+    def notify_listeners(self, symbol):
+        for callback in self.listeners:
+            callback(symbol)
+    def get_order_book(self, symbol):
+        """Локальный стакан для пары (создаётся при первом обращении)"""
+        book = self.order_books.get(symbol)
+        if book is None:
+            book = OrderBook(symbol)
+            self.order_books[symbol] = book
+        return book
+    def record_book_history(self, symbol, book, timestamp):
+        history = self.book_history.get(symbol)
+        if history is None:
+            history = BookHistory(Config.ORDER_BOOK_HISTORY_SIZE, Config.ORDER_BOOK_HISTORY_DEPTH)
+            self.book_history[symbol] = history
+        history.push(book, timestamp)
+    def get_book_history(self, symbol, count=None):
+        """Последние снимки верхних уровней стакана (представления без копирования) или None"""
+        history = self.book_history.get(symbol)
+        if history is None:
+            return None
+        return history.window(count)
+    def load_order_book_snapshot(self, symbol, last_update_id, bids, asks):
+        """Загрузка REST-снимка стакана. Возвращает True, если стакан синхронизирован"""
+        if self.recorder is not None:
+            self.recorder.record_depth(symbol, last_update_id, last_update_id, None, bids, asks, snapshot=True)
+        now = time.time()
         with self.lock:
-            self.order_books[symbol] = {
-                'bids': sorted(bids, key=lambda x: x[0], reverse=True),
-                'asks': sorted(asks, key=lambda x: x[0])
-        }
+            book = self.get_order_book(symbol)
+            changes = book.load_snapshot(last_update_id, bids, asks)
+            if changes is not None:
+                self.record_book_history(symbol, book, now)
+        if changes is None:
+            return False
+        self.last_book_update[symbol] = now
+        self.book_applied[symbol] = time.perf_counter()
+        with self.publish_lock(symbol):
+            if symbol in self.order_book_stats:
+                self.order_book_stats[symbol].reset_levels()
+        self.on_order_book_changed(symbol, changes)
+        self.notify_listeners(symbol)
+        return True
+    def apply_order_book_diff(self, symbol, first_id, last_id, prev_id, bids, asks):
+        """Применение diff-обновления стакана (вызывается из WebSocket).
+
+        Возвращает False, если стакан рассинхронизирован и нужен новый снимок.
+        """
+        if self.recorder is not None:
+            self.recorder.record_depth(symbol, first_id, last_id, prev_id, bids, asks)
+        now = time.time()
+        with self.lock:
+            book = self.get_order_book(symbol)
+            changes = book.apply_diff(first_id, last_id, prev_id, bids, asks)
+            if changes:
+                self.record_book_history(symbol, book, now)
+        if changes is None:
+            # Стакан рассинхронизирован: ни снимок, ни таблица (по ней проверяются
+            # условия входа) не должны показывать его прежнее состояние — NaN даёт REJECT_NO_DATA
+            self.store_indicators(symbol, dict.fromkeys(BOOK_INDICATORS), bids=None, asks=None)
+            return False
+        self.last_book_update[symbol] = now
+        if changes:
+            self.book_applied[symbol] = time.perf_counter()
+            self.on_order_book_changed(symbol, changes)
+            self.notify_listeners(symbol)
+        return True
+    def on_order_book_changed(self, symbol, changes):
+        """Пересчёт метрик после изменения стакана"""
         self.calculate_order_book_metrics(symbol)
-        self.calculate_dynamic_order_book_settings(symbol)  # <--- добавлено
+        self.calculate_dynamic_order_book_settings(symbol, changes)
+        for callback in self.book_listeners:
+            callback(symbol, changes)
     def calculate_order_book_metrics(self, symbol):
         """Расчет метрик стакана ордеров"""
-        if symbol not in self.order_books:
-            return
-
-        ob = self.order_books[symbol]
-        bids = ob['bids']
-        asks = ob['asks']
-        if not bids or not asks:
+        view = self.get_book_view(symbol)
+        if view is None:
             return
+        bid_index, ask_index, update_id = view
 
         # Используем динамические параметры, если они есть
-        if hasattr(self, 'dynamic_order_book_settings') and symbol in self.dynamic_order_book_settings:
+        if symbol in self.dynamic_order_book_settings:
             settings = self.dynamic_order_book_settings[symbol]
         else:
             settings = {
@@ -46,29 +183,19 @@ class DataHandler:
                 'RATIO_MIN': 1.5,
             }
 
-        best_bid = bids[0][0]
-        best_ask = asks[0][0]
+        best_bid = float(bid_index.prices[0])
+        best_ask = float(ask_index.prices[0])
         mid_price = (best_bid + best_ask) / 2
 
-        bid_volume = sum(price * amount for price, amount in bids if price >= mid_price * (1 - settings['ZONE_PCT']))
-        ask_volume = sum(price * amount for price, amount in asks if price <= mid_price * (1 + settings['ZONE_PCT']))
-
-        large_bids = [(price, price * amount) for price, amount in bids if price * amount > settings['CLUSTER_THRESHOLD']]
-        large_asks = [(price, price * amount) for price, amount in asks if price * amount > settings['CLUSTER_THRESHOLD']]
-        walls = []
-        for price, amount in bids:
-            value = price * amount
-            if value > settings['WALL_THRESHOLD']:
-                walls.append(('bid', price, value))
-        for price, amount in asks:
-            value = price * amount
-            if value > settings['WALL_THRESHOLD']:
-                walls.append(('ask', price, value))
-
-        if symbol not in self.indicators:
-            self.indicators[symbol] = {}
-
-        self.indicators[symbol].update({
+        bid_volume = bid_index.notional_within(mid_price * (1 - settings['ZONE_PCT']))
+        ask_volume = ask_index.notional_within(mid_price * (1 + settings['ZONE_PCT']))
+
+        large_bids = bid_index.levels_above(settings['CLUSTER_THRESHOLD'])
+        large_asks = ask_index.levels_above(settings['CLUSTER_THRESHOLD'])
+        walls = [('bid', price, value) for price, value in bid_index.levels_above(settings['WALL_THRESHOLD'])]
+        walls += [('ask', price, value) for price, value in ask_index.levels_above(settings['WALL_THRESHOLD'])]
+
+        self.store_indicators(symbol, {
             'ob_bid_volume': bid_volume,
             'ob_ask_volume': ask_volume,
             'ob_ratio': bid_volume / ask_volume if ask_volume > 0 else 0,
@@ -76,125 +203,218 @@ class DataHandler:
             'ob_large_asks': large_asks,
             'ob_walls': walls,
             'ob_mid_price': mid_price,
-            'ob_spread': best_ask - best_bid
-        })  
+            'ob_spread': best_ask - best_bid,
+            'ob_best_bid': best_bid,
+            'ob_best_ask': best_ask,
+            'ob_time': self.last_book_update.get(symbol, time.time()),
+        }, bids=bid_index, asks=ask_index, update_id=update_id, book_time=self.last_book_update.get(symbol))
     def update_ohlcv(self, exchange, symbol):
-        """Обновление исторических данных"""
+        """Дозагрузка OHLCV пары через REST после разрыва в потоке свечей.
+
+        Вызывается из пула RestClient, поэтому страницы запрашиваются последовательно.
+        """
+        self.seed_ohlcv(exchange, [symbol], parallel=False)
+    def seed_ohlcv(self, exchange, symbols, parallel=True):
+        """Заполнение буферов свечей: сначала кэш на диске, через REST — только бары новее него.
+
+        Без кэша (или если он старше OHLCV_HISTORY_BARS) загружается вся глубина истории;
+        страницы всех пар запрашиваются параллельно через RestClient.fan_out.
+        """
+        now = int(time.time() * 1000)
+        oldest = (now // self.timeframe_ms - Config.OHLCV_HISTORY_BARS) * self.timeframe_ms
+        page_span = Config.OHLCV_LIMIT * self.timeframe_ms
+        pages = []
+        for symbol in symbols:
+            self.load_cached_ohlcv(symbol)
+            buffer = self.ohlcv.get(symbol)
+            since = max(buffer.last_timestamp, oldest) if buffer is not None else oldest
+            pages += [(symbol, start) for start in range(since, now + 1, page_span)]
+
+        def fetch(page):
+            symbol, start = page
+            limit = min(Config.OHLCV_LIMIT, (now - start) // self.timeframe_ms + 1)
+            return exchange.rest.fetch_ohlcv(symbol, Config.TIMEFRAME, since=start, limit=limit)
+
+        log.info("Запрос OHLCV для %s: страниц %s", ', '.join(symbols), len(pages))
+        if parallel:
+            results = exchange.rest.fan_out(fetch, pages)
+        else:
+            results = {}
+            for page in pages:
+                try:
+                    results[page] = fetch(page)
+                except Exception as e:
+                    results[page] = e
+        rows = {}
+        failed = set()
+        for (symbol, start), page in results.items():
+            if isinstance(page, Exception):
+                log.error("Ошибка загрузки OHLCV для %s (since=%s): %s", symbol, start, page)
+                failed.add(symbol)
+            else:
+                rows.setdefault(symbol, []).extend(page)
+        for symbol, bars in rows.items():
+            if symbol not in failed and bars:
+                self.ingest_ohlcv(symbol, bars)
+    def ingest_ohlcv(self, symbol, rows):
+        """Запись свечей из REST в буфер и кэш (последняя свеча ещё формируется)"""
+        # Страницы могут пересекаться на границе — оставляем по одному бару на время открытия
+        rows = sorted({row[0]: row for row in rows}.values(), key=lambda row: row[0])
+        with self.lock:
+            buffer = self.ohlcv.get(symbol)
+            if buffer is not None and rows[0][0] > buffer.last_timestamp:
+                # История не стыкуется с буфером — заполняем заново
+                self.ohlcv.pop(symbol, None)
+                self.indicator_state.pop(symbol, None)
+            last = len(rows) - 1
+            for i, bar in enumerate(rows):
+                self.ingest_bar(symbol, bar, closed=i < last, allow_gap=True)
+                if self.recorder is not None:
+                    self.recorder.record_kline(symbol, bar, i < last)
+        log.info("Получено %s свечей для %s", len(rows), symbol)
+        if self.ohlcv_cache is not None and last:
+            self.ohlcv_cache.append(symbol, rows[:last])
+        self.notify_listeners(symbol)
+    def load_cached_ohlcv(self, symbol):
+        """Заполнение пустого буфера свечами из кэша на диске. Возвращает число баров"""
+        if self.ohlcv_cache is None or symbol in self.ohlcv:
+            return 0
+        bars = self.ohlcv_cache.load(symbol, Config.OHLCV_HISTORY_BARS)
+        if not len(bars):
+            return 0
+        with self.lock:
+            if symbol in self.ohlcv:
+                return 0
+            for bar in bars:
+                self.ingest_bar(symbol, bar, closed=True, allow_gap=True)
+        log.info("Из кэша загружено %s свечей для %s", len(bars), symbol)
+        return len(bars)
+    def save_ohlcv_cache(self):
+        """Дописать в кэш закрытые свечи из WebSocket, которых там ещё нет (по таймеру)"""
+        if self.ohlcv_cache is None:
+            return
+        for symbol in list(self.ohlcv):
+            with self.lock:
+                buffer = self.ohlcv[symbol]
+                bars = buffer.rows() if buffer.last_closed else buffer.rows()[:-1]
+            try:
+                self.ohlcv_cache.append(symbol, bars)
+            except (OSError, ValueError) as e:
+                log.error("Ошибка записи кэша свечей %s: %s", symbol, e)
+    def on_kline(self, symbol, bar, closed, allow_gap=False):
+        """Обновление свечи из WebSocket. Возвращает False, если нужна дозагрузка через REST"""
+        if self.recorder is not None:
+            self.recorder.record_kline(symbol, bar, closed)
+        with self.lock:
+            ingested = self.ingest_bar(symbol, bar, closed, allow_gap)
+        if ingested:
+            self.last_trade[symbol] = (float(bar[4]), time.time())
+            self.store_indicators(symbol, {'last_price': self.last_trade[symbol][0],
+                                           'last_time': self.last_trade[symbol][1]})
+            self.notify_listeners(symbol)
+        return ingested
+    def ingest_bar(self, symbol, bar, closed, allow_gap=False):
+        """Запись бара в кольцевой буфер и инкрементальный пересчёт индикаторов"""
+        buffer = self.ohlcv.get(symbol)
+        if buffer is None:
+            if not allow_gap:
+                return False
+            buffer = BarBuffer(Config.OHLCV_BUFFER_SIZE)
+            self.ohlcv[symbol] = buffer
+            self.indicator_state[symbol] = self.create_indicator_state(symbol)
+        state = self.indicator_state[symbol]
+
+        bar = (int(bar[0]), float(bar[1]), float(bar[2]), float(bar[3]), float(bar[4]), float(bar[5]))
+        last_timestamp = buffer.last_timestamp
+        if last_timestamp is not None and bar[0] < last_timestamp:
+            return True
+        if bar[0] == last_timestamp:
+            if buffer.last_closed:
+                return True
+            buffer.update_last(bar)
+        else:
+            if last_timestamp is not None and not allow_gap and bar[0] != last_timestamp + self.timeframe_ms:
+                return False
+            if last_timestamp is not None and not buffer.last_closed:
+                # Закрытие предыдущей свечи не пришло — фиксируем её последнее состояние
+                state.push(buffer.last())
+            buffer.append(bar)
+            buffer.last_closed = False
+
+        if closed:
+            values = state.push(bar)
+            buffer.last_closed = True
+        else:
+            values = state.peek(bar)
+        self.store_indicators(symbol, values)
+        return True
+    def create_indicator_state(self, symbol=None):
+        return IndicatorState(
+            self.get_param(symbol, 'EMA_SHORT'),
+            self.get_param(symbol, 'EMA_LONG'),
+            self.get_param(symbol, 'ATR_PERIOD'),
+            volume_sma_period=20
+        )
+    def update_funding_rates(self, exchange):
+        """Обновление ставок финансирования (по таймеру планировщика)"""
+        # Для фьючерсов
+        perp_symbols = {f"{symbol.split('/')[0]}/USDT:USDT": symbol for symbol in Config.SYMBOLS}
         try:
-            print(f"[DataHandler] Запрос OHLCV для {symbol}...")
-            new_data = exchange.exchange.fetch_ohlcv(
-                symbol, 
-                Config.TIMEFRAME, 
-                limit=100
-            )
-            print(f"[DataHandler] Получено {len(new_data)} свечей для {symbol}")
-            df = pd.DataFrame(
-                new_data, 
-                columns=['timestamp', 'open', 'high', 'low', 'close', 'volume']
-            )
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-            self.ohlcv[symbol] = df
-            print(f"[DataHandler] OHLCV сохранён для {symbol}")
-            self.calculate_indicators(symbol)
+            rates = exchange.rest.fetch_funding_rates(list(perp_symbols))
         except Exception as e:
-            print(f"[DataHandler] Ошибка обновления OHLCV для {symbol}: {e}")
-    def update_funding_rates(self, exchange):
-        """Обновление ставок финансирования каждые 30 минут"""
-        if time.time() - self.last_funding_update < 1800:  # 30 минут
-            return
+            log.error("Ошибка получения ставок финансирования: %s", e)
+            rates = {}
 
-        self.funding_rates = {}
-        for symbol in Config.SYMBOLS:
-            try:
-                # Для фьючерсов
-                perp_symbol = f"{symbol.split('/')[0]}/USDT:USDT"
-                rate = exchange.exchange.fetch_funding_rate(perp_symbol)
-                print(f"полученный фандинг {symbol}: {rate['fundingRate']}")
-                self.funding_rates[symbol] = rate['fundingRate']
-            except Exception as e:
-                print(f"Funding rate error for {symbol}: {e}")
-                self.funding_rates[symbol] = 0  # Нейтральное значение
-
-        self.last_funding_update = time.time()           
+        for perp_symbol, symbol in perp_symbols.items():
+            rate = rates.get(perp_symbol)
+            if rate is None:
+                log.warning("Нет ставки финансирования для %s", symbol)
+                self.set_funding_rate(symbol, 0)  # Нейтральное значение
+            else:
+                log.debug("Ставка финансирования %s: %s", symbol, rate['fundingRate'])
+                self.set_funding_rate(symbol, rate['fundingRate'])
+
+        self.last_funding_update = time.time()
+    def set_funding_rate(self, symbol, rate):
+        """Сохранение ставки финансирования пары"""
+        if self.recorder is not None:
+            self.recorder.record_funding(symbol, rate)
+        self.funding_rates[symbol] = rate
+        self.store_indicators(symbol, {'funding_rate': rate})
     def calculate_indicators(self, symbol):
-        """Расчет технических индикаторов"""
+        """Полный пересчёт индикаторов по буферу свечей (например, после смены параметров)"""
         if symbol not in self.ohlcv:
-            print(f"[DataHandler] Нет данных OHLCV для {symbol}, индикаторы не рассчитываются")
+            log.warning("Нет данных OHLCV для %s, индикаторы не рассчитываются", symbol)
+            return
+        log.debug("Расчёт индикаторов для %s...", symbol)
+        with self.lock:
+            buffer = self.ohlcv[symbol]
+            state = self.create_indicator_state(symbol)
+            bars = np.column_stack([buffer.column(name) for name in BarBuffer.COLUMNS])
+            for bar in bars[:-1]:
+                state.push(bar)
+            values = state.push(bars[-1]) if buffer.last_closed else state.peek(bars[-1])
+            self.indicator_state[symbol] = state
+            self.store_indicators(symbol, values)
+        log.info("Индикаторы рассчитаны для %s", symbol,
+                 ema_short=values['ema_short'], ema_long=values['ema_long'], atr=values['atr'])
+    def calculate_dynamic_order_book_settings(self, symbol, changes):
+        """Автоматический расчет параметров стакана по потоковым перцентилям"""
+        with self.publish_lock(symbol):
+            # Под блокировкой пары: capture_state копирует статистику из другого потока
+            stats = self.order_book_stats.get(symbol)
+            if stats is None:
+                stats = OrderBookPercentiles(window=Config.ORDER_BOOK_STATS_WINDOW)
+                self.order_book_stats[symbol] = stats
+            thresholds = stats.update(changes)
+        if None in thresholds.values():
             return
-        print(f"[DataHandler] Расчёт индикаторов для {symbol}...")
-        df = self.ohlcv[symbol]
-        
-        # Рассчет индикаторов
-        df['ema_short'] = talib.EMA(df['close'], Config.EMA_SHORT)
-        df['ema_long'] = talib.EMA(df['close'], Config.EMA_LONG)
-        df['atr'] = talib.ATR(
-            df['high'], 
-            df['low'], 
-            df['close'], 
-            Config.ATR_PERIOD
-        )
-        
-        # Volume SMA
-        df['volume_sma'] = talib.SMA(df['volume'], 20)
-        
-        # Сохранение последних значений
-        last_row = df.iloc[-1]
-        volume_sma = last_row['volume_sma']
-        if not volume_sma or math.isnan(volume_sma):
-            volume_ratio = 0
-        else:
-            volume_ratio = last_row['volume'] / volume_sma
-
-        self.indicators[symbol] = {
-            'ema_short': last_row['ema_short'],
-            'ema_long': last_row['ema_long'],
-            'atr': last_row['atr'],
-            'volume': last_row['volume'],
-            'volume_sma': volume_sma,
-            'volume_ratio': volume_ratio,
-            'close': last_row['close']
-        }
-        print(f"[DataHandler] Индикаторы рассчитаны для {symbol}: EMA_short={df['ema_short'].iloc[-1]}, EMA_long={df['ema_long'].iloc[-1]}, ATR={df['atr'].iloc[-1]}")
-    def calculate_dynamic_order_book_settings(self, symbol, history=100):
-        """Автоматический расчет параметров стакана по истории"""
-        # Сохраняем последние N снимков стакана
-        if not hasattr(self, 'order_book_history'):
-            self.order_book_history = {}
-        if symbol not in self.order_book_history:
-            self.order_book_history[symbol] = []
-        self.order_book_history[symbol].append(self.order_books[symbol])
-        if len(self.order_book_history[symbol]) > history:
-            self.order_book_history[symbol] = self.order_book_history[symbol][-history:]
-
-        # Собираем статистику по объёмам
-        bid_volumes = []
-        ask_volumes = []
-        all_bid_orders = []
-        all_ask_orders = []
-        for ob in self.order_book_history[symbol]:
-            bids = ob['bids']
-            asks = ob['asks']
-            bid_volumes.append(sum([price * amount for price, amount in bids]))
-            ask_volumes.append(sum([price * amount for price, amount in asks]))
-            all_bid_orders += [price * amount for price, amount in bids]
-            all_ask_orders += [price * amount for price, amount in asks]
-
-        # Расчет порогов
-        cluster_threshold = np.percentile(all_bid_orders + all_ask_orders, 90)
-        wall_threshold = np.percentile(all_bid_orders + all_ask_orders, 99)
-        ratio_min = np.percentile(
-            [b/a for b, a in zip(bid_volumes, ask_volumes) if a > 0], 50
-        )
-        zone_pct = 0.005  # Можно тоже рассчитать динамически
 
-        # Сохраняем в отдельный словарь
-        if not hasattr(self, 'dynamic_order_book_settings'):
-            self.dynamic_order_book_settings = {}
         self.dynamic_order_book_settings[symbol] = {
-            'CLUSTER_THRESHOLD': cluster_threshold,
-            'WALL_THRESHOLD': wall_threshold,
-            'ZONE_PCT': zone_pct,
-            'RATIO_MIN': ratio_min,
+            'CLUSTER_THRESHOLD': thresholds['CLUSTER_THRESHOLD'],
+            'WALL_THRESHOLD': thresholds['WALL_THRESHOLD'],
+            'ZONE_PCT': 0.005,  # Можно тоже рассчитать динамически
+            'RATIO_MIN': thresholds['RATIO_MIN'],
         }
     def calculate_atr(self, symbol, period=5):
         ohlcv = self.exchange.exchange.fetch_ohlcv(symbol, '5m', limit=period+1)
@@ -212,12 +432,30 @@ class DataHandler:
         threshold = 1.8 + (0.5 * volatility_factor)
         return ratio > threshold
 
+    def get_book_view(self, symbol):
+        """Неизменяемые индексы обеих сторон стакана и его lastUpdateId: (bids, asks, update_id) или None"""
+        ob = self.order_books.get(symbol)
+        if ob is None:
+            return None
+        with self.lock:
+            if not ob.synced or not len(ob.bids) or not len(ob.asks):
+                return None
+            return ob.bids.depth_index(), ob.asks.depth_index(), ob.last_update_id
+
+    def get_depth_indexes(self, symbol):
+        """Индексы глубины обеих сторон локального стакана: (bids, asks) или None"""
+        view = self.get_book_view(symbol)
+        return view[:2] if view is not None else None
+
     def liquidity_monitor(self, symbol):
-        order_book = self.exchange.fetch_order_book(symbol)
-    
+        indexes = self.get_depth_indexes(symbol)
+        if indexes is None:
+            return None
+        bid_index, ask_index = indexes
+
         # Динамический расчет спреда
-        best_bid = order_book['bids'][0][0]
-        best_ask = order_book['asks'][0][0]
+        best_bid = float(bid_index.prices[0])
+        best_ask = float(ask_index.prices[0])
         spread = (best_ask - best_bid) / best_bid
         
         # Адаптивная глубина стакана
@@ -225,16 +463,9 @@ class DataHandler:
         depth_threshold = max(500000, daily_volume * 0.0005)  # 0.05% от дневного объема
         
         # Расчет реальной ликвидности
-        def calculate_depth(side, depth_percent=0.005):
-            depth_price = best_bid * (1 - depth_percent) if side == 'bid' else best_ask * (1 + depth_percent)
-            return sum(
-                qty * price
-                for price, qty in order_book['bids' if side == 'bid' else 'asks']
-                if (price >= depth_price if side == 'bid' else price <= depth_price)
-            )
-        
-        bid_depth = calculate_depth('bid')
-        ask_depth = calculate_depth('ask')
+        depth_percent = 0.005
+        bid_depth = bid_index.notional_within(best_bid * (1 - depth_percent))
+        ask_depth = ask_index.notional_within(best_ask * (1 + depth_percent))
         
         return {
             'spread': spread,
@@ -244,85 +475,230 @@ class DataHandler:
         }
 
     def order_book_analysis(self, symbol):
-        ob = self.exchange.fetch_order_book(symbol)
-        current_price = (ob['bids'][0][0] + ob['asks'][0][0]) / 2
+        indexes = self.get_depth_indexes(symbol)
+        if indexes is None:
+            return None
+        bid_index, ask_index = indexes
+        current_price = float(bid_index.prices[0] + ask_index.prices[0]) / 2
         
         # Адаптивные пороги
         daily_volume = self.get_24h_volume(symbol)
         wall_threshold = max(100000, daily_volume * 0.0002)  # 0.02% от объема
         cluster_threshold = wall_threshold * 0.5
         
-        # Поиск стен
-        def detect_walls(side, levels=10):
-            for i in range(levels):
-                price, qty = ob[side][i]
-                value = qty * price
-                if value > wall_threshold:
-                    distance = abs(price - current_price) / current_price
-                    if distance < 0.005:  # 0.5%
-                        return True
-            return False
+        # Поиск стен: крупный уровень среди первых 10 в пределах 0.5% от цены
+        def detect_walls(index, levels=10):
+            count = min(levels, index.count_within(current_price * (0.995 if index.is_bid else 1.005)))
+            return index.first_above(wall_threshold, max_levels=count) is not None
         
         # Поиск кластеров
-        def detect_clusters(side, levels=5):
-            cluster_found = False
-            for i in range(levels):
-                price, qty = ob[side][i]
-                value = qty * price
-                if value > cluster_threshold:
-                    cluster_found = True
-            return cluster_found
+        def detect_clusters(index, levels=5):
+            return index.first_above(cluster_threshold, max_levels=levels) is not None
         
         # Соотношение сил
-        bid_value = sum(qty * price for price, qty in ob['bids'][:5])
-        ask_value = sum(qty * price for price, qty in ob['asks'][:5])
+        bid_value = bid_index.notional_top(5)
+        ask_value = ask_index.notional_top(5)
         ratio = bid_value / ask_value if ask_value > 0 else 1
         
+        has_bid_walls = detect_walls(bid_index)
+        has_ask_walls = detect_walls(ask_index)
+        has_bid_clusters = detect_clusters(bid_index)
         return {
-            'has_bid_walls': detect_walls('bids'),
-            'has_ask_walls': detect_walls('asks'),
-            'has_bid_clusters': detect_clusters('bids'),
-            'has_ask_clusters': detect_clusters('asks'),
+            'has_bid_walls': has_bid_walls,
+            'has_ask_walls': has_ask_walls,
+            'has_bid_clusters': has_bid_clusters,
+            'has_ask_clusters': detect_clusters(ask_index),
             'bid_ask_ratio': ratio,
-            'safe_to_trade': not (detect_walls('bids') or detect_walls('asks')) and 
+            'safe_to_trade': not (has_bid_walls or has_ask_walls) and 
                             ratio > 1.5 and 
-                            detect_clusters('bids')
+                            has_bid_clusters
         }
 
     def get_thresholds_for_symbol(self, symbol):
         if symbol in ['BTC/USDT', 'ETH/USDT']:
-            return 0.08 / 100, 1.5
+            spread, volume_ratio = 0.08 / 100, 1.5
         else:
-            return 0.15 / 100, 2.2
+            spread, volume_ratio = 0.15 / 100, 2.2
+        return spread, self.symbol_params.get(symbol, {}).get('VOLUME_RATIO', volume_ratio)
 
     def get_current_volume(self, symbol):
         """Получить текущий объем из последних OHLCV"""
-        if symbol in self.ohlcv:
-            return self.ohlcv[symbol]['volume'].iloc[-1]
+        if symbol in self.ohlcv and len(self.ohlcv[symbol]):
+            return self.ohlcv[symbol].column('volume', 1)[-1]
         return 0
 
     def get_historical_volumes(self, symbol, period=20):
         """Получить исторические объемы для расчета SMA"""
         if symbol in self.ohlcv:
-            return self.ohlcv[symbol]['volume'].iloc[-period:].values
+            return self.ohlcv[symbol].column('volume', period)
         return np.zeros(period)
 
     def get_24h_volume(self, symbol):
-        """Получить 24-часовой объем через биржу"""
-        try:
-            ticker = self.exchange.exchange.fetch_ticker(symbol)
-            return ticker.get('quoteVolume', 0)
-        except Exception:
+        """24-часовой объем в валюте котировки по буферу свечей"""
+        buffer = self.ohlcv.get(symbol)
+        if buffer is None:
             return 0
+        bars = int(86400000 // self.timeframe_ms)
+        return float(np.dot(buffer.column('close', bars), buffer.column('volume', bars)))
+
+    def indicator_periods(self, symbol):
+        return [self.get_param(symbol, name) for name in ('EMA_SHORT', 'EMA_LONG', 'ATR_PERIOD')]
+
+    def capture_state(self):
+        """Копия состояния для снимка StateStore (без сериализации).
+
+        Пары копируются по одной, чтобы не останавливать обработку остальных:
+        свечи, состояние индикаторов и история стакана — под self.lock (под ней
+        они и меняются), статистика стакана — под блокировкой публикации пары.
+        Словари индикаторов и порогов пары не изменяются, а заменяются целиком,
+        поэтому берутся по ссылке.
+        """
+        state = {field: {} for field in STATE_SYMBOL_FIELDS}
+        state.update({
+            'timeframe': Config.TIMEFRAME,
+            'funding_rates': dict(self.funding_rates),
+            'last_funding_update': self.last_funding_update,
+        })
+        for symbol in Config.SYMBOLS:
+            with self.lock:
+                if symbol in self.indicator_state:
+                    state['ohlcv'][symbol] = copy.deepcopy(self.ohlcv[symbol])
+                    state['indicator_state'][symbol] = copy.deepcopy(self.indicator_state[symbol])
+                if symbol in self.book_history:
+                    state['book_history'][symbol] = copy.deepcopy(self.book_history[symbol])
+            if symbol in state['indicator_state']:
+                state['periods'][symbol] = self.indicator_periods(symbol)
+            with self.publish_lock(symbol):
+                if symbol in self.order_book_stats:
+                    state['order_book_stats'][symbol] = copy.deepcopy(self.order_book_stats[symbol])
+            if symbol in self.indicators:
+                state['indicators'][symbol] = self.indicators[symbol]
+            if symbol in self.dynamic_order_book_settings:
+                state['dynamic_order_book_settings'][symbol] = self.dynamic_order_book_settings[symbol]
+        return state
+
+    def restore_state(self, state):
+        """Восстановление состояния из снимка до запуска WebSocket.
+
+        Свечи и состояние индикаторов пары берутся, только если периоды индикаторов
+        не менялись; после этого через REST догружаются лишь бары новее снимка.
+        """
+        if state.get('timeframe') != Config.TIMEFRAME:
+            log.warning("Снимок для таймфрейма %s, пропуск", state.get('timeframe'))
+            return
+        symbols = [symbol for symbol in Config.SYMBOLS if symbol in state['indicator_state']
+                   and state['periods'].get(symbol) == self.indicator_periods(symbol)]
+        with self.lock:
+            for symbol in symbols:
+                self.ohlcv[symbol] = state['ohlcv'][symbol]
+                self.indicator_state[symbol] = state['indicator_state'][symbol]
+            for symbol in Config.SYMBOLS:
+                if symbol in state['book_history']:
+                    self.book_history[symbol] = state['book_history'][symbol]
+        for symbol in Config.SYMBOLS:
+            if symbol in state['indicators']:
+                # Метрики стакана из снимка устарели (до STATE_MAX_AGE): их опубликует живой стакан
+                self.store_indicators(symbol, {
+                    name: value for name, value in state['indicators'][symbol].items()
+                    if name not in BOOK_INDICATORS
+                })
+            if symbol in state['order_book_stats']:
+                with self.publish_lock(symbol):
+                    self.order_book_stats[symbol] = state['order_book_stats'][symbol]
+            if symbol in state['dynamic_order_book_settings']:
+                self.dynamic_order_book_settings[symbol] = state['dynamic_order_book_settings'][symbol]
+            if symbol in state['funding_rates']:
+                self.funding_rates[symbol] = state['funding_rates'][symbol]
+                self.store_indicators(symbol, {'funding_rate': state['funding_rates'][symbol]})
+        self.last_funding_update = state['last_funding_update']
+        log.info("Состояние восстановлено: свечи и индикаторы %s из %s пар", len(symbols), len(Config.SYMBOLS))
+
+    def get_param(self, symbol, name):
+        """Параметр стратегии пары: откалиброванный или из Config"""
+        return self.symbol_params.get(symbol, {}).get(name, getattr(Config, name))
+
+    def set_symbol_params(self, symbol, params):
+        """Новые параметры пары; при смене периодов индикаторы пересчитываются по буферу"""
+        old = self.indicator_periods(symbol)
+        if params:
+            self.symbol_params[symbol] = dict(params)
+        else:
+            self.symbol_params.pop(symbol, None)
+        self.params_version += 1
+        if old != self.indicator_periods(symbol) and symbol in self.ohlcv:
+            self.calculate_indicators(symbol)
+
+    def load_symbol_params(self, path=None):
+        path = path or Config.SYMBOL_PARAMS_FILE
+        if not os.path.exists(path):
+            return
+        try:
+            self.params_mtime = os.path.getmtime(path)
+            with open(path) as f:
+                self.symbol_params.update(json.load(f))
+            self.params_version += 1
+            log.info("Загружены параметры пар: %s", ', '.join(self.symbol_params))
+        except (OSError, ValueError) as e:
+            log.error("Ошибка чтения %s: %s", path, e)
+
+    def reload_symbol_params(self, path=None):
+        """Применить параметры пар из файла, если он изменился (шард получает калибровку координатора)"""
+        path = path or Config.SYMBOL_PARAMS_FILE
+        try:
+            mtime = os.path.getmtime(path)
+            if mtime == self.params_mtime:
+                return
+            with open(path) as f:
+                params = json.load(f)
+        except (OSError, ValueError) as e:
+            log.error("Ошибка чтения %s: %s", path, e)
+            return
+        self.params_mtime = mtime
+        for symbol in Config.SYMBOLS:
+            if params.get(symbol) != self.symbol_params.get(symbol):
+                self.set_symbol_params(symbol, params.get(symbol))
+
+    def save_symbol_params(self, path=None):
+        path = path or Config.SYMBOL_PARAMS_FILE
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.symbol_params, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def optimize_parameters(self, exchange, method=None, trials=None):
+        """Walk-forward оптимизация параметров по истории последних дней.
+
+        Возвращает {symbol: отчёт} (см. Optimizer.walk_forward).
+        """
+        # Импорт здесь: бэктест сам создаёт DataHandler
+        from modules.backtest import bars_from_ohlcv, fetch_history
+        from modules.optimizer import Optimizer
+
+        since = int((time.time() - Config.OPTIMIZER_HISTORY_DAYS * 86400) * 1000)
+        history = exchange.rest.fan_out(lambda symbol: fetch_history(exchange.rest, symbol, since), Config.SYMBOLS)
+        data = {}
+        for symbol, rows in history.items():
+            if isinstance(rows, Exception) or not rows:
+                log.warning("Нет истории для оптимизации %s: %s", symbol, rows)
+                continue
+            data[symbol] = bars_from_ohlcv(rows)
+        if not data:
+            return {}
+        optimizer = Optimizer(method=method, trials=trials)
+        return optimizer.walk_forward(data, funding=self.funding_rates)
 
-    def optimize_parameters(self):
-        """Оптимизация порогов анализа на основе истории (пример)"""
-        historical_data = self.load_last_week_trades()  # реализуйте этот метод
-        # Здесь можно использовать ML, например, sklearn
-        # from sklearn.ensemble import RandomForestRegressor
-        # model = RandomForestRegressor()
-        # model.fit(historical_data[features], historical_data['profit'])
-        # predicted_thresholds = model.predict(current_market_conditions)
-        # Config.VOLUME_RATIO = predicted_thresholds[0]
-        # Config.SPREAD_THRESHOLD = predicted_thresholds[1]
-        pass
\ No newline at end of file
+    def auto_calibrate_parameters(self, exchange):
+        """Перекалибровка по таймеру: параметры применяются, если они прибыльны вне выборки"""
+        log.info("Калибровка параметров...")
+        reports = self.optimize_parameters(exchange)
+        for symbol, report in reports.items():
+            if report['accepted']:
+                log.info("%s: новые параметры", symbol, params=report['params'],
+                         oos_return=report['oos_return'], oos_trades=report['oos_trades'])
+                self.set_symbol_params(symbol, report['params'])
+            elif symbol in self.symbol_params:
+                log.info("%s: параметры не прошли проверку, возврат к Config", symbol)
+                self.set_symbol_params(symbol, None)
+        if reports:
+            self.save_symbol_params()
@@ -1,31 +1,75 @@
 import ccxt
 from config import Config
+from modules.ws_transport import StreamTransport
+from modules.rest_client import RestClient
+from modules.mailbox import MarketMailbox, DEPTH, SNAPSHOT, KLINE
+from modules.ws_decoder import MessageDecoder
+from utils.logger import get_logger
 import threading
 from websocket import create_connection
-import json
 import time
 
+log = get_logger('Exchange')
+
 # ====================== Подключение к бирже ======================
 class Exchange:
-    def __init__(self, data_handler):
+    def __init__(self, data_handler, streams=True):
         self.data_handler = data_handler
         self.exchange = self.connect()
         self.ws_connections = {}
-        self.start_websockets()
+        self.ws_transport = None
+        # Все REST-запросы идут через общий лимитер весов Binance; запросы из
+        # обработчиков потоков (снимки стакана, дозагрузка свечей) — в пуле,
+        # чтобы не блокировать приём сообщений
+        self.rest = self.create_rest_client()
+        self._pending_rest = set()
+        self._pending_lock = threading.Lock()
+        self._pending_snapshots = set()
+        # Между приёмом и DataHandler — очередь на пару: сообщения склеиваются,
+        # а стакан и свечи пары обновляет один поток
+        self.mailbox = MarketMailbox(self.process_market_events)
+        self.decoder = MessageDecoder()
+        # Без потоков — координатор шардов: только REST (ордера, баланс)
+        if streams:
+            self.start_websockets()
         
+    def create_rest_client(self):
+        return RestClient(
+            self.exchange,
+            futures=Config.EXCHANGE == 'binanceusdm',
+            workers=Config.REST_WORKERS,
+            weight_usage=Config.REST_WEIGHT_USAGE
+        )
+
     def connect(self):
         exchange_class = getattr(ccxt, Config.EXCHANGE)
         return exchange_class({
             'apiKey': Config.API_KEY,
             'secret': Config.API_SECRET,
-            'enableRateLimit': True,
+            'enableRateLimit': False,  # Лимиты соблюдает RestClient с учётом весов запросов
             'options': {'defaultType': 'spot'}
         })
     
     def start_websockets(self):
-        """Запуск WebSocket соединений для каждой пары"""
+        """Запуск WebSocket соединений"""
+        self.mailbox.start()
+        if Config.WS_TRANSPORT == 'asyncio':
+            self.start_ws_transport()
+        else:
+            for symbol in Config.SYMBOLS:
+                self.start_ws_thread(symbol)
+
+    def start_ws_transport(self):
+        """Все пары через несколько combined-соединений в одном event loop"""
+        self.ws_transport = StreamTransport(
+            self.get_ws_base_url(),
+            self.process_ws_data,
+            streams_per_connection=Config.WS_STREAMS_PER_CONNECTION,
+            decode=self.decoder.decode
+        )
         for symbol in Config.SYMBOLS:
-            self.start_ws_thread(symbol)
+            self.ws_transport.subscribe(symbol, self.get_streams(symbol))
+        self.ws_transport.start()
     
     def start_ws_thread(self, symbol):
         """Запуск потока для WebSocket"""
@@ -36,37 +80,128 @@ class Exchange:
     def websocket_listener(self, symbol):
         """Прослушивание данных через WebSocket"""
         ws_url = self.get_ws_url(symbol)
-        print(f"[Exchange] WebSocket подключение для {symbol}: {ws_url}")
+        log.info("WebSocket подключение для %s: %s", symbol, ws_url)
         ws = create_connection(ws_url)
         while True:
             try:
-                data = json.loads(ws.recv())
+                data = self.decoder.decode(ws.recv())
                 self.process_ws_data(symbol, data)
             except Exception as e:
-                print(f"[Exchange] WebSocket error for {symbol}: {e}")
+                log.error("Ошибка WebSocket для %s: %s", symbol, e)
                 time.sleep(5)
                 ws = create_connection(ws_url)
     
-    def get_ws_url(self, symbol):
-        """Генерация URL для WebSocket (фьючерсы Binance USDM)"""
-        stream_name = f"{symbol.replace('/', '').lower()}@depth@100ms"
+    def get_streams(self, symbol):
+        """Потоки пары: diff стакана и свечи"""
+        pair = symbol.replace('/', '').lower()
+        return [f"{pair}@depth@100ms", f"{pair}@kline_{Config.TIMEFRAME}"]
+
+    def get_ws_base_url(self):
         if Config.EXCHANGE == 'binanceusdm':
-            return f"wss://fstream.binance.com/ws/{stream_name}"
+            return "wss://fstream.binance.com"
         else:
-            return f"wss://stream.binance.com:9443/ws/{stream_name}"
+            return "wss://stream.binance.com:9443"
+
+    def get_ws_url(self, symbol):
+        """Генерация URL для WebSocket: стакан и свечи в одном combined-потоке"""
+        return f"{self.get_ws_base_url()}/stream?streams={'/'.join(self.get_streams(symbol))}"
     
     def process_ws_data(self, symbol, data):
-        bids = data.get('bids') or data.get('b') or []
-        asks = data.get('asks') or data.get('a') or []
-        # Если оба массива пустые — это просто "пустое" обновление, не надо спамить
-        if not bids and not asks:
+        """Маршрутизация сообщения по типу события"""
+        # Combined-поток оборачивает событие в {"stream": ..., "data": ...}
+        data = data.get('data', data)
+        if data.get('e') == 'kline':
+            self.process_kline_data(symbol, data)
+        else:
+            self.process_depth_data(symbol, data)
+
+    def process_depth_data(self, symbol, data):
+        """Постановка diff-события стакана (@depth) в очередь пары"""
+        if 'U' not in data or 'u' not in data:
             return
-        # Если хотя бы один массив не пустой — обновляем стакан
-        if bids and asks:
-            bids = [[float(b[0]), float(b[1])] for b in bids]
-            asks = [[float(a[0]), float(a[1])] for a in asks]
-            self.data_handler.update_order_book(
-                symbol,
-                bids=bids,
-                asks=asks
-            )
+        event = (data['U'], data['u'], data.get('pu'), data.get('b', ()), data.get('a', ()))
+        self.mailbox.post(symbol, DEPTH, event, data.get('E'))
+
+    def process_kline_data(self, symbol, data):
+        """Постановка обновления свечи (@kline) в очередь пары"""
+        k = data['k']
+        bar = (k['t'], k['o'], k['h'], k['l'], k['c'], k['v'])
+        self.mailbox.post(symbol, KLINE, (bar, k['x']), data.get('E'))
+
+    def process_market_events(self, symbol, book_events, klines):
+        """Применение накопленных событий пары (поток очереди, один на пару)"""
+        for kind, event in book_events:
+            if kind == SNAPSHOT:
+                self.apply_order_book_snapshot(symbol, *event)
+            else:
+                self.apply_depth(symbol, *event)
+        for bar, closed in klines:
+            self.apply_kline(symbol, bar, closed)
+
+    def apply_depth(self, symbol, first_id, last_id, prev_id, bids, asks):
+        synced = self.data_handler.apply_order_book_diff(
+            symbol,
+            first_id=first_id,
+            last_id=last_id,
+            prev_id=prev_id,
+            bids=bids,
+            asks=asks
+        )
+        if not synced:
+            self.request_order_book_snapshot(symbol)
+
+    def apply_kline(self, symbol, bar, closed):
+        if not self.data_handler.on_kline(symbol, bar, closed=closed):
+            # Буфер пуст или пропущены свечи — дозагрузка через REST
+            self.submit_rest(('ohlcv', symbol), self.backfill_ohlcv, symbol, bar, closed)
+
+    def backfill_ohlcv(self, symbol, bar, closed):
+        self.data_handler.update_ohlcv(self, symbol)
+        self.mailbox.post(symbol, KLINE, (bar, closed))
+
+    def submit_rest(self, key, func, *args):
+        """Запуск REST-задачи в пуле; повторная задача с тем же ключом не ставится, пока идёт текущая"""
+        with self._pending_lock:
+            if key in self._pending_rest:
+                return
+            self._pending_rest.add(key)
+
+        def task():
+            try:
+                func(*args)
+            except Exception as e:
+                log.error("Ошибка REST-задачи %s: %s", key, e)
+            finally:
+                with self._pending_lock:
+                    self._pending_rest.discard(key)
+
+        self.rest.pool.submit(task)
+
+    def request_order_book_snapshot(self, symbol):
+        """Запрос снимка, если предыдущий ещё не загружен и не применён"""
+        with self._pending_lock:
+            if symbol in self._pending_snapshots:
+                return
+            self._pending_snapshots.add(symbol)
+        self.submit_rest(('order_book', symbol), self.sync_order_book, symbol)
+
+    def sync_order_book(self, symbol):
+        """Загрузка REST-снимка стакана для синхронизации с diff-потоком.
+
+        Снимок применяется в очереди пары, после уже принятых diff-событий.
+        """
+        log.info("Запрос снимка стакана для %s...", symbol)
+        try:
+            snapshot = self.rest.fetch_order_book(symbol, limit=Config.ORDER_BOOK_SNAPSHOT_LIMIT)
+        except Exception as e:
+            log.error("Ошибка получения снимка стакана для %s: %s", symbol, e)
+            with self._pending_lock:
+                self._pending_snapshots.discard(symbol)
+            return False
+        self.mailbox.post(symbol, SNAPSHOT, (snapshot['nonce'], snapshot['bids'], snapshot['asks']))
+        return True
+
+    def apply_order_book_snapshot(self, symbol, last_update_id, bids, asks):
+        with self._pending_lock:
+            self._pending_snapshots.discard(symbol)
+        return self.data_handler.load_order_book_snapshot(symbol, last_update_id, bids, asks)
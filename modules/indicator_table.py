@@ -0,0 +1,167 @@
+import threading
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+# ====================== Колоночная таблица индикаторов ======================
+class IndicatorTable:
+    """Индикаторы всех пар в одном массиве float64: строка — пара, колонка — индикатор.
+
+    Списки (ob_large_bids, ob_walls, ...) хранятся как количество элементов.
+    Лучшие цены, время стакана и последняя сделка нужны для котировок, когда
+    стакан ведёт другой процесс (см. SharedIndicatorTable).
+    """
+    COLUMNS = (
+        'ema_short', 'ema_long', 'atr', 'volume', 'volume_sma', 'volume_ratio', 'close',
+        'ob_bid_volume', 'ob_ask_volume', 'ob_ratio', 'ob_mid_price', 'ob_spread',
+        'ob_large_bids', 'ob_large_asks', 'ob_walls', 'funding_rate',
+        'ob_best_bid', 'ob_best_ask', 'ob_time', 'last_price', 'last_time',
+    )
+    INDEX = {name: i for i, name in enumerate(COLUMNS)}
+    READ_TIMEOUT = 0.05  # Макс. время без смены версии строки, которую пишут; дольше — писатель упал посреди записи
+
+    def __init__(self, symbols=()):
+        self.symbols = []
+        self.rows = {}
+        self.data = np.full((0, len(self.COLUMNS)), np.nan)
+        self.versions = np.zeros(0, dtype=np.int64)  # Версия строки (seqlock): нечётная — строка пишется
+        self._lock = threading.Lock()
+        for symbol in symbols:
+            self.add_symbol(symbol)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def add_symbol(self, symbol):
+        """Добавление строки (массив переразмещается — редкая операция)"""
+        with self._lock:
+            if symbol in self.rows:
+                return self.rows[symbol]
+            row = np.full((1, len(self.COLUMNS)), np.nan)
+            row[0, self.INDEX['funding_rate']] = 0  # Нейтральный фандинг, пока нет данных
+            self.data = np.vstack([self.data, row])
+            self.versions = np.append(self.versions, 0)
+            self.rows[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+            return self.rows[symbol]
+
+    def update(self, symbol, values):
+        """Запись значений индикаторов пары.
+
+        Писатели сериализуются блокировкой, читатели её не берут: запись обрамляется
+        версией строки, и row()/snapshot() перечитывают строки, изменившиеся во
+        время копирования.
+        """
+        row = self.rows.get(symbol)
+        if row is None:
+            row = self.add_symbol(symbol)
+        with self._lock:
+            # Чётность задаётся явно: строка, брошенная упавшим писателем нечётной,
+            # не переворачивает признак записи для следующих
+            version = self.versions[row] | 1
+            self.versions[row] = version
+            try:
+                self._write(row, values)
+            finally:
+                self.versions[row] = version + 1
+
+    def release_rows(self, symbols):
+        """Снятие признака записи со строк, брошенных писателем посреди записи (перезапуск шарда)"""
+        for symbol in symbols:
+            row = self.rows[symbol]
+            if self.versions[row] & 1:
+                self.versions[row] += 1
+
+    def _write(self, row, values):
+        data = self.data[row]
+        for name, value in values.items():
+            col = self.INDEX.get(name)
+            if col is None:
+                continue
+            if isinstance(value, (list, tuple)):
+                value = len(value)
+            data[col] = np.nan if value is None else value
+
+    def column(self, name):
+        return self.data[:, self.INDEX[name]]
+
+    def row(self, symbol):
+        """Согласованная копия строки пары"""
+        row = self.rows[symbol]
+        seen = deadline = None
+        while True:
+            versions, data = self.versions, self.data
+            version = versions[row]
+            values = data[row].copy()
+            if not version & 1 and versions[row] == version:
+                return values
+            if version != seen:
+                # Писатель продвигается: срок отсчитывается от последней смены версии
+                seen = version
+                deadline = time.monotonic() + self.READ_TIMEOUT
+            elif time.monotonic() > deadline:
+                return values  # Запись не завершится; строку обновит перезапущенный писатель
+
+    def snapshot(self):
+        """Согласованная копия всех строк"""
+        live_versions, live_data = self.versions, self.data
+        while len(live_versions) != len(live_data):
+            # add_symbol как раз переразмещает массивы
+            live_versions, live_data = self.versions, self.data
+        versions = live_versions.copy()
+        data = live_data.copy()
+        deadline = time.monotonic() + self.READ_TIMEOUT
+        while True:
+            torn = np.flatnonzero((versions & 1) | (live_versions != versions))
+            if not len(torn):
+                return data
+            current = live_versions[torn]
+            if (current != versions[torn]).any():
+                deadline = time.monotonic() + self.READ_TIMEOUT
+            elif time.monotonic() > deadline:
+                return data
+            versions[torn] = current
+            data[torn] = live_data[torn]
+
+
+# ====================== Таблица в разделяемой памяти ======================
+class SharedIndicatorTable(IndicatorTable):
+    """IndicatorTable в shared memory для шардированного режима.
+
+    Набор пар фиксирован при создании. Строку пары пишет только процесс, который
+    ведёт эту пару, так что seqlock строк работает и между процессами. Версии
+    заодно служат признаком обновления пары для координатора.
+    """
+    def __init__(self, shm, symbols, owner):
+        self.shm = shm
+        self.owner = owner
+        self.symbols = list(symbols)
+        self.rows = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.versions = np.ndarray((len(self.symbols),), dtype=np.int64, buffer=shm.buf)
+        self.data = np.ndarray((len(self.symbols), len(self.COLUMNS)), dtype=np.float64,
+                               buffer=shm.buf, offset=self.versions.nbytes)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, symbols):
+        size = len(symbols) * (len(cls.COLUMNS) + 1) * 8
+        table = cls(shared_memory.SharedMemory(create=True, size=max(1, size)), symbols, owner=True)
+        table.versions[:] = 0
+        table.data[:] = np.nan
+        table.data[:, cls.INDEX['funding_rate']] = 0
+        return table
+
+    @classmethod
+    def attach(cls, name, symbols):
+        return cls(shared_memory.SharedMemory(name=name), symbols, owner=False)
+
+    def add_symbol(self, symbol):
+        if symbol not in self.rows:
+            raise KeyError(f"Пары {symbol} нет в разделяемой таблице индикаторов")
+        return self.rows[symbol]
+
+    def close(self):
+        del self.versions, self.data
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
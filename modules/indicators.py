@@ -0,0 +1,210 @@
+from collections import deque
+import numpy as np
+import talib
+
+# ====================== Инкрементальные индикаторы ======================
+# Все индикаторы совместимы с talib: push() фиксирует закрытый бар,
+# peek() считает значение для формирующегося бара, не меняя состояние.
+
+class EMA:
+    """Экспоненциальная средняя (первое значение — SMA за period баров, как в talib)"""
+    def __init__(self, period):
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self.value = None
+        self._count = 0
+        self._sum = 0.0
+
+    def peek(self, x):
+        if self.value is not None:
+            return self.value + self.alpha * (x - self.value)
+        if self._count + 1 == self.period:
+            return (self._sum + x) / self.period
+        return None
+
+    def push(self, x):
+        value = self.peek(x)
+        if self.value is None:
+            self._count += 1
+            self._sum += x
+        self.value = value
+        return value
+
+
+class ATR:
+    """Average True Range со сглаживанием Уайлдера (как talib.ATR)"""
+    def __init__(self, period):
+        self.period = period
+        self.value = None
+        self.prev_close = None
+        self._count = 0
+        self._sum = 0.0
+
+    def _next(self, high, low, close):
+        if self.prev_close is None:
+            return None, None
+        tr = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        if self.value is not None:
+            return (self.value * (self.period - 1) + tr) / self.period, tr
+        if self._count + 1 == self.period:
+            return (self._sum + tr) / self.period, tr
+        return None, tr
+
+    def peek(self, high, low, close):
+        return self._next(high, low, close)[0]
+
+    def push(self, high, low, close):
+        value, tr = self._next(high, low, close)
+        if self.value is None and tr is not None:
+            self._count += 1
+            self._sum += tr
+        self.value = value
+        self.prev_close = close
+        return value
+
+
+class SMA:
+    """Скользящая средняя по окну period"""
+    def __init__(self, period):
+        self.period = period
+        self.value = None
+        self._window = deque(maxlen=period)
+        self._sum = 0.0
+
+    def peek(self, x):
+        if len(self._window) + 1 < self.period:
+            return None
+        dropped = self._window[0] if len(self._window) == self.period else 0.0
+        return (self._sum - dropped + x) / self.period
+
+    def push(self, x):
+        value = self.peek(x)
+        if len(self._window) == self.period:
+            self._sum -= self._window[0]
+        self._window.append(x)
+        self._sum += x
+        self.value = value
+        return value
+
+
+class IndicatorState:
+    """Набор индикаторов стратегии, обновляемый за O(1) на бар"""
+    def __init__(self, ema_short, ema_long, atr_period, volume_sma_period=20):
+        self.ema_short = EMA(ema_short)
+        self.ema_long = EMA(ema_long)
+        self.atr = ATR(atr_period)
+        self.volume_sma = SMA(volume_sma_period)
+
+    def push(self, bar):
+        """Закрытый бар (timestamp, open, high, low, close, volume)"""
+        _, _, high, low, close, volume = bar
+        return self._values(
+            self.ema_short.push(close),
+            self.ema_long.push(close),
+            self.atr.push(high, low, close),
+            self.volume_sma.push(volume),
+            close,
+            volume
+        )
+
+    def peek(self, bar):
+        """Формирующийся бар — значения без изменения состояния"""
+        _, _, high, low, close, volume = bar
+        return self._values(
+            self.ema_short.peek(close),
+            self.ema_long.peek(close),
+            self.atr.peek(high, low, close),
+            self.volume_sma.peek(volume),
+            close,
+            volume
+        )
+
+    @staticmethod
+    def _values(ema_short, ema_long, atr, volume_sma, close, volume):
+        nan = float('nan')
+        if not volume_sma:
+            volume_ratio = 0
+        else:
+            volume_ratio = volume / volume_sma
+        return {
+            'ema_short': nan if ema_short is None else ema_short,
+            'ema_long': nan if ema_long is None else ema_long,
+            'atr': nan if atr is None else atr,
+            'volume': volume,
+            'volume_sma': nan if volume_sma is None else volume_sma,
+            'volume_ratio': volume_ratio,
+            'close': close
+        }
+
+
+# ====================== Кольцевой буфер свечей ======================
+class BarBuffer:
+    """Кольцевой буфер OHLCV фиксированного размера"""
+    COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._data = np.zeros((capacity, len(self.COLUMNS)))
+        self._start = 0
+        self._size = 0
+        self.last_closed = True  # Закрыт ли последний бар
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def last_timestamp(self):
+        if not self._size:
+            return None
+        return int(self._data[(self._start + self._size - 1) % self.capacity, 0])
+
+    def last(self):
+        """Последний бар (timestamp, open, high, low, close, volume)"""
+        row = self._data[(self._start + self._size - 1) % self.capacity]
+        return (int(row[0]), *row[1:].tolist())
+
+    def append(self, bar):
+        if self._size < self.capacity:
+            self._data[(self._start + self._size) % self.capacity] = bar
+            self._size += 1
+        else:
+            self._data[self._start] = bar
+            self._start = (self._start + 1) % self.capacity
+
+    def update_last(self, bar):
+        self._data[(self._start + self._size - 1) % self.capacity] = bar
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+        self.last_closed = True
+
+    def column(self, name, count=None):
+        """Последние count значений колонки в хронологическом порядке"""
+        count = self._size if count is None else min(count, self._size)
+        col = self.COLUMNS.index(name)
+        end = self._start + self._size
+        idx = np.arange(end - count, end) % self.capacity
+        return self._data[idx, col]
+
+    def rows(self, count=None):
+        """Последние count баров массивом (n, 6) в хронологическом порядке"""
+        count = self._size if count is None else min(count, self._size)
+        end = self._start + self._size
+        return self._data[np.arange(end - count, end) % self.capacity]
+
+
+# ====================== Индикаторы по массивам ======================
+# Для бэктеста: значения совпадают с EMA, ATR и SMA выше.
+
+def ema_array(close, period):
+    return talib.EMA(close, period)
+
+
+def atr_array(high, low, close, period):
+    return talib.ATR(high, low, close, period)
+
+
+def sma_array(values, period):
+    return talib.SMA(values, period)
+
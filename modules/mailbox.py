@@ -0,0 +1,201 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+from config import Config
+from modules.scheduler import CoalescingExecutor
+from utils.helpers import metrics
+from utils.logger import get_logger
+
+log = get_logger('Mailbox')
+
+DEPTH = 'depth'        # diff стакана: (U, u, pu, bids, asks)
+SNAPSHOT = 'snapshot'  # REST-снимок стакана: (lastUpdateId, bids, asks)
+KLINE = 'kline'        # обновление свечи: (bar, closed)
+
+
+def contiguous(last, event):
+    """Продолжает ли diff-событие предыдущее без разрыва (U/u для спота, pu для фьючерсов)"""
+    if event[2] is not None:
+        return event[2] == last[1]
+    return event[0] == last[1] + 1
+
+
+def join_levels(chunks):
+    """Уровни нескольких событий подряд -> один массив (n, 2)"""
+    if len(chunks) == 1:
+        return chunks[0]
+    return np.concatenate([np.asarray(chunk, dtype=float).reshape(-1, 2) for chunk in chunks])
+
+
+def coalesce(events):
+    """Склейка накопленных событий пары.
+
+    Подряд идущие diff стакана без разрыва объединяются в один (уровни более
+    позднего события перекрывают ранние), из обновлений одной формирующейся
+    свечи остаётся последнее. Снимок разрывает склейку. Потоки стакана и свечей
+    независимы, поэтому возвращаются отдельно: (события стакана, свечи).
+    """
+    book = []
+    klines = []
+    for kind, event in events:
+        if kind == KLINE:
+            if klines and not klines[-1][1] and klines[-1][0][0] == event[0][0]:
+                klines[-1] = event
+            else:
+                klines.append(event)
+        elif kind == DEPTH and book and book[-1][0] == DEPTH and contiguous(book[-1][1], event):
+            merged = book[-1][1]
+            merged[1] = event[1]
+            merged[3].append(event[3])
+            merged[4].append(event[4])
+        elif kind == DEPTH:
+            first_id, last_id, prev_id, bids, asks = event
+            book.append((DEPTH, [first_id, last_id, prev_id, [bids], [asks]]))
+        else:
+            book.append((kind, event))
+    for i, (kind, event) in enumerate(book):
+        if kind == DEPTH:
+            first_id, last_id, prev_id, bids, asks = event
+            book[i] = (DEPTH, (first_id, last_id, prev_id, join_levels(bids), join_levels(asks)))
+    return book, klines
+
+
+# ====================== Почтовые ящики пар ======================
+class MailboxStats:
+    """Метрики очереди пары"""
+    __slots__ = ('received', 'processed', 'merged', 'dropped', 'batches', 'max_depth',
+                 'queue_lag', 'queue_lag_max', 'event_lag', 'last_event_time')
+
+    def __init__(self):
+        self.received = 0        # Событий принято
+        self.processed = 0       # Событий применено после склейки
+        self.merged = 0          # Событий, склеенных с соседними
+        self.dropped = 0         # Событий, вытесненных при переполнении
+        self.batches = 0         # Циклов обработки
+        self.max_depth = 0       # Наибольшая длина очереди
+        self.queue_lag = 0.0     # Сглаженная задержка от приёма до обработки, сек
+        self.queue_lag_max = 0.0
+        self.event_lag = None    # Задержка от времени события на бирже (E) до обработки, сек
+        self.last_event_time = None
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class MarketMailbox:
+    """Ограниченная очередь событий на пару между приёмом WebSocket и DataHandler.
+
+    Поток приёма только кладёт событие в очередь пары и помечает пару в
+    CoalescingExecutor. Обработчик забирает всё накопленное разом, склеивает diff
+    и применяет их к стакану: метрики и перцентили стакана считаются один раз за
+    цикл, а не на каждое сообщение. Executor не запускает одну пару в двух
+    потоках, поэтому у стакана и свечей пары один писатель.
+
+    При переполнении вытесняются самые старые события; OrderBook видит разрыв
+    U/u, и стакан пересинхронизируется по новому снимку.
+    """
+    def __init__(self, handler, capacity=None, workers=None):
+        self.handler = handler  # handler(symbol, book_events, klines)
+        self.capacity = capacity or Config.MAILBOX_SIZE
+        self.stats = {}
+        self._boxes = {}
+        self._lock = threading.Lock()
+        self.executor = CoalescingExecutor(self._drain, workers=workers or Config.MAILBOX_WORKERS, name='mailbox')
+        self.latency = metrics.histogram('stage_latency_seconds', stage='ws_to_book')
+        metrics.add_collector(self.collect)
+
+    def start(self):
+        self.executor.start()
+
+    def stop(self):
+        self.executor.stop()
+
+    def post(self, symbol, kind, event, event_time=None):
+        """Постановка события в очередь пары (из потока приёма; не блокирует).
+
+        event_time — время события на бирже, мс (поле E), для метрики задержки.
+        """
+        with self._lock:
+            box = self._boxes.get(symbol)
+            if box is None:
+                box = self._boxes[symbol] = deque()
+                self.stats[symbol] = MailboxStats()
+            stats = self.stats[symbol]
+            if len(box) >= self.capacity:
+                oldest = box.popleft()
+                if oldest[0] == SNAPSHOT:
+                    # Снимок не вытесняется: без него стакан не пересинхронизируется
+                    box.popleft()
+                    box.appendleft(oldest)
+                stats.dropped += 1
+                if stats.dropped % self.capacity == 1:
+                    log.warning("Очередь %s переполнена, вытеснено событий: %s", symbol, stats.dropped)
+            box.append((kind, event, time.perf_counter()))
+            stats.received += 1
+            stats.max_depth = max(stats.max_depth, len(box))
+            if event_time is not None:
+                stats.last_event_time = event_time
+        self.executor.submit(symbol)
+
+    def depth(self, symbol):
+        """Текущая длина очереди пары"""
+        box = self._boxes.get(symbol)
+        return len(box) if box is not None else 0
+
+    def _drain(self, symbol):
+        with self._lock:
+            box = self._boxes[symbol]
+            if not box:
+                return
+            self._boxes[symbol] = deque()
+            event_time = self.stats[symbol].last_event_time
+        book, klines = coalesce((kind, event) for kind, event, _ in box)
+        self.handler(symbol, book, klines)
+
+        done = time.perf_counter()
+        lag = done - box[0][2]
+        for _, _, received in box:
+            self.latency.record(done - received)
+        stats = self.stats[symbol]
+        stats.batches += 1
+        stats.processed += len(book) + len(klines)
+        stats.merged += len(box) - len(book) - len(klines)
+        stats.queue_lag += 0.1 * (lag - stats.queue_lag)
+        stats.queue_lag_max = max(stats.queue_lag_max, lag)
+        if event_time is not None:
+            stats.event_lag = time.time() - event_time / 1000
+
+    def metrics(self):
+        """{symbol: метрики очереди} с текущей длиной очереди в 'depth'"""
+        return {symbol: dict(stats.as_dict(), depth=self.depth(symbol)) for symbol, stats in self.stats.items()}
+
+    def collect(self):
+        """Метрики очередей для реестра метрик (Prometheus)"""
+        samples = []
+        for symbol, values in self.metrics().items():
+            labels = {'symbol': symbol}
+            samples += [
+                ('mailbox_queue_depth', 'gauge', labels, values['depth']),
+                ('mailbox_received_total', 'counter', labels, values['received']),
+                ('mailbox_merged_total', 'counter', labels, values['merged']),
+                ('mailbox_dropped_total', 'counter', labels, values['dropped']),
+            ]
+            if values['event_lag'] is not None:
+                samples.append(('mailbox_event_lag_seconds', 'gauge', labels, round(values['event_lag'], 6)))
+        return samples
+
+    def report(self):
+        """Сводка по всем парам в лог"""
+        metrics = self.metrics()
+        if not metrics:
+            return
+        received = sum(m['received'] for m in metrics.values())
+        merged = sum(m['merged'] for m in metrics.values())
+        dropped = sum(m['dropped'] for m in metrics.values())
+        depth = max(m['depth'] for m in metrics.values())
+        lag = max(m['queue_lag_max'] for m in metrics.values())
+        event_lags = [m['event_lag'] for m in metrics.values() if m['event_lag'] is not None]
+        event_lag = round(max(event_lags) * 1000) if event_lags else None
+        log.info("Очереди пар", received=received, merged=merged, dropped=dropped, max_depth=depth,
+                 max_queue_lag_ms=round(lag * 1000, 1), event_lag_ms=event_lag)
@@ -0,0 +1,45 @@
+from types import MappingProxyType
+
+# ====================== Снимок состояния пары ======================
+class MarketSnapshot:
+    """Неизменяемое согласованное состояние пары: индикаторы и стакан одной версии.
+
+    DataHandler при каждом обновлении собирает новый снимок из предыдущего и
+    подменяет ссылку (copy-on-write). Читатель берёт ссылку один раз и видит
+    целостное состояние, не блокируя писателей и не видя полуобновлённых полей.
+
+    bids/asks — DepthIndex сторон стакана (None, пока стакан не синхронизирован),
+    row — строка IndicatorTable той же версии (только чтение).
+    """
+    __slots__ = ('symbol', 'version', 'timestamp', 'indicators', 'row',
+                 'bids', 'asks', 'update_id', 'book_time')
+
+    def __init__(self, symbol, version, timestamp, indicators, row,
+                 bids=None, asks=None, update_id=None, book_time=None):
+        row.flags.writeable = False
+        values = (symbol, version, timestamp, MappingProxyType(indicators), row, bids, asks, update_id, book_time)
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("MarketSnapshot не изменяется; новое состояние — новый снимок")
+
+    def evolve(self, timestamp, indicators, row, **book):
+        """Следующая версия: новые индикаторы, стакан — из book или прежний"""
+        return MarketSnapshot(
+            self.symbol, self.version + 1, timestamp, indicators, row,
+            book.get('bids', self.bids), book.get('asks', self.asks),
+            book.get('update_id', self.update_id), book.get('book_time', self.book_time)
+        )
+
+    @property
+    def synced(self):
+        return self.bids is not None and self.asks is not None and len(self.bids) > 0 and len(self.asks) > 0
+
+    @property
+    def best_bid(self):
+        return float(self.bids.prices[0]) if self.synced else None
+
+    @property
+    def best_ask(self):
+        return float(self.asks.prices[0]) if self.synced else None
@@ -0,0 +1,87 @@
+import os
+import threading
+import numpy as np
+from config import Config
+from modules.tick_store import RecordFile, read_records
+from utils.logger import get_logger
+
+log = get_logger('OHLCVCache')
+
+# ====================== Кэш свечей на диске ======================
+# Закрытые свечи пары в файле фиксированных записей (формат RecordFile), один
+# файл на пару и таймфрейм: <root>/<SYMBOL>/<timeframe>.bin
+BAR_DTYPE = np.dtype([
+    ('open_time', '<i8'), ('open', '<f8'), ('high', '<f8'),
+    ('low', '<f8'), ('close', '<f8'), ('volume', '<f8'),
+])
+
+
+def cache_path(root, symbol, timeframe):
+    return os.path.join(root, symbol.replace('/', '').replace(':', '_'), f"{timeframe}.bin")
+
+
+class OHLCVCache:
+    """Дописываемый кэш закрытых свечей.
+
+    Файл читается через np.memmap, поэтому загрузка последних N свечей при старте
+    не зависит от длины сохранённой истории. Дописываются только свечи новее
+    последней сохранённой — повторная запись тех же баров ничего не меняет.
+    """
+    def __init__(self, root=None, timeframe=None):
+        self.root = root or Config.OHLCV_CACHE_DIR
+        self.timeframe = timeframe or Config.TIMEFRAME
+        self._files = {}  # symbol -> RecordFile
+        self._last = {}   # symbol -> open_time последней сохранённой свечи
+        self._lock = threading.Lock()
+
+    def path(self, symbol):
+        return cache_path(self.root, symbol, self.timeframe)
+
+    def load(self, symbol, count=None):
+        """Последние count сохранённых свечей: массив (n, 6) в порядке строк OHLCV ccxt"""
+        path = self.path(symbol)
+        if not os.path.exists(path):
+            return np.empty((0, len(BAR_DTYPE.names)))
+        try:
+            records = read_records(path, BAR_DTYPE)
+        except (OSError, ValueError) as e:
+            log.error("Ошибка чтения кэша %s: %s", path, e)
+            return np.empty((0, len(BAR_DTYPE.names)))
+        if count is not None:
+            records = records[-count:]
+        return np.column_stack([records[name].astype(float) for name in BAR_DTYPE.names])
+
+    def last_timestamp(self, symbol):
+        """open_time последней сохранённой свечи или None"""
+        with self._lock:
+            if symbol not in self._last:
+                bars = self.load(symbol, 1)
+                self._last[symbol] = int(bars[0, 0]) if len(bars) else None
+            return self._last[symbol]
+
+    def append(self, symbol, bars):
+        """Дописать закрытые свечи (строки OHLCV по возрастанию времени). Возвращает число записанных"""
+        bars = np.asarray(bars, dtype=float).reshape(-1, len(BAR_DTYPE.names))
+        last = self.last_timestamp(symbol)
+        if last is not None:
+            bars = bars[bars[:, 0] > last]
+        if not len(bars):
+            return 0
+        records = np.zeros(len(bars), dtype=BAR_DTYPE)
+        for i, name in enumerate(BAR_DTYPE.names):
+            records[name] = bars[:, i]
+        with self._lock:
+            record_file = self._files.get(symbol)
+            if record_file is None:
+                record_file = RecordFile(self.path(symbol), BAR_DTYPE, grow_records=4096)
+                self._files[symbol] = record_file
+            record_file.append(records)
+            record_file.flush()
+            self._last[symbol] = int(bars[-1, 0])
+        return len(records)
+
+    def close(self):
+        with self._lock:
+            for record_file in self._files.values():
+                record_file.close()
+            self._files.clear()
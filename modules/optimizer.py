@@ -0,0 +1,275 @@
+import itertools
+import math
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from config import Config
+from modules.backtest import BarBacktester
+from utils.logger import get_logger, set_default_level
+
+log = get_logger('Optimizer')
+
+# ====================== Общие рыночные данные ======================
+class SharedMarketData:
+    """OHLCV всех пар в одном блоке shared memory (только чтение в воркерах).
+
+    layout: {symbol: (первая строка, число баров)}, строка — 6 колонок float64.
+    """
+    COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, shm, layout, owner):
+        self.shm = shm
+        self.layout = layout
+        self.owner = owner
+        rows = sum(count for _, count in layout.values())
+        self.array = np.ndarray((rows, len(self.COLUMNS)), dtype=np.float64, buffer=shm.buf)
+
+    @classmethod
+    def create(cls, data):
+        layout = {}
+        rows = 0
+        for symbol, bars in data.items():
+            layout[symbol] = (rows, len(bars['close']))
+            rows += len(bars['close'])
+        shm = shared_memory.SharedMemory(create=True, size=max(1, rows * len(cls.COLUMNS) * 8))
+        shared = cls(shm, layout, owner=True)
+        for symbol, (first, count) in layout.items():
+            for i, name in enumerate(cls.COLUMNS):
+                shared.array[first:first + count, i] = data[symbol][name]
+        return shared
+
+    @classmethod
+    def attach(cls, name, layout):
+        return cls(shared_memory.SharedMemory(name=name), layout, owner=False)
+
+    def bars(self, symbol):
+        """Колонки пары — представления общего блока, без копирования"""
+        first, count = self.layout[symbol]
+        block = self.array[first:first + count]
+        bars = {name: block[:, i] for i, name in enumerate(self.COLUMNS)}
+        bars['timestamp'] = bars['timestamp'].astype(np.int64)
+        for name in self.COLUMNS:
+            bars[name].flags.writeable = False
+        return bars
+
+    def close(self):
+        del self.array
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class CachedBacktester(BarBacktester):
+    """Бэктест с кэшем индикаторов по (пара, индикатор, период).
+
+    Данные в shared memory неизменны, поэтому EMA одного периода считается
+    один раз на процесс, сколько бы наборов параметров её ни использовали.
+    """
+    def __init__(self, cache, params=None, **kwargs):
+        super().__init__(params, **kwargs)
+        self.cache = cache
+
+    def indicator(self, symbol, bars, kind, period):
+        key = (symbol, kind, period)
+        values = self.cache.get(key)
+        if values is None:
+            values = super().indicator(symbol, bars, kind, period)
+            self.cache[key] = values
+        return values
+
+
+# ====================== Процесс-воркер ======================
+_worker = {}
+
+
+def _init_worker(name, layout, funding):
+    # Модули бэктеста пишут в лог каждую сделку и расчёт размера — в переборе это тысячи записей
+    set_default_level(Config.OPTIMIZER_LOG_LEVEL)
+    shared = SharedMarketData.attach(name, layout)
+    _worker['data'] = {symbol: shared.bars(symbol) for symbol in layout}
+    _worker['shared'] = shared
+    _worker['funding'] = funding
+    _worker['cache'] = {}
+
+
+def _evaluate(task):
+    """Бэктест одного набора параметров на окне баров пары"""
+    params, symbol, start, end = task
+    backtester = CachedBacktester(_worker['cache'], params)
+    result = backtester.run({symbol: _worker['data'][symbol]}, funding=_worker['funding'], start=start, end=end)
+    return result.summary()
+
+
+def score(summary):
+    """Целевая функция: доходность, если сделок достаточно для оценки"""
+    if summary['trades'] < Config.OPTIMIZER_MIN_TRADES:
+        return -math.inf
+    return summary['total_return']
+
+
+# ====================== Оптимизатор ======================
+class Optimizer:
+    """Перебор параметров стратегии (grid, random, bayes) с бэктестами в пуле процессов.
+
+    Задача оптимизации (study) — пара и окно баров; для каждой ищется лучший набор.
+    """
+    def __init__(self, space=None, method=None, trials=None, workers=None, seed=None):
+        self.space = space or Config.OPTIMIZER_SPACE
+        self.method = method or Config.OPTIMIZER_METHOD
+        self.trials = trials or Config.OPTIMIZER_TRIALS
+        self.workers = workers or Config.OPTIMIZER_WORKERS
+        self.random = random.Random(seed)
+
+    @staticmethod
+    def valid(params):
+        return params.get('EMA_SHORT', Config.EMA_SHORT) < params.get('EMA_LONG', Config.EMA_LONG)
+
+    def grid(self):
+        names = list(self.space)
+        for values in itertools.product(*(self.space[name] for name in names)):
+            params = dict(zip(names, values))
+            if self.valid(params):
+                yield params
+
+    def sample(self, weights=None):
+        """Случайный набор; weights — {параметр: веса значений} для bayes"""
+        while True:
+            params = {
+                name: self.random.choices(values, weights[name] if weights else None)[0]
+                for name, values in self.space.items()
+            }
+            if self.valid(params):
+                return params
+
+    def pool(self, shared, funding=None):
+        """Пул процессов, подключённых к общим данным (кэш индикаторов живёт в воркере).
+
+        Процессы запускаются через spawn: fork из бота с потоками WebSocket,
+        REST и записи логов может унаследовать захваченные ими блокировки.
+        """
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker,
+                                   initargs=(shared.shm.name, shared.layout, funding))
+
+    def search(self, pool, studies):
+        """studies: [(symbol, start, end)]. Возвращает {study: (лучшие параметры, summary)}"""
+        if self.method == 'bayes':
+            return self._search_bayes(pool, studies)
+        if self.method == 'grid':
+            candidates = list(self.grid())
+        else:
+            candidates = self._unique_samples(self.trials)
+        return self._best(pool, {study: candidates for study in studies})
+
+    def _unique_samples(self, count):
+        seen = {}
+        for _ in range(count * 10):
+            params = self.sample()
+            seen[tuple(sorted(params.items()))] = params
+            if len(seen) >= count:
+                break
+        return list(seen.values())
+
+    def _run(self, pool, candidates):
+        """{study: [params]} -> {study: [(score, params, summary)]}"""
+        tasks = [(params, *study) for study, params_list in candidates.items() for params in params_list]
+        chunksize = max(1, len(tasks) // (self.workers * 4))
+        results = {study: [] for study in candidates}
+        for task, summary in zip(tasks, pool.map(_evaluate, tasks, chunksize=chunksize)):
+            params, study = task[0], task[1:]
+            results[study].append((score(summary), params, summary))
+        return results
+
+    def _best(self, pool, candidates):
+        best = {}
+        for study, scored in self._run(pool, candidates).items():
+            top = max(scored, key=lambda item: item[0])
+            best[study] = (top[1], top[2])
+        return best
+
+    def _search_bayes(self, pool, studies, gamma=0.25):
+        """Tree-structured Parzen Estimator по дискретным значениям.
+
+        После случайного старта значения каждого параметра выбираются с весами
+        l(x)/g(x): частота в лучшей доле gamma против остальных (со сглаживанием).
+        """
+        batch = self.workers * 4
+        history = {study: [] for study in studies}
+        initial = self._unique_samples(min(self.trials, max(batch, self.trials // 4)))
+        for study, scored in self._run(pool, {study: initial for study in studies}).items():
+            history[study] += scored
+        while len(history[studies[0]]) < self.trials:
+            candidates = {}
+            for study in studies:
+                scored = sorted(history[study], key=lambda item: item[0], reverse=True)
+                good = scored[:max(1, int(len(scored) * gamma))]
+                bad = scored[len(good):]
+                weights = {
+                    name: [
+                        (sum(p[name] == value for _, p, _ in good) + 1) / (len(good) + len(values))
+                        / ((sum(p[name] == value for _, p, _ in bad) + 1) / (len(bad) + len(values)))
+                        for value in values
+                    ]
+                    for name, values in self.space.items()
+                }
+                candidates[study] = [self.sample(weights) for _ in range(batch)]
+            for study, scored in self._run(pool, candidates).items():
+                history[study] += scored
+        best = {}
+        for study, scored in history.items():
+            top = max(scored, key=lambda item: item[0])
+            best[study] = (top[1], top[2])
+        return best
+
+    def walk_forward(self, data, funding=None, train_bars=None, test_bars=None):
+        """Walk-forward по каждой паре: подбор на обучающем окне, проверка на следующем.
+
+        Итоговые параметры пары — лучшие на последнем обучающем окне (до конца истории).
+        Возвращает {symbol: {'params', 'accepted', 'oos_return', 'oos_trades', 'folds'}}.
+        """
+        train_bars = train_bars or Config.OPTIMIZER_TRAIN_BARS
+        test_bars = test_bars or Config.OPTIMIZER_TEST_BARS
+        folds = {}
+        studies = []
+        for symbol, bars in data.items():
+            n = len(bars['close'])
+            if n < train_bars + test_bars:
+                log.warning("Мало истории для %s: %s баров", symbol, n)
+                continue
+            folds[symbol] = [(start, start + train_bars) for start in range(0, n - train_bars - test_bars + 1, test_bars)]
+            studies += [(symbol, start, end) for start, end in folds[symbol]]
+            studies.append((symbol, n - train_bars, n))
+        if not studies:
+            return {}
+
+        funding = {symbol: funding[symbol] for symbol in data if funding and symbol in funding} or None
+        shared = SharedMarketData.create(data)
+        try:
+            log.info("%s: %s окон по %s парам, %s процессов", self.method, len(studies), len(folds), self.workers)
+            with self.pool(shared, funding) as pool:
+                best = self.search(pool, studies)
+                # Проверка вне выборки: лучший набор окна на следующих test_bars барах
+                tests = {(symbol, end, end + test_bars): [best[(symbol, start, end)][0]]
+                         for symbol in folds for start, end in folds[symbol]}
+                tested = self._run(pool, tests)
+        finally:
+            shared.close()
+
+        reports = {}
+        for symbol in folds:
+            fold_results = [tested[(symbol, end, end + test_bars)][0][2] for _, end in folds[symbol]]
+            oos_return = float(np.prod([1 + r['total_return'] for r in fold_results]) - 1)
+            oos_trades = sum(r['trades'] for r in fold_results)
+            n = len(data[symbol]['close'])
+            params, summary = best[(symbol, n - train_bars, n)]
+            reports[symbol] = {
+                'params': params,
+                'in_sample': summary,
+                'oos_return': oos_return,
+                'oos_trades': oos_trades,
+                'accepted': oos_return > 0 and oos_trades >= Config.OPTIMIZER_MIN_TRADES,
+                'folds': fold_results,
+            }
+        return reports
@@ -0,0 +1,352 @@
+from collections import deque
+import numpy as np
+from config import Config
+from utils.logger import get_logger
+
+log = get_logger('OrderBook')
+
+# ====================== Локальный стакан ордеров ======================
+class BookSide:
+    """Одна сторона стакана в массиве float64 фиксированной ёмкости.
+
+    Строки массива — ключ, цена и объём уровней, уровни отсортированы от лучшей
+    цены; ключ сортировки для bid — -price. Изменения применяются пакетом; при
+    переполнении отбрасываются самые дальние от лучшей цены уровни.
+    """
+    KEY, PRICE, QTY = 0, 1, 2
+
+    def __init__(self, is_bid, capacity=None):
+        self.is_bid = is_bid
+        self.capacity = Config.ORDER_BOOK_CAPACITY if capacity is None else capacity
+        self._levels = np.empty((3, self.capacity))
+        self._spare = np.empty((3, self.capacity))  # Буфер для сдвигов при вставке и удалении
+        self._size = 0
+        self._version = 0    # Растёт при каждом изменении стороны
+        self._index = None   # DepthIndex для текущей версии
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def prices(self):
+        """Цены уровней (представление без копирования)"""
+        return self._levels[self.PRICE, :self._size]
+
+    @property
+    def qtys(self):
+        """Объёмы уровней (представление без копирования)"""
+        return self._levels[self.QTY, :self._size]
+
+    def clear(self):
+        self._size = 0
+        self._version += 1
+
+    def update(self, prices, qtys):
+        """Пакет изменений уровней (qty == 0 удаляет уровень).
+
+        Возвращает массивы (prices, old_qtys, new_qtys) уровней, которые изменились.
+        """
+        prices = np.asarray(prices, dtype=float)
+        qtys = np.asarray(qtys, dtype=float)
+        keys = -prices if self.is_bid else prices
+        if len(keys) > 1 and not (keys[1:] > keys[:-1]).all():
+            # Сортировка пакета; для повторяющейся цены действует последнее значение
+            order = np.argsort(keys, kind='stable')
+            keys, prices, qtys = keys[order], prices[order], qtys[order]
+            last = np.append(keys[1:] != keys[:-1], True)
+            keys, prices, qtys = keys[last], prices[last], qtys[last]
+
+        n = self._size
+        book_keys = self._levels[self.KEY, :n]
+        book_qtys = self._levels[self.QTY, :n]
+        if n:
+            pos = book_keys.searchsorted(keys)
+            found = book_keys.take(pos, mode='clip') == keys
+            old = np.where(found, book_qtys.take(pos, mode='clip'), 0.0)
+        else:
+            pos = np.zeros(len(keys), dtype=np.int64)
+            found = np.zeros(len(keys), dtype=bool)
+            old = np.zeros(len(keys))
+        changed = old != qtys
+        if not changed.any():
+            return prices[changed], old[changed], qtys[changed]
+
+        # Уровень появляется или исчезает, если он не найден и объём ненулевой или найден и объём 0
+        moved = changed & (found == (qtys == 0))
+        modify = changed & ~moved
+        book_qtys[pos[modify]] = qtys[modify]
+        if moved.any():
+            # Пакет отсортирован по ключу, поэтому позиции вставок и удалений идут
+            # по возрастанию: отрезки между ними копируются во второй буфер
+            levels, out = self._levels, self._spare
+            src = dst = 0
+            moved = moved.nonzero()[0]
+            rows = zip(pos[moved].tolist(), found[moved].tolist(),
+                       keys[moved].tolist(), prices[moved].tolist(), qtys[moved].tolist())
+            for p, is_found, *row in rows:
+                count = min(p - src, self.capacity - dst)
+                out[:, dst:dst + count] = levels[:, src:src + count]
+                dst += count
+                src = p
+                if is_found:
+                    src += 1
+                elif dst < self.capacity:
+                    out[:, dst] = row
+                    dst += 1
+            count = min(n - src, self.capacity - dst)
+            out[:, dst:dst + count] = levels[:, src:src + count]
+            self._levels, self._spare = out, levels
+            self._size = dst + count
+        self._version += 1
+        return prices[changed], old[changed], qtys[changed]
+
+    def set(self, price, qty):
+        """Установка объёма одного уровня. Возвращает старый объём"""
+        old_qty = self.get(price)
+        self.update([price], [qty])
+        return old_qty
+
+    def get(self, price):
+        """Объём уровня (0, если уровня нет)"""
+        key = -price if self.is_bid else price
+        i = int(self._levels[self.KEY, :self._size].searchsorted(key))
+        if i < self._size and self._levels[self.KEY, i] == key:
+            return float(self._levels[self.QTY, i])
+        return 0.0
+
+    def best(self):
+        """Лучший уровень (price, qty) или None"""
+        if not self._size:
+            return None
+        return float(self._levels[self.PRICE, 0]), float(self._levels[self.QTY, 0])
+
+    def levels(self, depth=None):
+        """Уровни от лучшей цены к худшей в виде списка [price, qty]"""
+        n = self._size if depth is None else min(depth, self._size)
+        return self._levels[self.PRICE:, :n].T.tolist()
+
+    def __iter__(self):
+        return zip(self.prices.tolist(), self.qtys.tolist())
+
+    def depth_index(self):
+        """Индекс накопленной глубины (строится заново только после изменений стороны)"""
+        index = self._index
+        if index is None or index.version != self._version:
+            index = DepthIndex(self.prices, self.qtys, self.is_bid, self._version)
+            self._index = index
+        return index
+
+
+class DepthIndex:
+    """Неизменяемый снимок стороны стакана с префиксными суммами объёма в валюте котировки.
+
+    Уровни идут от лучшей цены. Запросы — бинарный поиск по массивам:
+    объём в пределах цены, объём первых k уровней, первый уровень крупнее
+    порога, все уровни крупнее порога.
+    """
+    def __init__(self, prices, qtys, is_bid, version=0):
+        self.is_bid = is_bid
+        self.version = version
+        self.prices = np.array(prices, dtype=float)
+        self.keys = -self.prices if is_bid else self.prices
+        self.notional = self.prices * np.array(qtys, dtype=float)
+        self.cumulative = np.cumsum(self.notional)
+        # Индекс порогов: бегущий максимум (первый уровень крупнее N) и
+        # порядок уровней по убыванию объёма (все уровни крупнее N)
+        self.running_max = np.maximum.accumulate(self.notional) if len(self.notional) else self.notional
+        self.by_size = np.argsort(-self.notional, kind='stable')
+        self.sorted_notional = -self.notional[self.by_size]
+
+    def __len__(self):
+        return len(self.prices)
+
+    def count_within(self, limit_price):
+        """Число уровней не хуже limit_price"""
+        key = -limit_price if self.is_bid else limit_price
+        return int(np.searchsorted(self.keys, key, side='right'))
+
+    def notional_within(self, limit_price):
+        """Суммарный объём уровней от лучшей цены до limit_price включительно"""
+        count = self.count_within(limit_price)
+        return float(self.cumulative[count - 1]) if count else 0.0
+
+    def notional_top(self, levels):
+        """Суммарный объём первых levels уровней"""
+        count = min(levels, len(self.cumulative))
+        return float(self.cumulative[count - 1]) if count else 0.0
+
+    def first_above(self, threshold, max_levels=None):
+        """Номер первого от лучшей цены уровня с объёмом больше threshold или None"""
+        i = int(np.searchsorted(self.running_max, threshold, side='right'))
+        if i >= len(self.running_max) or (max_levels is not None and i >= max_levels):
+            return None
+        return i
+
+    def levels_above(self, threshold):
+        """Уровни с объёмом больше threshold: [(price, notional)] от лучшей цены"""
+        count = int(np.searchsorted(self.sorted_notional, -threshold, side='left'))
+        idx = np.sort(self.by_size[:count])
+        return list(zip(self.prices[idx].tolist(), self.notional[idx].tolist()))
+
+
+class OrderBook:
+    """Локальный стакан, синхронизируемый по REST-снимку и diff-потоку Binance (U/u/pu)"""
+    def __init__(self, symbol, max_buffer=1000):
+        self.symbol = symbol
+        self.bids = BookSide(is_bid=True)
+        self.asks = BookSide(is_bid=False)
+        self.last_update_id = 0
+        self.synced = False
+        self._first_event = True
+        # События, пришедшие до загрузки снимка
+        self._buffer = deque(maxlen=max_buffer)
+
+    def reset(self):
+        """Сброс стакана — требуется новый REST-снимок"""
+        self.bids.clear()
+        self.asks.clear()
+        self.last_update_id = 0
+        self.synced = False
+        self._first_event = True
+
+    def load_snapshot(self, last_update_id, bids, asks):
+        """Загрузка REST-снимка и применение накопленных событий. Возвращает список изменений"""
+        self.reset()
+        bid_prices, bid_qtys = self._levels(bids)
+        ask_prices, ask_qtys = self._levels(asks)
+        bid_prices, _, bid_qtys = self.bids.update(bid_prices, bid_qtys)
+        ask_prices, _, ask_qtys = self.asks.update(ask_prices, ask_qtys)
+        self.last_update_id = last_update_id
+        self.synced = True
+
+        changes = []
+        if len(bid_prices):
+            changes.append(('bid', bid_prices, np.zeros(len(bid_prices)), bid_qtys))
+        if len(ask_prices):
+            changes.append(('ask', ask_prices, np.zeros(len(ask_prices)), ask_qtys))
+        buffered = list(self._buffer)
+        self._buffer.clear()
+        for i, event in enumerate(buffered):
+            applied = self.apply_diff(*event)
+            if applied is None:
+                # Снимок не стыкуется с потоком — оставшиеся события ждут следующий снимок
+                self._buffer.extend(buffered[i + 1:])
+                return None
+            changes += applied
+        return changes
+
+    def apply_diff(self, first_id, last_id, prev_id, bids, asks):
+        """Применение diff-события.
+
+        Возвращает список изменений по сторонам (side, prices, old_qtys, new_qtys)
+        с массивами numpy или None, если стакан не синхронизирован и нужен новый снимок.
+        """
+        if not self.synced:
+            self._buffer.append((first_id, last_id, prev_id, bids, asks))
+            return None
+        # Событие целиком старше снимка. Фьючерсы: первое событие после снимка —
+        # то, в котором U <= lastUpdateId <= u, поэтому u == lastUpdateId ещё применяется
+        futures_first = self._first_event and prev_id is not None
+        if last_id < self.last_update_id or last_id == self.last_update_id and not futures_first:
+            return []
+        if futures_first:
+            gap = first_id > self.last_update_id
+        elif self._first_event:
+            # Спот: U <= lastUpdateId + 1 <= u
+            gap = first_id > self.last_update_id + 1
+        elif prev_id is not None:
+            # Фьючерсы: pu должен совпадать с u предыдущего события
+            gap = prev_id != self.last_update_id
+        else:
+            gap = first_id != self.last_update_id + 1
+        if gap:
+            log.warning("Разрыв последовательности для %s", self.symbol,
+                        expected=self.last_update_id + 1, first_id=first_id, prev_id=prev_id)
+            self.reset()
+            self._buffer.append((first_id, last_id, prev_id, bids, asks))
+            return None
+
+        changes = []
+        for side, book_side, levels in (('bid', self.bids, bids), ('ask', self.asks, asks)):
+            if not len(levels):
+                continue
+            prices, old_qtys, new_qtys = book_side.update(*self._levels(levels))
+            if len(prices):
+                changes.append((side, prices, old_qtys, new_qtys))
+        self.last_update_id = last_id
+        self._first_event = False
+        return changes
+
+    @staticmethod
+    def _levels(levels):
+        """Уровни [[price, qty], ...] (числа или строки) -> массивы цен и объёмов"""
+        if not len(levels):
+            return np.empty(0), np.empty(0)
+        array = np.asarray(levels, dtype=float).reshape(-1, 2)
+        return array[:, 0], array[:, 1]
+
+    def mid_price(self):
+        bid, ask = self.bids.best(), self.asks.best()
+        if bid is None or ask is None:
+            return None
+        return (bid[0] + ask[0]) / 2
+
+    def depth_within(self, pct, mid_price=None):
+        """Объём в валюте котировки в пределах pct от середины: (bids, asks)"""
+        mid_price = mid_price or self.mid_price()
+        if mid_price is None:
+            return 0.0, 0.0
+        return (self.bids.depth_index().notional_within(mid_price * (1 - pct)),
+                self.asks.depth_index().notional_within(mid_price * (1 + pct)))
+
+    def snapshot(self, depth=None):
+        """Копия стакана в формате {'bids': [[price, qty]], 'asks': [...]}"""
+        return {'bids': self.bids.levels(depth), 'asks': self.asks.levels(depth)}
+
+
+# ====================== История стакана ======================
+class BookHistory:
+    """Кольцевой буфер снимков верхних depth уровней в заранее выделенных массивах.
+
+    Каждый снимок пишется дважды — в слоты i и i + capacity, поэтому последние
+    count снимков всегда лежат подряд и читаются срезом без копирования.
+    """
+    FIELDS = ('bid_prices', 'bid_qtys', 'ask_prices', 'ask_qtys')
+
+    def __init__(self, capacity, depth):
+        self.capacity = capacity
+        self.depth = depth
+        self.timestamps = np.zeros(2 * capacity)
+        self.update_ids = np.zeros(2 * capacity, dtype=np.int64)
+        self.arrays = {name: np.full((2 * capacity, depth), np.nan) for name in self.FIELDS}
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def push(self, book, timestamp):
+        """Снимок верхних уровней стакана (вызывать под блокировкой стакана)"""
+        for slot in (self._next, self._next + self.capacity):
+            self.timestamps[slot] = timestamp
+            self.update_ids[slot] = book.last_update_id
+            for side, prefix in ((book.bids, 'bid'), (book.asks, 'ask')):
+                n = min(len(side), self.depth)
+                prices = self.arrays[f'{prefix}_prices'][slot]
+                qtys = self.arrays[f'{prefix}_qtys'][slot]
+                prices[:n] = side.prices[:n]
+                qtys[:n] = side.qtys[:n]
+                prices[n:] = np.nan
+                qtys[n:] = np.nan
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def window(self, count=None):
+        """Последние count снимков от старых к новым: словарь представлений (count, depth)"""
+        count = self._count if count is None else min(count, self._count)
+        end = self._next + self.capacity
+        start = end - count
+        window = {name: array[start:end] for name, array in self.arrays.items()}
+        window['timestamps'] = self.timestamps[start:end]
+        window['update_ids'] = self.update_ids[start:end]
+        return window
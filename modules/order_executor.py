@@ -1,28 +1,59 @@
+import time
+from config import Config
+from modules.order_gateway import OrderGateway
+from utils.helpers import metrics
+from utils.logger import get_logger
+
+log = get_logger('OrderExecutor')
+
 # ====================== Исполнение ордеров ======================
 class OrderExecutor:
-    def __init__(self, exchange):
+    """Ордера стратегии через OrderGateway.
+
+    submit_order возвращает TrackedOrder сразу после постановки в очередь,
+    place_order дожидается ответа биржи. Без gateway ордера отправляются
+    синхронно в вызывающем потоке.
+    """
+    def __init__(self, exchange, gateway=None):
         self.exchange = exchange
-    
-    def place_order(self, symbol, side, amount, price, order_type='limit'):
-        """Размещение ордера"""
-        print(f"[OrderExecutor] Размещение ордера: {side} {amount} {symbol} по цене {price} (тип: {order_type})")
+        self.gateway = gateway or OrderGateway(exchange, asynchronous=False)
+        self.signal_latency = metrics.histogram('stage_latency_seconds', stage='signal_to_order')
+        self.close_failures = metrics.counter('position_close_failures_total')
+
+    def submit_order(self, symbol, side, amount, price=None, order_type='limit', signal_time=None, reduce_only=False):
+        """Постановка ордера в очередь. signal_time — time.perf_counter() момента сигнала"""
+        log.info("Размещение ордера: %s %s %s по цене %s (тип: %s)", side, amount, symbol, price, order_type)
+        order = self.gateway.submit(symbol, side, amount, price, order_type, reduce_only=reduce_only)
+        if signal_time is not None:
+            self.signal_latency.record(time.perf_counter() - signal_time)
+        return order
+
+    def place_order(self, symbol, side, amount, price, order_type='limit', signal_time=None):
+        """Размещение ордера с ожиданием ответа биржи. Возвращает ордер ccxt или None"""
+        order = self.submit_order(symbol, side, amount, price, order_type, signal_time)
         try:
-            order = self.exchange.exchange.create_order(
-                symbol=symbol,
-                type=order_type,
-                side=side,
-                amount=amount,
-                price=price,
-                params={'timeInForce': 'GTC'}
-            )
-            print(f"[OrderExecutor] Ордер размещён: {order}")
-            return order
+            return order.ack.result(Config.ORDER_ACK_TIMEOUT)
         except Exception as e:
-            print(f"[OrderExecutor] Ошибка размещения ордера: {e}")
+            log.error("Ошибка размещения ордера: %s", e)
             return None
 
-    def close_position(self, position):
-        """Закрытие позиции"""
-        print(f"[OrderExecutor] Закрытие позиции: {position}")
-        # Реализация закрытия
-        pass
\ No newline at end of file
+    def close_position(self, position, on_failed=None):
+        """Закрытие позиции рыночным ордером на уменьшение (reduceOnly на фьючерсах).
+
+        Возвращает TrackedOrder. Если биржа ордер не приняла, вызывается
+        on_failed(position, error) — позиция не должна пропасть из мониторинга.
+        """
+        log.info("Закрытие позиции", position=position)
+        order = self.submit_order(position['symbol'], 'sell', position['size'], order_type='market', reduce_only=True)
+        order.ack.add_done_callback(lambda ack: self._on_close_ack(position, ack, on_failed))
+        return order
+
+    def _on_close_ack(self, position, ack, on_failed):
+        error = ack.exception()
+        if error is None:
+            log.info("Позиция %s закрыта", position['symbol'], order=ack.result())
+            return
+        self.close_failures.inc()
+        log.error("Позиция %s не закрыта: %s", position['symbol'], error, size=position['size'])
+        if on_failed is not None:
+            on_failed(position, error)
@@ -0,0 +1,447 @@
+import itertools
+import math
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import ccxt
+from config import Config
+from utils.helpers import metrics
+from utils.logger import get_logger
+
+log = get_logger('OrderGateway')
+
+
+def precision_step(value, tick_size):
+    """Шаг из precision ccxt: сам шаг (TICK_SIZE) или число знаков (DECIMAL_PLACES)"""
+    if value is None:
+        return None
+    return float(value) if tick_size else 10.0 ** -value
+
+
+def round_step(value, step, mode='nearest'):
+    """Кратное шагу (floor, ceil или ближайшее); хвост float убирается округлением до знаков шага"""
+    if not step:
+        return value
+    units = value / step
+    if mode == 'floor':
+        units = math.floor(units + 1e-9)
+    elif mode == 'ceil':
+        units = math.ceil(units - 1e-9)
+    else:
+        units = round(units)
+    return round(units * step, max(0, -math.floor(math.log10(step))))
+
+
+# ====================== Правила рынков ======================
+class MarketRules:
+    """Шаг цены и объёма, минимальный объём и стоимость ордера по парам.
+
+    Кэш заполняется из load_markets один раз при запуске; дальше округление и
+    проверка минимумов идут локально, без ccxt в пути отправки ордера. Пары без
+    описания рынка (бэктест, офлайн-режим) не округляются.
+    """
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.rules = {}  # symbol -> (шаг цены, шаг объёма, мин. объём, мин. стоимость)
+
+    def load(self):
+        if hasattr(self.exchange.rest, 'ensure_markets'):
+            self.exchange.rest.ensure_markets()
+        api = self.exchange.exchange
+        tick_size = getattr(api, 'precisionMode', ccxt.TICK_SIZE) == ccxt.TICK_SIZE
+        for symbol, market in (getattr(api, 'markets', None) or {}).items():
+            precision = market.get('precision') or {}
+            limits = market.get('limits') or {}
+            self.rules[symbol] = (
+                precision_step(precision.get('price'), tick_size),
+                precision_step(precision.get('amount'), tick_size),
+                (limits.get('amount') or {}).get('min') or 0.0,
+                (limits.get('cost') or {}).get('min') or 0.0,
+            )
+        return len(self.rules)
+
+    def round_amount(self, symbol, amount):
+        """Объём вниз до шага: округление вверх могло бы превысить риск или остаток"""
+        rule = self.rules.get(symbol)
+        return round_step(amount, rule[1], 'floor') if rule else amount
+
+    def round_price(self, symbol, price, side):
+        """Цена до шага в пользу бота: покупка — вниз, продажа — вверх"""
+        rule = self.rules.get(symbol)
+        return round_step(price, rule[0], 'floor' if side == 'buy' else 'ceil') if rule else price
+
+    def validate(self, symbol, amount, price=None):
+        rule = self.rules.get(symbol)
+        if amount <= 0:
+            raise ccxt.InvalidOrder(f"{symbol}: объём {amount} после округления равен нулю")
+        if rule is None:
+            return
+        if amount < rule[2]:
+            raise ccxt.InvalidOrder(f"{symbol}: объём {amount} меньше минимального {rule[2]}")
+        if price is not None and amount * price < rule[3]:
+            raise ccxt.InvalidOrder(f"{symbol}: стоимость {amount * price} меньше минимальной {rule[3]}")
+
+
+# ====================== Состояние ордера ======================
+PENDING = 'PENDING'  # Отправлен, ответа биржи ещё нет
+NEW = 'NEW'
+PARTIALLY_FILLED = 'PARTIALLY_FILLED'
+FILLED = 'FILLED'
+CANCELED = 'CANCELED'
+REJECTED = 'REJECTED'
+EXPIRED = 'EXPIRED'
+
+TERMINAL = {FILLED, CANCELED, REJECTED, EXPIRED}
+# Ответ REST и события потока приходят в любом порядке: переход назад по
+# цепочке означает устаревшее событие и отбрасывается
+TRANSITIONS = {
+    PENDING: {NEW, PARTIALLY_FILLED, FILLED, CANCELED, REJECTED, EXPIRED},
+    NEW: {PARTIALLY_FILLED, FILLED, CANCELED, EXPIRED},
+    PARTIALLY_FILLED: {FILLED, CANCELED, EXPIRED},
+}
+# Поле X в executionReport / ORDER_TRADE_UPDATE; PENDING_CANCEL состояние не меняет
+BINANCE_STATUSES = {
+    'NEW': NEW, 'PARTIALLY_FILLED': PARTIALLY_FILLED, 'FILLED': FILLED, 'CANCELED': CANCELED,
+    'REJECTED': REJECTED, 'EXPIRED': EXPIRED, 'EXPIRED_IN_MATCH': EXPIRED,
+}
+CCXT_STATUSES = {'open': NEW, 'closed': FILLED, 'canceled': CANCELED, 'expired': EXPIRED, 'rejected': REJECTED}
+
+
+def ccxt_status(order):
+    status = CCXT_STATUSES.get(order.get('status'), NEW)
+    if status == NEW and order.get('filled'):
+        return PARTIALLY_FILLED
+    return status
+
+
+class TrackedOrder:
+    """Ордер от отправки до финального статуса.
+
+    ack — Future с ответом биржи (ордер ccxt) или исключением; статус и
+    исполненный объём дальше обновляются событиями user-data stream. Исключение
+    в ack не всегда значит, что ордера нет: при таймауте статус остаётся PENDING
+    до события потока или сверки. Подписчики (add_listener) вызываются на
+    каждом переходе состояния.
+    """
+    __slots__ = ('client_id', 'symbol', 'side', 'type', 'amount', 'price', 'reduce_only',
+                 'id', 'status', 'filled', 'average', 'submitted', 'ack', 'error', 'listeners')
+
+    def __init__(self, client_id, symbol, side, type, amount, price, reduce_only=False):
+        self.client_id = client_id
+        self.symbol = symbol
+        self.side = side
+        self.type = type
+        self.amount = amount
+        self.price = price
+        self.reduce_only = reduce_only
+        self.id = None
+        self.status = PENDING
+        self.filled = 0.0
+        self.average = None
+        self.submitted = time.perf_counter()
+        self.ack = Future()
+        self.error = None
+        self.listeners = []
+
+    @property
+    def done(self):
+        return self.status in TERMINAL
+
+    def add_listener(self, callback):
+        """callback(order) на каждом переходе; если ответ уже был — вызывается сразу"""
+        self.listeners.append(callback)
+        if self.status != PENDING:
+            callback(self)
+
+    def notify(self):
+        for callback in self.listeners:
+            try:
+                callback(self)
+            except Exception as e:
+                log.error("Ошибка подписчика ордера %s: %s", self.client_id, e)
+
+    def update(self, status, filled=None, average=None, order_id=None):
+        """Переход состояния. False — событие устарело или статус не меняет состояние"""
+        if status is None:
+            return False
+        if status not in TRANSITIONS.get(self.status, ()):
+            # Повторный PARTIALLY_FILLED с бо́льшим исполнением — тоже шаг вперёд
+            if status != self.status or filled is None or filled <= self.filled:
+                return False
+        self.status = status
+        if filled is not None:
+            self.filled = float(filled)
+        if average:
+            self.average = float(average)
+        if order_id is not None:
+            self.id = str(order_id)
+        return True
+
+
+# ====================== Шлюз ордеров ======================
+class OrderGateway:
+    """Асинхронная отправка ордеров с локальным округлением и отслеживанием статусов.
+
+    submit() округляет объём и цену по MarketRules, проверяет минимумы и ставит
+    ордер в очередь, сразу возвращая TrackedOrder. Поток отправки забирает всё,
+    что накопилось в очереди, не дожидаясь новых ордеров: на фьючерсах пачка
+    уходит одним batchOrders, иначе ордера отправляются параллельно в своём пуле
+    (не в общем пуле рыночных REST-запросов). Статусы приходят из ответа REST и
+    из user-data stream по clientOrderId. asynchronous=False — отправка в
+    вызывающем потоке (бэктест).
+    """
+    def __init__(self, exchange, rules=None, asynchronous=True, batch_size=None, workers=None):
+        self.exchange = exchange
+        self.rules = rules or MarketRules(exchange)
+        self.asynchronous = asynchronous
+        self.batch_size = batch_size or Config.ORDER_BATCH_SIZE
+        api = exchange.exchange
+        # batchOrders есть только на фьючерсах; у бумажного счёта batch-метода нет
+        self.batch = (getattr(exchange.rest, 'futures', False) and self.batch_size > 1
+                      and callable(getattr(type(api), 'create_orders', None))
+                      and bool(getattr(api, 'has', {}).get('createOrders')))
+        self.orders = {}  # clientOrderId -> TrackedOrder до финального статуса
+        self.by_id = {}   # id биржи -> TrackedOrder (события бумажного счёта несут только id)
+        self.history = deque(maxlen=Config.ORDER_HISTORY_SIZE)
+        self.prefix = f"sb{int(time.time()):x}-"
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._queue = queue.SimpleQueue()
+        self._pool = None
+        self._thread = None
+        self.ack_latency = metrics.histogram('stage_latency_seconds', stage='order_ack')
+        self.orders_ok = metrics.counter('orders_total', result='ok')
+        self.orders_error = metrics.counter('orders_total', result='error')
+        metrics.add_collector(self.collect)
+
+    def start(self):
+        """Загрузка правил рынков и запуск потока отправки"""
+        log.info("Правила рынков загружены: %s пар", self.rules.load())
+        if not self.asynchronous:
+            return
+        self._pool = ThreadPoolExecutor(max_workers=Config.ORDER_WORKERS, thread_name_prefix='orders')
+        self._thread = threading.Thread(target=self._run, name='order-gateway')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._pool.shutdown(wait=True)
+
+    def collect(self):
+        return [('orders_in_flight', 'gauge', {}, len(self.orders))]
+
+    def submit(self, symbol, side, amount, price=None, order_type='limit', reduce_only=False):
+        """Постановка ордера в очередь отправки. Возвращает TrackedOrder"""
+        amount = self.rules.round_amount(symbol, amount)
+        if price is not None:
+            price = self.rules.round_price(symbol, price, side)
+        order = TrackedOrder(f"{self.prefix}{next(self._ids)}", symbol, side, order_type, amount, price, reduce_only)
+        try:
+            self.rules.validate(symbol, amount, price)
+        except ccxt.InvalidOrder as e:
+            self._fail(order, e)
+            return order
+        with self._lock:
+            self.orders[order.client_id] = order
+        if self.asynchronous:
+            self._queue.put(order)
+        else:
+            self._send(order)
+        return order
+
+    def params(self, order):
+        params = {'newClientOrderId': order.client_id}
+        if order.type == 'limit':
+            params['timeInForce'] = 'GTC'
+        if order.reduce_only and getattr(self.exchange.rest, 'futures', False):
+            params['reduceOnly'] = True
+        return params
+
+    # ---------- Отправка ----------
+    def _run(self):
+        while True:
+            order = self._queue.get()
+            if order is None:
+                return
+            batch = [order]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    order = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if order is None:
+                    stop = True
+                    break
+                batch.append(order)
+            if self.batch and len(batch) > 1:
+                self._pool.submit(self._send_batch, batch)
+            else:
+                for order in batch:
+                    self._pool.submit(self._send, order)
+            if stop:
+                return
+
+    def _send(self, order):
+        try:
+            response = self.exchange.rest.request(
+                1, self.exchange.exchange.create_order,
+                order.symbol, order.type, order.side, order.amount, order.price, self.params(order)
+            )
+        except Exception as e:
+            self._fail(order, e)
+            return
+        self._acked(order, response)
+
+    def _send_batch(self, orders):
+        requests = [{
+            'symbol': order.symbol, 'type': order.type, 'side': order.side,
+            'amount': order.amount, 'price': order.price, 'params': self.params(order),
+        } for order in orders]
+        metrics.counter('order_batches_total').inc()
+        try:
+            responses = self.exchange.rest.request(5, self.exchange.exchange.create_orders, requests)
+        except Exception as e:
+            for order in orders:
+                self._fail(order, e)
+            return
+        for order, response in zip(orders, responses):
+            if response.get('id') is None:
+                # Ошибка отдельного ордера пачки: {"code": ..., "msg": ...}
+                info = response.get('info') or {}
+                self._fail(order, ccxt.InvalidOrder(info.get('msg', str(info))))
+            else:
+                self._acked(order, response)
+
+    def _acked(self, order, response):
+        self.ack_latency.record(time.perf_counter() - order.submitted)
+        self.orders_ok.inc()
+        with self._lock:
+            if response.get('id') is not None and order.client_id in self.orders:
+                self.by_id[str(response['id'])] = order
+            changed = self._apply(order, ccxt_status(response), response.get('filled'), response.get('average'),
+                                  response.get('id'))
+        log.info("Ордер %s подтверждён", order.client_id, id=order.id, status=order.status, symbol=order.symbol)
+        order.ack.set_result(response)
+        if changed:
+            order.notify()
+
+    def _fail(self, order, error):
+        self.orders_error.inc()
+        order.error = error
+        if isinstance(error, ccxt.RequestTimeout):
+            # Ордер мог дойти до биржи: статус придёт из потока или при сверке
+            log.error("Ордер %s: нет ответа биржи, статус неизвестен: %s", order.client_id, error)
+        else:
+            log.error("Ордер %s %s %s %s отклонён: %s", order.client_id, order.side, order.amount, order.symbol, error)
+            with self._lock:
+                self._apply(order, REJECTED)
+        order.ack.set_exception(error)
+        if order.status == REJECTED:
+            order.notify()
+
+    def _apply(self, order, status, filled=None, average=None, order_id=None):
+        """Переход состояния (под self._lock); завершённый ордер уходит в историю.
+
+        Подписчиков ордера вызывающий оповещает (order.notify) уже после
+        освобождения блокировки: они сами отправляют ордера.
+        """
+        if not order.update(status, filled, average, order_id):
+            return False
+        if order.done and self.orders.pop(order.client_id, None) is not None:
+            if order.id is not None:
+                self.by_id.pop(order.id, None)
+            self.history.append(order)
+        return True
+
+    # ---------- Обновления статусов ----------
+    def on_update(self, client_id, status, filled=None, average=None, order_id=None):
+        with self._lock:
+            order = self.orders.get(client_id)
+            if order is None:
+                return False  # Чужой или уже завершённый ордер
+            if order_id is not None and order.id is None:
+                self.by_id[str(order_id)] = order
+            changed = self._apply(order, status, filled, average, order_id)
+        if changed:
+            order.notify()
+        return changed
+
+    def on_execution_report(self, event):
+        """executionReport (спот): z — исполненный объём, Z — его стоимость"""
+        # У отмены исходный clientOrderId в поле C, а в c — id запроса отмены
+        filled = float(event['z'])
+        self.on_update(event.get('C') or event['c'], BINANCE_STATUSES.get(event['X']), filled,
+                       float(event['Z']) / filled if filled else None, event.get('i'))
+
+    def on_order_trade_update(self, event):
+        """ORDER_TRADE_UPDATE (фьючерсы): ap — средняя цена исполнения"""
+        data = event['o']
+        self.on_update(data['c'], BINANCE_STATUSES.get(data['X']), float(data['z']), float(data['ap']),
+                       data.get('i'))
+
+    def on_order(self, order):
+        """Ордер в формате ccxt (события бумажного счёта)"""
+        with self._lock:
+            tracked = self.by_id.get(str(order['id']))
+            changed = tracked is not None and self._apply(tracked, ccxt_status(order), order.get('filled'),
+                                                          order.get('average'))
+        if changed:
+            tracked.notify()
+
+    def cancel(self, order):
+        """Отмена ордера (например, неисполненного остатка входа)"""
+        if order.done:
+            return
+        if order.id is None:
+            # Ответа на отправку не было — сначала узнаём, дошёл ли ордер
+            self.reconcile([order])
+            if order.id is None or order.done:
+                return
+        try:
+            response = self.exchange.rest.request(1, self.exchange.exchange.cancel_order, order.id, order.symbol)
+        except ccxt.OrderNotFound:
+            self.reconcile([order])  # Уже исполнен или отменён
+            return
+        except Exception as e:
+            log.error("Ошибка отмены ордера %s: %s", order.client_id, e)
+            return
+        self._reconciled(order, response)
+
+    def reconcile(self, orders=None):
+        """Сверка незавершённых ордеров через REST (после переподключения потока, при отмене)"""
+        if orders is None:
+            with self._lock:
+                orders = list(self.orders.values())
+        for order in orders:
+            if order.status == PENDING and not order.ack.done():
+                continue  # Ответ на отправку ещё в пути
+            params = {} if order.id else {'origClientOrderId': order.client_id}
+            try:
+                response = self.exchange.rest.request(
+                    2, self.exchange.exchange.fetch_order, order.id, order.symbol, params
+                )
+            except ccxt.OrderNotFound:
+                with self._lock:
+                    changed = self._apply(order, REJECTED)
+                if changed:
+                    order.notify()
+                continue
+            except Exception as e:
+                log.error("Ошибка сверки ордера %s: %s", order.client_id, e)
+                continue
+            self._reconciled(order, response)
+
+    def _reconciled(self, order, response):
+        with self._lock:
+            if response.get('id') is not None and order.id is None and order.client_id in self.orders:
+                self.by_id[str(response['id'])] = order
+            changed = self._apply(order, ccxt_status(response), response.get('filled'), response.get('average'),
+                                  response.get('id'))
+        if changed:
+            order.notify()
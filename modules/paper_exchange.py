@@ -0,0 +1,569 @@
+import heapq
+import itertools
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import deque
+import ccxt
+from config import Config
+from modules.exchange import Exchange
+from modules.rest_client import RestClient
+from utils.logger import get_logger
+
+log = get_logger('PaperExchange')
+
+# ====================== Бумажная торговля ======================
+# Ордера не уходят на биржу: их исполняет локальный движок сопоставления по
+# стакану, который ведёт DataHandler (живой поток или воспроизведение тиков).
+# Интерфейс — как у ccxt, поэтому OrderExecutor и RiskManager работают без изменений.
+
+class PaperOrder:
+    __slots__ = ('id', 'symbol', 'side', 'type', 'price', 'amount', 'filled', 'cost', 'fee', 'status',
+                 'time_in_force', 'timestamp', 'activate_at', 'queue_ahead', 'reserved')
+
+    def __init__(self, order_id, symbol, side, type, amount, price, time_in_force, timestamp, activate_at):
+        self.id = order_id
+        self.symbol = symbol
+        self.side = side
+        self.type = type
+        self.price = price
+        self.amount = amount
+        self.filled = 0.0
+        self.cost = 0.0
+        self.fee = 0.0
+        self.status = 'pending'   # pending (задержка сети) -> open -> closed / canceled
+        self.time_in_force = time_in_force
+        self.timestamp = timestamp
+        self.activate_at = activate_at
+        self.queue_ahead = 0.0    # Объём рынка перед ордером на его уровне
+        self.reserved = 0.0       # Зарезервированные средства под остаток ордера
+
+    @property
+    def remaining(self):
+        return self.amount - self.filled
+
+    @property
+    def done(self):
+        return self.remaining <= self.amount * 1e-9
+
+    def to_dict(self):
+        """Ордер в формате ccxt"""
+        return {
+            'id': self.id,
+            'symbol': self.symbol,
+            'type': self.type,
+            'side': self.side,
+            'price': self.price,
+            'amount': self.amount,
+            'filled': self.filled,
+            'remaining': max(self.remaining, 0.0),
+            'cost': self.cost,
+            'average': self.cost / self.filled if self.filled else None,
+            'status': 'open' if self.status == 'pending' else self.status,
+            'timeInForce': self.time_in_force,
+            'timestamp': int(self.timestamp * 1000),
+            'fee': {'cost': self.fee, 'currency': self.symbol.split('/')[1].split(':')[0]},
+        }
+
+
+class PaperAccount:
+    """Балансы бумажного счёта: свободные и зарезервированные под открытые ордера.
+
+    Подписчики (add_listener) получают изменившиеся активы событием в формате
+    outboundAccountPosition user-data stream — AccountState обновляется так же,
+    как от биржи, без сверки через fetch_balance.
+    """
+    def __init__(self, balances):
+        self.free = {currency: float(amount) for currency, amount in balances.items()}
+        self.used = {currency: 0.0 for currency in balances}
+        self.lock = threading.Lock()
+        self.listeners = []  # callback(event)
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def reserve(self, currency, amount):
+        with self.lock:
+            if self.free.get(currency, 0.0) < amount:
+                return False
+            self.free[currency] -= amount
+            self.used[currency] = self.used.get(currency, 0.0) + amount
+            event = self._event((currency,))
+        self._notify(event)
+        return True
+
+    def release(self, currency, amount):
+        with self.lock:
+            self.used[currency] -= amount
+            self.free[currency] = self.free.get(currency, 0.0) + amount
+            event = self._event((currency,))
+        self._notify(event)
+
+    def settle(self, base, quote, base_delta, quote_delta):
+        with self.lock:
+            self.free[base] = self.free.get(base, 0.0) + base_delta
+            self.free[quote] = self.free.get(quote, 0.0) + quote_delta
+            self.used.setdefault(base, 0.0)
+            self.used.setdefault(quote, 0.0)
+            event = self._event((base, quote))
+        self._notify(event)
+
+    def _event(self, currencies):
+        """outboundAccountPosition по изменившимся активам (под self.lock)"""
+        if not self.listeners:
+            return None
+        return {'e': 'outboundAccountPosition', 'E': int(time.time() * 1000),
+                'B': [{'a': currency, 'f': self.free[currency], 'l': self.used[currency]} for currency in currencies]}
+
+    def _notify(self, event):
+        if event is None:
+            return
+        for callback in self.listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                log.error("Ошибка подписчика бумажного счёта: %s", e)
+
+    def available(self, currency):
+        return self.free.get(currency, 0.0)
+
+    def balance(self):
+        """Баланс в формате ccxt fetch_balance"""
+        with self.lock:
+            result = {'free': dict(self.free), 'used': dict(self.used), 'total': {}}
+            for currency in self.free:
+                total = self.free[currency] + self.used.get(currency, 0.0)
+                result['total'][currency] = total
+                result[currency] = {'free': self.free[currency], 'used': self.used.get(currency, 0.0), 'total': total}
+        return result
+
+
+# ====================== Движок сопоставления ======================
+class MatchingEngine:
+    """Ордера одной пары с приоритетом цена-время поверх рыночного стакана.
+
+    Агрессивная часть ордера забирает ликвидность уровней стакана (тейкер).
+    Остаток встаёт в очередь за объёмом, который уже стоял на уровне: уменьшение
+    уровня считается сделками и сначала съедает очередь перед ордером, затем
+    исполняет его (мейкер). Если встречная сторона пересекает цену ордера,
+    он исполняется по своей цене.
+    """
+    def __init__(self, broker, symbol):
+        self.broker = broker
+        self.symbol = symbol
+        self.base, self.quote = symbol.split(':')[0].split('/')
+        self.book = broker.data_handler.get_order_book(symbol)
+        self.lock = threading.Lock()
+        self.resting = {'buy': {}, 'sell': {}}  # price -> [ордера по времени]
+        self._keys = {'buy': [], 'sell': []}    # Отсортированные цены (для buy -price), лучшая первой
+        self._pending = []                      # Куча (activate_at, id, ордер): ордера «в сети»
+        self._consumed = {}                     # (side, price) -> объём, уже забранный нашими ордерами
+
+    # ---------- Входящие ордера ----------
+    def submit(self, order, now):
+        with self.lock:
+            heapq.heappush(self._pending, (order.activate_at, order.id, order))
+            self._process(now)
+
+    def process(self, now):
+        with self.lock:
+            self._process(now)
+
+    def _process(self, now):
+        while self._pending and self._pending[0][0] <= now:
+            _, _, order = heapq.heappop(self._pending)
+            if order.status == 'pending':
+                self._activate(order)
+
+    def _activate(self, order):
+        order.status = 'open'
+        if order.time_in_force == 'FOK' and self._liquidity(order) < order.amount * (1 - 1e-9):
+            self._cancel(order)
+            return
+        self._take(order)
+        if order.done:
+            self._close(order)
+        elif order.type == 'market' or order.time_in_force in ('IOC', 'FOK'):
+            self._cancel(order)
+        else:
+            self._rest(order)
+
+    def _market_levels(self, side, limit_price=None, min_qty=None):
+        """Встречные уровни (цена, доступный объём) в пределах цены ордера"""
+        book_side = self.book.asks if side == 'buy' else self.book.bids
+        book_key = 'ask' if side == 'buy' else 'bid'
+        levels = []
+        total = 0.0
+        with self.broker.data_handler.lock:
+            if not self.book.synced:
+                return levels
+            for price, qty in book_side:
+                if limit_price is not None and (price > limit_price if side == 'buy' else price < limit_price):
+                    break
+                qty -= self._consumed.get((book_key, price), 0.0)
+                if qty > 0:
+                    levels.append((price, qty))
+                    total += qty
+                    if min_qty is not None and total >= min_qty:
+                        break
+        return levels
+
+    def _liquidity(self, order):
+        limit_price = None if order.type == 'market' else order.price
+        return sum(qty for _, qty in self._market_levels(order.side, limit_price, order.remaining))
+
+    def _take(self, order):
+        limit_price = None if order.type == 'market' else order.price
+        book_key = 'ask' if order.side == 'buy' else 'bid'
+        for price, qty in self._market_levels(order.side, limit_price, order.remaining):
+            qty = min(qty, order.remaining)
+            if order.side == 'buy' and order.type == 'market':
+                # Рыночная покупка без резерва — ограничена свободными средствами
+                qty = min(qty, self.broker.account.available(self.quote) / (price * (1 + self.broker.taker_fee)))
+            if qty <= 0:
+                break
+            self._fill(order, price, qty, self.broker.taker_fee)
+            key = (book_key, price)
+            self._consumed[key] = self._consumed.get(key, 0.0) + qty
+            if order.done:
+                break
+
+    def _rest(self, order):
+        book_side = self.book.bids if order.side == 'buy' else self.book.asks
+        with self.broker.data_handler.lock:
+            order.queue_ahead = book_side.get(order.price)
+        level = self.resting[order.side].get(order.price)
+        if level is None:
+            level = []
+            self.resting[order.side][order.price] = level
+            insort(self._keys[order.side], -order.price if order.side == 'buy' else order.price)
+        level.append(order)
+
+    def _unrest(self, order):
+        level = self.resting[order.side].get(order.price)
+        if level is None or order not in level:
+            return
+        level.remove(order)
+        if not level:
+            del self.resting[order.side][order.price]
+            keys = self._keys[order.side]
+            del keys[bisect_left(keys, -order.price if order.side == 'buy' else order.price)]
+
+    # ---------- Исполнение ----------
+    def _fill(self, order, price, qty, fee_rate):
+        cost = price * qty
+        fee = cost * fee_rate
+        account = self.broker.account
+        if order.side == 'buy':
+            if order.reserved:
+                share = order.reserved * qty / order.remaining
+                order.reserved -= share
+                account.release(self.quote, share)
+            account.settle(self.base, self.quote, qty, -cost - fee)
+        else:
+            share = min(order.reserved, qty)
+            order.reserved -= share
+            account.release(self.base, share)
+            account.settle(self.base, self.quote, -qty, cost - fee)
+        order.filled += qty
+        order.cost += cost
+        order.fee += fee
+        self.broker.record_trade(order, price, qty, fee, fee_rate == self.broker.maker_fee)
+
+    def _close(self, order):
+        order.status = 'closed'
+        if order.reserved:
+            self.broker.account.release(self.quote if order.side == 'buy' else self.base, order.reserved)
+            order.reserved = 0.0
+        self.broker.notify(order)
+
+    def _cancel(self, order):
+        order.status = 'canceled'
+        if order.reserved:
+            self.broker.account.release(self.quote if order.side == 'buy' else self.base, order.reserved)
+            order.reserved = 0.0
+        self.broker.notify(order)
+
+    def cancel(self, order, now):
+        with self.lock:
+            self._process(now)
+            if order.status not in ('pending', 'open'):
+                return False
+            self._unrest(order)
+            self._cancel(order)  # Ордер «в сети» удаляется из кучи лениво
+            return True
+
+    # ---------- Изменения рыночного стакана ----------
+    def on_changes(self, changes, now):
+        with self.lock:
+            self._process(now)
+            for side, prices, old_qtys, new_qtys in changes:
+                resting = self.resting['buy' if side == 'bid' else 'sell']
+                if not resting and not self._consumed:
+                    continue
+                for price, old_qty, new_qty in zip(prices.tolist(), old_qtys.tolist(), new_qtys.tolist()):
+                    self._consumed.pop((side, price), None)
+                    level = resting.get(price)
+                    if level:
+                        self._queue_fill(level, max(old_qty - new_qty, 0.0), new_qty)
+            self._cross('buy')
+            self._cross('sell')
+
+    def _queue_fill(self, level, traded, level_qty):
+        """Сделки на уровне сначала съедают очередь перед ордерами, затем исполняют их по времени"""
+        filled = 0.0
+        for order in list(level):
+            ahead = min(order.queue_ahead, traded)
+            order.queue_ahead -= ahead
+            available = traded - ahead - filled
+            if available > 0:
+                qty = min(order.remaining, available)
+                self._fill(order, order.price, qty, self.broker.maker_fee)
+                filled += qty
+            order.queue_ahead = min(order.queue_ahead, level_qty)
+            if order.done:
+                self._unrest(order)
+                self._close(order)
+
+    def _cross(self, side):
+        """Исполнение наших ордеров, цену которых пересекла встречная сторона"""
+        keys = self._keys[side]
+        book_key = 'ask' if side == 'buy' else 'bid'
+        while keys:
+            price = -keys[0] if side == 'buy' else keys[0]
+            levels = [list(level) for level in self._market_levels(side, price)]
+            if not levels:
+                return
+            for order in list(self.resting[side][price]):
+                for level in levels:
+                    qty = min(level[1], order.remaining)
+                    if qty <= 0:
+                        continue
+                    self._fill(order, price, qty, self.broker.maker_fee)
+                    level[1] -= qty
+                    key = (book_key, level[0])
+                    self._consumed[key] = self._consumed.get(key, 0.0) + qty
+                    if order.done:
+                        break
+                if not order.done:
+                    return  # Встречная ликвидность исчерпана
+                self._unrest(order)
+                self._close(order)
+
+
+class PaperBroker:
+    """Бумажный счёт с интерфейсом ccxt: приватные методы исполняются локально,
+    публичные (свечи, стакан, тикеры) передаются в market_api"""
+    def __init__(self, data_handler, balances=None, maker_fee=None, taker_fee=None, latency_ms=None,
+                 clock=time.time, market_api=None):
+        self.data_handler = data_handler
+        self.market_api = market_api
+        self.account = PaperAccount(Config.PAPER_BALANCES if balances is None else balances)
+        self.maker_fee = Config.PAPER_MAKER_FEE if maker_fee is None else maker_fee
+        self.taker_fee = Config.PAPER_TAKER_FEE if taker_fee is None else taker_fee
+        self.latency = (Config.PAPER_LATENCY_MS if latency_ms is None else latency_ms) / 1000
+        self.clock = clock
+        self.engines = {}
+        self.orders = {}
+        self.trades = deque(maxlen=10000)
+        self.listeners = []  # callback(order) при исполнении и смене статуса
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        data_handler.add_book_listener(self.on_book_changes)
+
+    def __getattr__(self, name):
+        market_api = self.__dict__.get('market_api')
+        if market_api is None:
+            raise AttributeError(name)
+        return getattr(market_api, name)
+
+    def engine(self, symbol):
+        engine = self.engines.get(symbol)
+        if engine is None:
+            with self._lock:
+                engine = self.engines.get(symbol)
+                if engine is None:
+                    engine = MatchingEngine(self, symbol)
+                    self.engines[symbol] = engine
+        return engine
+
+    def on_book_changes(self, symbol, changes):
+        engine = self.engines.get(symbol)
+        if engine is not None:
+            engine.on_changes(changes, self.clock())
+
+    def poll(self):
+        """Активация ордеров, чья задержка истекла, по всем парам"""
+        now = self.clock()
+        for engine in list(self.engines.values()):
+            engine.process(now)
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def notify(self, order):
+        for callback in self.listeners:
+            callback(order.to_dict())
+
+    def record_trade(self, order, price, qty, fee, maker):
+        self.trades.append({
+            'order': order.id, 'symbol': order.symbol, 'side': order.side, 'price': price, 'amount': qty,
+            'cost': price * qty, 'fee': {'cost': fee, 'currency': order.symbol.split('/')[1].split(':')[0]},
+            'takerOrMaker': 'maker' if maker else 'taker', 'timestamp': int(self.clock() * 1000),
+        })
+        self.notify(order)
+
+    # ---------- Приватные методы ccxt ----------
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        params = params or {}
+        if amount <= 0:
+            raise ccxt.InvalidOrder(f"Некорректный объём ордера: {amount}")
+        if type != 'market' and price is None:
+            raise ccxt.InvalidOrder("Для лимитного ордера нужна цена")
+        now = self.clock()
+        order = PaperOrder(
+            str(next(self._ids)), symbol, side, type, amount, price,
+            params.get('timeInForce', 'GTC'), now, now + self.latency
+        )
+        engine = self.engine(symbol)
+        if side == 'sell':
+            order.reserved = amount
+            if not self.account.reserve(engine.base, amount):
+                raise ccxt.InsufficientFunds(f"Недостаточно {engine.base} для продажи {amount}")
+        elif type != 'market':
+            order.reserved = amount * price * (1 + max(self.maker_fee, self.taker_fee))
+            if not self.account.reserve(engine.quote, order.reserved):
+                raise ccxt.InsufficientFunds(f"Недостаточно {engine.quote} для покупки {amount} по {price}")
+        self.orders[order.id] = order
+        engine.submit(order, now)
+        return order.to_dict()
+
+    def _get_order(self, order_id):
+        order = self.orders.get(str(order_id))
+        if order is None:
+            raise ccxt.OrderNotFound(f"Ордер {order_id} не найден")
+        return order
+
+    def cancel_order(self, id, symbol=None, params=None):
+        order = self._get_order(id)
+        if not self.engine(order.symbol).cancel(order, self.clock()):
+            raise ccxt.OrderNotFound(f"Ордер {id} уже {order.status}")
+        return order.to_dict()
+
+    def fetch_order(self, id, symbol=None, params=None):
+        order = self._get_order(id)
+        self.engine(order.symbol).process(self.clock())
+        return order.to_dict()
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params=None):
+        self.poll()
+        return [order.to_dict() for order in list(self.orders.values())
+                if order.status in ('pending', 'open') and (symbol is None or order.symbol == symbol)]
+
+    def fetch_my_trades(self, symbol=None, since=None, limit=None, params=None):
+        trades = [trade for trade in list(self.trades)
+                  if (symbol is None or trade['symbol'] == symbol) and (since is None or trade['timestamp'] >= since)]
+        return trades[-limit:] if limit else trades
+
+    def fetch_balance(self, params=None):
+        return self.account.balance()
+
+
+class LocalMarketData:
+    """Публичные методы ccxt по локальным данным DataHandler — работа без сети"""
+    has = {'fetchFundingRates': True}
+
+    def __init__(self, data_handler):
+        self.data_handler = data_handler
+        self.markets = {symbol: {'symbol': symbol} for symbol in Config.SYMBOLS}
+
+    def load_markets(self, reload=False):
+        return self.markets
+
+    def fetch_order_book(self, symbol, limit=None):
+        book = self.data_handler.get_order_book(symbol)
+        with self.data_handler.lock:
+            snapshot = book.snapshot(limit)
+            snapshot['nonce'] = book.last_update_id
+        return snapshot
+
+    def fetch_ticker(self, symbol):
+        book = self.data_handler.get_order_book(symbol)
+        with self.data_handler.lock:
+            bid, ask = book.bids.best(), book.asks.best()
+        last = self.data_handler.last_trade.get(symbol)
+        return {
+            'symbol': symbol,
+            'bid': bid[0] if bid else None,
+            'ask': ask[0] if ask else None,
+            'last': last[0] if last else None,
+            'timestamp': int(time.time() * 1000),
+        }
+
+    def fetch_tickers(self, symbols=None):
+        return {symbol: self.fetch_ticker(symbol) for symbol in symbols or Config.SYMBOLS}
+
+    def fetch_ohlcv(self, symbol, timeframe=None, since=None, limit=None):
+        buffer = self.data_handler.ohlcv.get(symbol)
+        if buffer is None:
+            return []
+        rows = [[int(row[0]), *row[1:]] for row in zip(*(buffer.column(name) for name in buffer.COLUMNS))]
+        if since is not None:
+            rows = [row for row in rows if row[0] >= since]
+        return rows[:limit] if limit else rows
+
+    def fetch_funding_rates(self, symbols=None):
+        return {
+            f"{symbol.split('/')[0]}/USDT:USDT": {'fundingRate': rate}
+            for symbol, rate in self.data_handler.funding_rates.items()
+        }
+
+
+class PaperRestClient(RestClient):
+    def __init__(self, exchange, offline=False, **kwargs):
+        super().__init__(exchange, **kwargs)
+        self.offline = offline
+
+    def request(self, weight, func, *args, **kwargs):
+        # Локальные вызовы (ордера бумажного счёта, офлайн-данные) не расходуют лимит весов биржи
+        if self.offline or getattr(func, '__self__', None) is self.exchange:
+            return func(*args, **kwargs)
+        return super().request(weight, func, *args, **kwargs)
+
+
+class PaperExchange(Exchange):
+    """Exchange с бумажным счётом вместо приватного API.
+
+    offline=False — рыночные данные с биржи (WebSocket и публичный REST);
+    offline=True — без сети: данные подаются в DataHandler через TickReplayer.
+    """
+    def __init__(self, data_handler, offline=None, broker=None):
+        self.offline = Config.PAPER_OFFLINE if offline is None else offline
+        self.broker = broker or PaperBroker(data_handler)
+        super().__init__(data_handler)
+
+    def connect(self):
+        if self.offline:
+            self.broker.market_api = LocalMarketData(self.data_handler)
+        else:
+            exchange_class = getattr(ccxt, Config.EXCHANGE)
+            self.broker.market_api = exchange_class({
+                'enableRateLimit': False,
+                'options': {'defaultType': 'spot'}
+            })
+        return self.broker
+
+    def create_rest_client(self):
+        return PaperRestClient(
+            self.exchange,
+            offline=self.offline,
+            futures=Config.EXCHANGE == 'binanceusdm',
+            workers=Config.REST_WORKERS,
+            weight_usage=Config.REST_WEIGHT_USAGE
+        )
+
+    def start_websockets(self):
+        if self.offline:
+            log.info("Офлайн-режим: рыночные данные подаются через TickReplayer")
+            return
+        super().start_websockets()
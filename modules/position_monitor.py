@@ -1,42 +1,124 @@
+import ccxt
+from config import Config
+from modules.trigger_index import TriggerIndex
+from utils.logger import get_logger
+import threading
+from functools import partial
 import time
 
+log = get_logger('PositionMonitor')
+
 # ====================== Мониторинг позиций ======================
 class PositionMonitor:
-    def __init__(self, exchange, order_executor):
+    def __init__(self, exchange, order_executor, price_service):
         self.exchange = exchange
         self.order_executor = order_executor
+        self.price_service = price_service
         self.active_positions = {}
+        self.triggers = {}  # symbol -> TriggerIndex
+        self.lock = threading.Lock()
     
     def add_position(self, position):
         """Добавление новой позиции"""
         position_id = f"{position['symbol']}-{time.time()}"
-        self.active_positions[position_id] = position
-        print(f"[PositionMonitor] Позиция добавлена: {position_id} -> {position}")
+        with self.lock:
+            self._insert(position_id, position)
+        log.info("Позиция добавлена: %s", position_id, position=position)
         return position_id
     
-    def check_position(self, position_id):
-        """Проверка состояния позиции"""
-        position = self.active_positions[position_id]
-        current_price = self.get_current_price(position['symbol'])
-        print(f"[PositionMonitor] Проверка позиции {position_id}: текущая цена {current_price}, SL={position['stop_loss']}, TP={position['take_profit']}")
-        
-        # Проверка стоп-лосса и тейк-профита
-        if current_price <= position['stop_loss']:
-            self.order_executor.close_position(position)
-            return 'stop_loss'
-        
-        if current_price >= position['take_profit']:
-            self.order_executor.close_position(position)
-            return 'take_profit'
-        
-        # Проверка времени удержания
-        if time.time() - position['entry_time'] > 900:  # 15 минут
-            self.order_executor.close_position(position)
-            return 'timeout'
-        
-        return 'active'
-    
-    def get_current_price(self, symbol):
-        """Получение текущей цены"""
-        ticker = self.exchange.exchange.fetch_ticker(symbol)
-        return ticker['last']
\ No newline at end of file
+    def _insert(self, position_id, position):
+        self.active_positions[position_id] = position
+        index = self.triggers.get(position['symbol'])
+        if index is None:
+            index = TriggerIndex()
+            self.triggers[position['symbol']] = index
+        index.add(
+            position_id,
+            position['stop_loss'],
+            position['take_profit'],
+            position['entry_time'] + Config.POSITION_TIMEOUT
+        )
+    
+    def snapshot(self):
+        """Копия активных позиций для снимка состояния"""
+        with self.lock:
+            return {position_id: dict(position) for position_id, position in self.active_positions.items()}
+    
+    def restore(self, positions):
+        """Возврат позиций под мониторинг после перезапуска (с прежними id)"""
+        with self.lock:
+            for position_id, position in positions.items():
+                if position_id not in self.active_positions:
+                    self._insert(position_id, position)
+        if positions:
+            log.info("Восстановлено позиций: %s", len(positions), positions=list(positions))
+    
+    def increase_position(self, position_id, amount):
+        """Добавление объёма (ордер входа исполняется частями). False — позиции уже нет"""
+        with self.lock:
+            position = self.active_positions.get(position_id)
+            if position is None:
+                return False
+            position['size'] += amount
+            return True
+    
+    def remove_position(self, position_id):
+        """Удаление позиции из мониторинга. Возвращает позицию или None, если её уже нет"""
+        with self.lock:
+            return self._remove(position_id)
+    
+    def _remove(self, position_id):
+        position = self.active_positions.pop(position_id, None)
+        if position is not None:
+            self.triggers[position['symbol']].remove(position_id)
+        return position
+    
+    def has_position(self, symbol):
+        """Есть ли открытая позиция по паре"""
+        index = self.triggers.get(symbol)
+        return index is not None and len(index) > 0
+    
+    def symbols_with_positions(self):
+        with self.lock:
+            return [symbol for symbol, index in self.triggers.items() if len(index)]
+    
+    def on_price(self, symbol, current_price, now=None):
+        """Закрытие позиций пары, у которых сработал SL/TP или истёк таймаут.
+
+        Возвращает список (position_id, status) закрытых позиций.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            index = self.triggers.get(symbol)
+            if index is None or not len(index):
+                return []
+            fired = index.triggered(current_price) if current_price is not None else []
+            fired += index.expired(now)
+            closed = []
+            for position_id, status in fired:
+                position = self._remove(position_id)
+                if position is not None:
+                    closed.append((position_id, status, position))
+        # Ордера отправляются вне блокировки
+        for position_id, status, position in closed:
+            log.info("Позиция %s: %s по цене %s", position_id, status, current_price,
+                     stop_loss=position['stop_loss'], take_profit=position['take_profit'])
+            self.order_executor.close_position(position, on_failed=partial(self.on_close_failed, position_id))
+        return [(position_id, status) for position_id, status, _ in closed]
+    
+    def on_close_failed(self, position_id, position, error):
+        """Ордер на закрытие не принят: при сетевой ошибке позиция возвращается под
+        мониторинг и закрывается повторно на следующей цене"""
+        if isinstance(error, ccxt.NetworkError):
+            self.restore({position_id: position})
+        else:
+            log.error("Позиция %s не может быть закрыта автоматически: %s", position_id, error, position=position)
+
+    def get_current_price(self, symbol, kind='bid'):
+        """Получение текущей цены (по умолчанию bid — цена выхода из длинной позиции)"""
+        return self.price_service.get_price(symbol, kind)
+    
+    def get_current_prices(self, symbols, kind='bid'):
+        """Текущие цены нескольких пар (устаревшие — одним REST-запросом)"""
+        quotes = self.price_service.get_quotes(symbols)
+        return {symbol: quote[kind] for symbol, quote in quotes.items()}
\ No newline at end of file
@@ -0,0 +1,105 @@
+import time
+from config import Config
+
+# ====================== Цены из локального состояния ======================
+class PriceService:
+    """Лучший bid/ask, mid и цена последней сделки из WebSocket-данных.
+
+    Если данные по паре старше max_staleness секунд (или их нет),
+    цена берётся через REST-тикер.
+    """
+    def __init__(self, data_handler, exchange, max_staleness=None):
+        self.data_handler = data_handler
+        self.exchange = exchange
+        self.max_staleness = Config.PRICE_MAX_STALENESS if max_staleness is None else max_staleness
+
+    def get_local_quote(self, symbol):
+        """Котировка из снимка пары (стакан и свечи одной версии) или None, если данные устарели"""
+        now = time.time()
+        snapshot = self.data_handler.snapshot(symbol)
+        if snapshot is None or not snapshot.synced or now - snapshot.book_time > self.max_staleness:
+            return None
+        best_bid = snapshot.best_bid
+        best_ask = snapshot.best_ask
+        # Цена закрытия формирующейся свечи — это цена последней сделки
+        last_price = snapshot.indicators.get('last_price')
+        last_time = snapshot.indicators.get('last_time', 0)
+        return {
+            'bid': best_bid,
+            'ask': best_ask,
+            'mid': (best_bid + best_ask) / 2,
+            'last': last_price if now - last_time <= self.max_staleness else None,
+            'timestamp': snapshot.book_time,
+            'source': 'ws',
+        }
+
+    def get_quote(self, symbol):
+        """Котировка пары: локальная, при устаревании — через REST"""
+        quote = self.get_local_quote(symbol)
+        if quote is not None:
+            return quote
+        return self.quote_from_ticker(self.exchange.rest.fetch_ticker(symbol))
+
+    def get_quotes(self, symbols):
+        """Котировки нескольких пар; устаревшие запрашиваются одним REST-запросом"""
+        quotes = {}
+        stale = []
+        for symbol in symbols:
+            quote = self.get_local_quote(symbol)
+            if quote is None:
+                stale.append(symbol)
+            else:
+                quotes[symbol] = quote
+        if stale:
+            for symbol, ticker in self.exchange.rest.fetch_tickers(stale).items():
+                quotes[symbol] = self.quote_from_ticker(ticker)
+        return quotes
+
+    def get_price(self, symbol, kind='last'):
+        """Цена заданного типа: bid, ask, mid или last"""
+        quote = self.get_quote(symbol)
+        if quote[kind] is None:
+            # Сделок не было в пределах max_staleness — берём mid
+            return quote['mid']
+        return quote[kind]
+
+    @staticmethod
+    def quote_from_ticker(ticker):
+        bid = ticker.get('bid')
+        ask = ticker.get('ask')
+        last = ticker.get('last')
+        mid = (bid + ask) / 2 if bid and ask else last
+        return {
+            'bid': bid if bid else last,
+            'ask': ask if ask else last,
+            'mid': mid,
+            'last': last,
+            'timestamp': (ticker.get('timestamp') or time.time() * 1000) / 1000,
+            'source': 'rest',
+        }
+
+
+class TablePriceService(PriceService):
+    """Котировки из таблицы индикаторов — для координатора шардов, где стаканы ведут другие процессы"""
+    def get_local_quote(self, symbol):
+        table = self.data_handler.indicator_table
+        if symbol not in table.rows:
+            return None
+        row = table.row(symbol)
+        index = table.INDEX
+        now = time.time()
+        bid = row[index['ob_best_bid']]
+        ask = row[index['ob_best_ask']]
+        book_time = row[index['ob_time']]
+        # NaN не проходит ни одно сравнение — пара без данных считается устаревшей
+        if not now - book_time <= self.max_staleness or not bid > 0 or not ask > 0:
+            return None
+        last_time = row[index['last_time']]
+        return {
+            'bid': float(bid),
+            'ask': float(ask),
+            'mid': float(bid + ask) / 2,
+            'last': float(row[index['last_price']]) if now - last_time <= self.max_staleness else None,
+            'timestamp': float(book_time),
+            'source': 'ws',
+        }
@@ -0,0 +1,143 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.helpers import metrics
+
+# ====================== REST-запросы с учётом весов ======================
+# Лимиты и веса эндпоинтов Binance (request weight за минуту)
+WEIGHT_LIMITS = {'spot': 6000, 'futures': 2400}
+
+
+def ohlcv_weight(futures, limit):
+    if not futures:
+        return 2
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+def order_book_weight(futures, limit):
+    if futures:
+        for max_limit, weight in ((50, 2), (100, 5), (500, 10), (1000, 20)):
+            if limit <= max_limit:
+                return weight
+        return 20
+    for max_limit, weight in ((100, 5), (500, 25), (1000, 50)):
+        if limit <= max_limit:
+            return weight
+    return 250
+
+
+def tickers_weight(futures, count):
+    """24hr ticker: одна пара, список пар или все пары сразу"""
+    if futures:
+        return 1 if count == 1 else 40
+    if count is None or count > 100:
+        return 80
+    if count > 20:
+        return 40
+    return 2
+
+
+class RateLimiter:
+    """Token bucket по весам запросов, общий для всех потоков"""
+    def __init__(self, weight_per_minute):
+        self.capacity = weight_per_minute
+        self.rate = weight_per_minute / 60.0
+        self.tokens = float(weight_per_minute)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, weight):
+        """Блокирует поток, пока в корзине не наберётся weight токенов"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                wait = (weight - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RestClient:
+    """Параллельные REST-запросы через ccxt под общим лимитером весов"""
+    def __init__(self, exchange, futures=False, workers=4, weight_usage=0.8):
+        self.exchange = exchange
+        self.futures = futures
+        limit = WEIGHT_LIMITS['futures' if futures else 'spot']
+        self.limiter = RateLimiter(limit * weight_usage)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self._markets_lock = threading.Lock()
+
+    def request(self, weight, func, *args, **kwargs):
+        """Один запрос с учётом веса"""
+        self.limiter.acquire(weight)
+        endpoint = getattr(func, '__name__', 'unknown')
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            metrics.counter('rest_errors_total', endpoint=endpoint).inc()
+            raise
+        finally:
+            metrics.observe('rest_request_seconds', time.perf_counter() - start, endpoint=endpoint)
+
+    def ensure_markets(self):
+        """Однократная загрузка рынков до параллельных запросов"""
+        with self._markets_lock:
+            if not self.exchange.markets:
+                self.request(20, self.exchange.load_markets)
+
+    def fan_out(self, func, items):
+        """Параллельный вызов func(item) для всех items. Возвращает {item: результат или исключение}"""
+        self.ensure_markets()
+        futures = {item: self.pool.submit(func, item) for item in items}
+        results = {}
+        for item, future in futures.items():
+            try:
+                results[item] = future.result()
+            except Exception as e:
+                results[item] = e
+        return results
+
+    def fetch_ohlcv(self, symbol, timeframe, since=None, limit=100):
+        return self.request(ohlcv_weight(self.futures, limit), self.exchange.fetch_ohlcv,
+                            symbol, timeframe, since=since, limit=limit)
+
+    def fetch_order_book(self, symbol, limit):
+        return self.request(order_book_weight(self.futures, limit), self.exchange.fetch_order_book,
+                            symbol, limit=limit)
+
+    def fetch_ticker(self, symbol):
+        return self.request(tickers_weight(self.futures, 1), self.exchange.fetch_ticker, symbol)
+
+    def fetch_tickers(self, symbols):
+        """Тикеры нескольких пар одним запросом"""
+        self.ensure_markets()
+        return self.request(tickers_weight(self.futures, len(symbols)), self.exchange.fetch_tickers, symbols)
+
+    def fetch_funding_rates(self, symbols):
+        """Ставки финансирования: одним запросом (premiumIndex), иначе параллельно по парам"""
+        self.ensure_markets()
+        if self.exchange.has.get('fetchFundingRates'):
+            return self.request(10, self.exchange.fetch_funding_rates, symbols)
+        results = self.fan_out(
+            lambda symbol: self.request(1, self.exchange.fetch_funding_rate, symbol),
+            symbols
+        )
+        return {symbol: rate for symbol, rate in results.items() if not isinstance(rate, Exception)}
+
+    def fetch_balance(self):
+        return self.request(5 if self.futures else 20, self.exchange.fetch_balance)
+
+    def fetch_positions(self, symbols=None):
+        """Позиции фьючерсов (positionRisk); без symbols — все открытые"""
+        self.ensure_markets()
+        return self.request(5, self.exchange.fetch_positions, symbols)
@@ -1,39 +1,67 @@
 from config import Config
+from utils.logger import get_logger
+
+log = get_logger('RiskManager')
 
 # ====================== Управление рисками ======================
 class RiskManager:
-    def __init__(self, exchange):
+    """Размер позиции и лимиты входа.
+
+    С account (AccountState) размер считается от текущего капитала из
+    user-data stream, без сетевых запросов на пути входа; без него — от баланса
+    на момент создания (бэктест обновляет balance сам).
+    """
+    def __init__(self, exchange, symbol_params=None, account=None):
         self.exchange = exchange
-        self.balance = self.get_balance()
+        self.symbol_params = {} if symbol_params is None else symbol_params  # symbol -> параметры после калибровки
+        self.account = account
+        self.balance = self.get_balance() if account is None else None
     
     def get_balance(self):
         """Получение текущего баланса"""
-        print("[RiskManager] Запрос баланса...")
-        balance = self.exchange.exchange.fetch_balance()
+        log.info("Запрос баланса...")
+        balance = self.exchange.rest.fetch_balance()
         usdt_balance = 0
         if 'total' in balance and 'USDT' in balance['total']:
             usdt_balance = balance['total']['USDT']
         elif 'USDT' in balance:
             # Иногда ccxt кладёт баланс прямо в верхний уровень
             usdt_balance = balance['USDT']
-        print(f"[RiskManager] Баланс USDT: {usdt_balance}")
+        log.info("Баланс USDT: %s", usdt_balance)
         return usdt_balance
 
+    def equity(self):
+        """Капитал для расчёта риска"""
+        return self.account.equity() if self.account is not None else self.balance
+
+    def position_limit_reached(self, open_positions):
+        """Достигнут ли Config.MAX_POSITIONS; open_positions — открытые и ожидающие подтверждения входы"""
+        return open_positions >= Config.MAX_POSITIONS
+
     def calculate_position_size(self, entry_price, stop_loss_price):
-        """Расчет размера позиции"""
-        risk_amount = self.balance * Config.RISK_PER_TRADE
+        """Расчет размера позиции: риск от капитала, не больше свободных средств"""
+        risk_amount = self.equity() * Config.RISK_PER_TRADE
         price_difference = abs(entry_price - stop_loss_price)
         if price_difference == 0:
-            print("[RiskManager] Ошибка: разница между ценой входа и стоп-лоссом равна 0!")
+            log.error("Разница между ценой входа и стоп-лоссом равна 0", entry_price=entry_price)
             return 0
         size = risk_amount / price_difference
-        print(f"[RiskManager] Размер позиции: {size} (risk_amount={risk_amount}, price_diff={price_difference})")
+        if self.account is not None and size * entry_price > self.account.available():
+            size = max(self.account.available(), 0.0) / entry_price
+            log.debug("Размер позиции ограничен свободными средствами", available=self.account.available())
+        log.debug("Размер позиции: %s", size, risk_amount=risk_amount, price_diff=price_difference)
         return size
     
-    def get_stop_loss_price(self, entry_price, is_long=True):
+    def param(self, name, symbol=None):
+        """Параметр пары с откатом на значение из Config"""
+        return self.symbol_params.get(symbol, {}).get(name, getattr(Config, name))
+    
+    def get_stop_loss_price(self, entry_price, is_long=True, symbol=None):
         """Расчет цены стоп-лосса"""
-        return entry_price * (0.992 if is_long else 1.008)
+        pct = self.param('STOP_LOSS_PCT', symbol)
+        return entry_price * (1 - pct if is_long else 1 + pct)
     
-    def get_take_profit_price(self, entry_price, is_long=True):
+    def get_take_profit_price(self, entry_price, is_long=True, symbol=None):
         """Расчет цены тейк-профита"""
-        return entry_price * (1.016 if is_long else 0.984)
\ No newline at end of file
+        pct = self.param('TAKE_PROFIT_PCT', symbol)
+        return entry_price * (1 + pct if is_long else 1 - pct)
@@ -1,51 +1,172 @@
 from modules.exchange import Exchange
-from modules.traiding_strategy import TradingStrategy
+from modules.paper_exchange import PaperExchange
+from modules.traiding_strategy import TradingStrategy, describe_rejection
 from modules.data_handler import DataHandler
 from modules.risk_manager import RiskManager
 from modules.order_executor import OrderExecutor
+from modules.order_gateway import OrderGateway
+from modules.account_state import AccountState
 from modules.position_monitor import PositionMonitor
+from modules.price_service import PriceService, TablePriceService
+from modules.shard import ShardPool
+from modules.scheduler import CoalescingExecutor, Scheduler
+from modules.tick_store import TickRecorder
+from modules.state_store import StateStore
+from modules.user_stream import UserDataStream
 from config import Config
+from utils.helpers import metrics, MetricsServer
+from utils.logger import get_logger, DEBUG
+from collections import Counter
+import threading
 import time
 import requests
+
+log = get_logger('ScalpingBot')
+
 # ====================== Основной класс бота ======================
 class ScalpingBot:
     def __init__(self):
-        self.data_handler = DataHandler()
-        self.exchange = Exchange(self.data_handler)
-        self.strategy = TradingStrategy(self.data_handler)
-        self.risk_manager = RiskManager(self.exchange)
-        self.order_executor = OrderExecutor(self.exchange)
-        self.position_monitor = PositionMonitor(self.exchange, self.order_executor)
+        # Шардированный режим: рыночные данные ведут процессы-шарды, здесь — сигналы, риск и ордера
+        self.shards = ShardPool() if Config.SHARDS > 1 and not Config.PAPER_TRADING else None
+        if self.shards is not None:
+            self.data_handler = DataHandler(indicator_table=self.shards.table)
+            self.shards.add_listener(self.data_handler.notify_listeners)
+        else:
+            self.data_handler = DataHandler()
+        # Снимок состояния восстанавливается до запуска WebSocket в Exchange
+        self.state_store = StateStore() if Config.STATE_FILE else None
+        state, state_age = self.state_store.load() if self.state_store is not None else (None, None)
         self.btc_dominance = 60.0  # Начальное значение (будет обновляться)
+        self.btc_dominance_updated = 0
+        if state is not None and self.state_store.fresh(state_age):
+            if self.shards is not None:
+                # Строки общей таблицы пишут только шарды: свои пары они восстанавливают сами
+                self.shards.restore_state(state['data'])
+            else:
+                self.data_handler.restore_state(state['data'])
+            self.btc_dominance = state['btc_dominance']
+            self.btc_dominance_updated = state['btc_dominance_updated']
+        if Config.TICK_RECORDING:
+            self.data_handler.recorder = TickRecorder()
+            self.data_handler.recorder.start()
+        if Config.PAPER_TRADING:
+            self.exchange = PaperExchange(self.data_handler)
+        else:
+            self.exchange = Exchange(self.data_handler, streams=self.shards is None)
+        self.strategy = TradingStrategy(self.data_handler)
+        if self.shards is not None:
+            self.price_service = TablePriceService(self.data_handler, self.exchange)
+        else:
+            self.price_service = PriceService(self.data_handler, self.exchange)
+        # Балансы и позиции аккаунта: начальная сверка через REST, дальше — user-data stream
+        self.account = AccountState(self.exchange, self.price_service)
+        self.account.reconcile()
+        self.risk_manager = RiskManager(self.exchange, self.data_handler.symbol_params, account=self.account)
+        self.order_gateway = OrderGateway(self.exchange)
+        self.order_executor = OrderExecutor(self.exchange, self.order_gateway)
+        # Статусы ордеров: бумажный счёт сообщает их сам, биржа — через user-data stream
+        self.user_stream = None
+        if Config.PAPER_TRADING:
+            # Балансы бумажного счёта приходят событиями по изменившимся активам, как от биржи
+            self.exchange.broker.add_listener(self.order_gateway.on_order)
+            self.exchange.broker.account.add_listener(self.account.on_account_position)
+        elif Config.USER_STREAM:
+            self.user_stream = UserDataStream(self.exchange)
+            self.user_stream.add_listener('executionReport', self.order_gateway.on_execution_report)
+            self.user_stream.add_listener('executionReport', self.account.on_execution_report)
+            self.user_stream.add_listener('outboundAccountPosition', self.account.on_account_position)
+            self.user_stream.add_listener('ORDER_TRADE_UPDATE', self.order_gateway.on_order_trade_update)
+            self.user_stream.add_listener('ORDER_TRADE_UPDATE', self.account.on_order_trade_update)
+            self.user_stream.add_listener('ACCOUNT_UPDATE', self.account.on_account_update)
+            self.user_stream.add_connect_listener(self.order_gateway.reconcile)
+            self.user_stream.add_connect_listener(self.account.reconcile)
+        self.position_monitor = PositionMonitor(self.exchange, self.order_executor, self.price_service)
+        if state is not None:
+            # Позиции восстанавливаются при любом возрасте снимка: иначе они останутся без SL/TP
+            self.position_monitor.restore(state['positions'])
+        self.scheduler = Scheduler()
+        self.signal_executor = CoalescingExecutor(self.evaluate_symbol, workers=Config.SIGNAL_WORKERS, name='signals')
+        # Реентерабельная: отклонённый при проверке ордер вызывает on_entry_update сразу в create_position
+        self.position_lock = threading.RLock()
+        self.pending_entries = {}  # symbol -> незавершённый вход: ордер, позиция и уже учтённый объём
+        self.metrics_server = MetricsServer(metrics, Config.METRICS_PORT) if Config.METRICS_PORT else None
+        self.signal_latency = metrics.histogram('stage_latency_seconds', stage='book_to_signal')
+        self.signals_passed = metrics.counter('signals_total', result='pass')
+        self.signals_rejected = metrics.counter('signals_total', result='reject')
+        self._evaluated_book = {}  # symbol -> book_applied, по которому уже считалась задержка
         
     def run(self):
-        """Основной цикл работы бота"""
-        print("[ScalpingBot] Ожидание инициализации данных (15 секунд)...")
-        calibration_counter = 0
-        time.sleep(15)  # Дать время на запуск WebSocket и получение первых данных
-        while True:
-            try:
-                # Перекалибровка каждые 30 минут
-                calibration_counter += 1
-                if calibration_counter >= 360:  # 30 мин * 12 итераций (при 5-сек интервале)
-                    self.data_handler.auto_calibrate_parameters()
-                    calibration_counter = 0
-                    
-                print("=== Обновление данных ===")
-                self.update_data()
-                
-                print("=== Проверка активных позиций ===")
-                self.check_active_positions()
-                
-                print("=== Поиск новых торговых возможностей ===")
-                self.find_trading_opportunities()
-                
-                print("=== Ожидание следующей итерации ===\n")
-                time.sleep(5)  # Пауза между итерациями
-                
-            except Exception as e:
-                print(f"Critical error: {e}")
-                time.sleep(30)
+        """Запуск бота: выходы и сигналы по событиям рыночных данных, медленные задачи — по таймерам"""
+        if self.shards is not None:
+            self.shards.start()
+        self.order_gateway.start()
+        if self.user_stream is not None:
+            self.user_stream.start()
+            self.scheduler.add_job('user_stream', Config.USER_STREAM_KEEPALIVE, self.user_stream.keepalive,
+                                   run_immediately=False)
+        self.scheduler.add_job('account', Config.ACCOUNT_RECONCILE_INTERVAL, self.account.reconcile,
+                               run_immediately=False)
+        self.warm_up()
+        if self.shards is None:
+            # В шардированном режиме свечи, фандинг и очереди пар обслуживают шарды
+            self.scheduler.add_job('market_data', Config.OHLCV_SEED_INTERVAL, self.update_data,
+                                   run_immediately=False)
+            self.scheduler.add_job('ohlcv_cache', Config.OHLCV_CACHE_INTERVAL, self.data_handler.save_ohlcv_cache,
+                                   run_immediately=False)
+            self.scheduler.add_job('funding_rates', Config.FUNDING_UPDATE_INTERVAL,
+                                   lambda: self.data_handler.update_funding_rates(self.exchange),
+                                   run_immediately=time.time() - self.data_handler.last_funding_update
+                                   >= Config.FUNDING_UPDATE_INTERVAL)
+            self.scheduler.add_job('mailbox', Config.MAILBOX_REPORT_INTERVAL, self.exchange.mailbox.report,
+                                   run_immediately=False)
+        # После восстановления из снимка свежие значения не запрашиваются повторно
+        now = time.time()
+        self.scheduler.add_job('btc_dominance', Config.BTC_DOMINANCE_INTERVAL, self.update_btc_dominance,
+                               run_immediately=now - self.btc_dominance_updated >= Config.BTC_DOMINANCE_INTERVAL)
+        # Выходы проверяются на каждом обновлении стакана; таймер нужен для таймаутов
+        # и пар, по которым давно не было обновлений
+        self.scheduler.add_job('positions', Config.POSITION_CHECK_INTERVAL, self.check_active_positions)
+        self.scheduler.add_job('entries', Config.POSITION_CHECK_INTERVAL, self.expire_entries,
+                               run_immediately=False)
+        # Полный скрининг всех пар — статистика отказов по условиям
+        self.scheduler.add_job('screener', Config.SCREENER_INTERVAL, self.find_trading_opportunities)
+        # Перекалибровка каждые 30 минут
+        self.scheduler.add_job('calibration', Config.CALIBRATION_INTERVAL,
+                               lambda: self.data_handler.auto_calibrate_parameters(self.exchange), run_immediately=False)
+        if Config.METRICS_FILE:
+            self.scheduler.add_job('metrics_file', Config.METRICS_FILE_INTERVAL,
+                                   lambda: metrics.write(Config.METRICS_FILE), run_immediately=False)
+        if self.metrics_server is not None:
+            self.metrics_server.start()
+        self.scheduler.start()
+        self.signal_executor.start()
+        if self.state_store is not None:
+            self.state_store.start(self.capture_state)
+        # Обновления стакана и свечей помечают пару для проверки выходов и условий входа
+        self.data_handler.add_listener(self.signal_executor.submit)
+        log.info("Бот запущен")
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            log.info("Остановка...")
+            self.scheduler.stop()
+            self.signal_executor.stop()
+            self.order_gateway.stop()
+            if self.user_stream is not None:
+                self.user_stream.stop()
+            self.exchange.mailbox.stop()
+            if self.shards is not None:
+                self.shards.stop()
+            if self.state_store is not None:
+                self.state_store.stop()
+            self.data_handler.save_ohlcv_cache()
+            if self.data_handler.ohlcv_cache is not None:
+                self.data_handler.ohlcv_cache.close()
+            if self.metrics_server is not None:
+                self.metrics_server.stop()
+            if self.data_handler.recorder is not None:
+                self.data_handler.recorder.stop()
 
     def fetch_btc_dominance(self):
         """Получение доминирования BTC с CoinGecko"""
@@ -54,75 +175,179 @@ class ScalpingBot:
             response = requests.get(url, timeout=10)
             data = response.json()
             dominance = data['data']['market_cap_percentage']['btc']
-            print(f"[ScalpingBot] BTC dominance обновлено: {dominance}")
+            log.info("BTC dominance обновлено: %s", dominance)
             return dominance
         except Exception as e:
-            print(f"[ScalpingBot] Ошибка получения BTC dominance: {e}")
+            log.error("Ошибка получения BTC dominance: %s", e)
             return self.btc_dominance  # оставить старое значение
 
-    def update_data(self):
-        """Обновление рыночных данных"""
-        print("Обновление BTC доминирования...")
+    def update_btc_dominance(self):
+        """Обновление BTC доминирования"""
         self.btc_dominance = self.fetch_btc_dominance()
-        print("Обновление ставок фандинга...")
-        self.data_handler.update_funding_rates(self.exchange)
-        for symbol in Config.SYMBOLS:
-            print(f"Обновление OHLCV для {symbol}...")
-            self.data_handler.update_ohlcv(self.exchange, symbol)
-            time.sleep(0.5)  # Короткая пауза между запросами (опционально)
+        self.btc_dominance_updated = time.time()
+
+    def capture_state(self):
+        """Состояние для StateStore: позиции, рыночные данные и BTC доминирование"""
+        return {
+            'positions': self.position_monitor.snapshot(),
+            'btc_dominance': self.btc_dominance,
+            'btc_dominance_updated': self.btc_dominance_updated,
+            'data': self.shards.capture_state() if self.shards is not None else self.data_handler.capture_state(),
+        }
 
-    def check_active_positions(self):
-        """Проверка активных позиций"""
-        for position_id in list(self.position_monitor.active_positions.keys()):
-            print(f"Проверка позиции {position_id}...")
-            status = self.position_monitor.check_position(position_id)
-            if status != 'active':
-                print(f"Position {position_id} closed: {status}")
-                del self.position_monitor.active_positions[position_id]
+    def on_positions_changed(self):
+        """Внеочередной снимок после открытия или закрытия позиции"""
+        if self.state_store is not None:
+            self.state_store.request()
+
+    def update_data(self):
+        """Первичная загрузка свечей для пар, по которым ещё нет данных"""
+        # Свечи приходят через WebSocket (@kline); кэш и REST нужны только для первичного заполнения
+        missing = [symbol for symbol in Config.SYMBOLS if symbol not in self.data_handler.ohlcv]
+        if missing:
+            self.data_handler.seed_ohlcv(self.exchange, missing)
+
+    def warm_up(self):
+        """Прогрев перед запуском: свечи из кэша и с биржи, затем ожидание синхронизации стаканов"""
+        start = time.monotonic()
+        if self.shards is None:
+            self.update_data()
+        deadline = start + Config.WARMUP_TIMEOUT
+        pending = list(Config.SYMBOLS)
+        while pending and time.monotonic() < deadline:
+            pending = [symbol for symbol in pending if self.price_service.get_local_quote(symbol) is None]
+            if pending:
+                time.sleep(0.1)
+        if pending:
+            log.warning("Стаканы не синхронизированы за %s с: %s", Config.WARMUP_TIMEOUT, ', '.join(pending))
+        log.info("Прогрев завершён за %.1f с", time.monotonic() - start)
+
+    def check_active_positions(self, symbol=None):
+        """Проверка активных позиций (всех или только по одной паре)"""
+        if symbol is None:
+            symbols = self.position_monitor.symbols_with_positions()
+        elif self.position_monitor.has_position(symbol):
+            symbols = [symbol]
+        else:
+            return
+        if not symbols:
+            return
+        # Цены из локального стакана; устаревшие — одним REST-запросом
+        prices = self.position_monitor.get_current_prices(symbols)
+        for symbol in symbols:
+            for position_id, status in self.position_monitor.on_price(symbol, prices.get(symbol)):
+                log.info("Позиция %s закрыта: %s", position_id, status)
+                self.on_positions_changed()
 
     def find_trading_opportunities(self):
-        """Поиск новых торговых возможностей"""
-        for symbol in Config.SYMBOLS:
-            ind = self.data_handler.indicators.get(symbol)
-            required_keys = ['ema_short', 'ema_long', 'atr', 'volume_ratio', 'close',
-                             'ob_ratio', 'ob_bid_volume', 'ob_ask_volume', 'ob_spread', 'ob_mid_price']
-            if not ind or not all(k in ind and ind[k] is not None for k in required_keys):
-                print(f"[ScalpingBot] Данные для анализа {symbol} ещё не готовы, пропуск.")
-                continue
-            print(f"Проверка условий входа для {symbol}...")
-            if self.strategy.check_entry_conditions(symbol, self.btc_dominance):
-                print(f"Условия входа выполнены для {symbol}, открытие позиции...")
-                self.create_position(symbol)
-            else:
-                print(f"Условия входа не выполнены для {symbol}")
+        """Векторный скрининг условий входа по всем парам"""
+        symbols, rejections = self.strategy.screen(self.btc_dominance)
+        if log.enabled(DEBUG):
+            blocked = Counter(
+                reason for bits in rejections[rejections != 0] for reason in describe_rejection(int(bits))
+            )
+            log.debug("Скрининг %s пар: прошли %s", len(symbols), int((rejections == 0).sum()),
+                      rejected=dict(blocked))
+        signal_time = time.perf_counter()
+        for symbol, bits in zip(symbols, rejections):
+            if bits == 0:
+                self.open_position_if_allowed(symbol, signal_time)
 
-    def create_position(self, symbol):
-        """Создание новой позиции"""
-        print(f"Создание позиции для {symbol}...")
-        current_price = self.position_monitor.get_current_price(symbol)
-        stop_loss_price = self.risk_manager.get_stop_loss_price(current_price)
-        take_profit_price = self.risk_manager.get_take_profit_price(current_price)
+    def evaluate_symbol(self, symbol):
+        """Проверка выходов и условий входа для одной пары (вызывается по обновлению данных)"""
+        book_applied = self.data_handler.book_applied.get(symbol)
+        self.check_active_positions(symbol)
+        passed = self.strategy.check_entry_conditions(symbol, self.btc_dominance)
+        signal_time = time.perf_counter()
+        if book_applied is not None and book_applied != self._evaluated_book.get(symbol):
+            # Задержка считается один раз на обновление стакана (свечи тоже будят проверку)
+            self._evaluated_book[symbol] = book_applied
+            self.signal_latency.record(signal_time - book_applied)
+        if passed:
+            self.signals_passed.inc()
+            self.open_position_if_allowed(symbol, signal_time)
+        else:
+            self.signals_rejected.inc()
+
+    def open_position_if_allowed(self, symbol, signal_time=None):
+        """Открытие позиции с учётом лимитов"""
+        if self.position_monitor.has_position(symbol) or symbol in self.pending_entries:
+            return
+        # Цена читается до блокировки: без свежего стакана это REST-запрос, а на
+        # position_lock ждут обработчики исполнения ордеров. Покупаем по лучшему ask
+        current_price = self.position_monitor.get_current_price(symbol, 'ask')
+        if current_price is None:
+            log.warning("Нет цены для %s, вход пропущен", symbol)
+            return
+        with self.position_lock:
+            if self.position_monitor.has_position(symbol) or symbol in self.pending_entries:
+                return
+            # Вход, по которому уже есть позиция, второй раз не считается
+            waiting = sum(1 for entry in self.pending_entries.values() if entry['position_id'] is None)
+            if self.risk_manager.position_limit_reached(len(self.position_monitor.active_positions) + waiting):
+                log.debug("Достигнут лимит позиций (%s), пропуск %s", Config.MAX_POSITIONS, symbol)
+                return
+            log.info("Условия входа выполнены для %s, открытие позиции...", symbol)
+            self.create_position(symbol, current_price, signal_time)
+
+    def create_position(self, symbol, current_price, signal_time=None):
+        """Создание новой позиции по цене входа current_price"""
+        stop_loss_price = self.risk_manager.get_stop_loss_price(current_price, symbol=symbol)
+        take_profit_price = self.risk_manager.get_take_profit_price(current_price, symbol=symbol)
         position_size = self.risk_manager.calculate_position_size(
             current_price, 
             stop_loss_price
         )
-        print(f"Параметры позиции: цена входа={current_price}, SL={stop_loss_price}, TP={take_profit_price}, размер={position_size}")
-        order = self.order_executor.place_order(
+        log.info("Параметры позиции %s", symbol, entry_price=current_price, stop_loss=stop_loss_price,
+                 take_profit=take_profit_price, size=position_size)
+        order = self.order_executor.submit_order(
             symbol=symbol,
             side='buy',
             amount=position_size,
-            price=current_price * 1.0005
+            price=current_price * 1.0005,
+            signal_time=signal_time
         )
-        if order:
-            position = {
-                'symbol': symbol,
-                'entry_price': current_price,
-                'stop_loss': stop_loss_price,
-                'take_profit': take_profit_price,
-                'size': position_size,
-                'entry_time': time.time()
-            }
-            self.position_monitor.add_position(position)
-            print(f"New position opened for {symbol} at {current_price}")
-        else:
-            print(f"Не удалось открыть позицию для {symbol}")
\ No newline at end of file
+        position = {
+            'symbol': symbol,
+            'entry_price': current_price,
+            'stop_loss': stop_loss_price,
+            'take_profit': take_profit_price,
+            'size': 0.0,
+            'entry_time': time.time()
+        }
+        # Позиция открывается и растёт по исполнению ордера (статусы из ответа биржи,
+        # user-data stream и сверки); пока ордер не завершён, пара занимает слот лимита
+        entry = {'order': order, 'position': position, 'position_id': None, 'size': 0.0}
+        self.pending_entries[symbol] = entry
+        order.add_listener(lambda order: self.on_entry_update(symbol, entry))
+
+    def on_entry_update(self, symbol, entry):
+        """Переход состояния ордера входа: исполненный объём — под мониторинг SL/TP"""
+        order = entry['order']
+        opened = False
+        with self.position_lock:
+            added = order.filled - entry['size']
+            if added > 0:
+                position_id = entry['position_id']
+                if position_id is None or not self.position_monitor.increase_position(position_id, added):
+                    # Первое исполнение или позиция уже закрыта, а остаток ордера ещё исполнился
+                    entry['position_id'] = self.position_monitor.add_position(dict(entry['position'], size=added))
+                    opened = True
+                entry['size'] = order.filled
+            if order.done and self.pending_entries.get(symbol) is entry:
+                del self.pending_entries[symbol]
+                if not order.filled:
+                    log.warning("Не удалось открыть позицию для %s: %s", symbol, order.status)
+        if added > 0:
+            self.on_positions_changed()
+        if opened:
+            log.info("Открыта позиция %s по цене %s", symbol, entry['position']['entry_price'], size=order.filled)
+
+    def expire_entries(self):
+        """Отмена ордеров входа, не исполненных за ORDER_ENTRY_TIMEOUT; неизвестный статус — сверка"""
+        now = time.perf_counter()
+        with self.position_lock:
+            stale = [entry['order'] for entry in self.pending_entries.values()
+                     if now - entry['order'].submitted >= Config.ORDER_ENTRY_TIMEOUT]
+        for order in stale:
+            self.order_gateway.cancel(order)
@@ -0,0 +1,108 @@
+import queue
+import threading
+from utils.logger import get_logger
+
+log = get_logger('Scheduler')
+
+# ====================== Планировщик событий ======================
+class CoalescingExecutor:
+    """Пул потоков, выполняющий handler(key) по событиям.
+
+    Для каждого ключа одновременно выполняется не более одной задачи: события,
+    пришедшие во время выполнения, схлопываются в один повторный запуск.
+    """
+    def __init__(self, handler, workers=2, name='executor'):
+        self.handler = handler
+        self.workers = workers
+        self.name = name
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._state = {}  # key -> 'queued' | 'running' | 'rerun'
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"{self.name}-{i}")
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        self._threads = []
+
+    def submit(self, key):
+        """Пометить ключ как "грязный" (дешево, можно вызывать из WebSocket-потока)"""
+        with self._lock:
+            state = self._state.get(key)
+            if state is None:
+                self._state[key] = 'queued'
+                self._queue.put(key)
+            elif state == 'running':
+                self._state[key] = 'rerun'
+
+    def _worker(self):
+        while True:
+            key = self._queue.get()
+            if key is None:
+                return
+            with self._lock:
+                self._state[key] = 'running'
+            try:
+                self.handler(key)
+            except Exception as e:
+                log.error("Ошибка обработки %s в %s: %s", key, self.name, e)
+            with self._lock:
+                if self._state[key] == 'rerun':
+                    self._state[key] = 'queued'
+                    self._queue.put(key)
+                else:
+                    del self._state[key]
+
+
+class PeriodicJob:
+    """Периодическая задача в собственном потоке"""
+    def __init__(self, name, interval, func, run_immediately=True):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.run_immediately = run_immediately
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name=f"job-{self.name}")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        if not self.run_immediately:
+            self._stop.wait(self.interval)
+        while not self._stop.is_set():
+            try:
+                self.func()
+            except Exception as e:
+                log.error("Ошибка задачи %s: %s", self.name, e)
+            self._stop.wait(self.interval)
+
+
+class Scheduler:
+    """Набор периодических задач бота"""
+    def __init__(self):
+        self.jobs = {}
+
+    def add_job(self, name, interval, func, run_immediately=True):
+        self.jobs[name] = PeriodicJob(name, interval, func, run_immediately)
+        return self.jobs[name]
+
+    def start(self):
+        for job in self.jobs.values():
+            job.start()
+
+    def stop(self):
+        for job in self.jobs.values():
+            job.stop()
@@ -0,0 +1,222 @@
+import multiprocessing
+import queue
+import threading
+import time
+import numpy as np
+from config import Config
+from modules.data_handler import STATE_SYMBOL_FIELDS, DataHandler
+from modules.exchange import Exchange
+from modules.indicator_table import SharedIndicatorTable
+from modules.scheduler import Scheduler
+from utils.logger import get_logger
+
+log = get_logger('Shard')
+
+
+def split_symbols(symbols, shards):
+    """Пары по шардам по кругу: соседние по списку пары попадают в разные процессы"""
+    return [symbols[i::shards] for i in range(shards) if symbols[i::shards]]
+
+
+def split_state(state, symbols):
+    """Часть снимка DataHandler.capture_state() по парам шарда"""
+    part = dict(state)
+    for field in STATE_SYMBOL_FIELDS:
+        values = state.get(field, {})
+        part[field] = {symbol: values[symbol] for symbol in symbols if symbol in values}
+    return part
+
+
+def merge_states(states):
+    """Снимок всех пар из снимков шардов (формат DataHandler.capture_state())"""
+    merged = {field: {} for field in STATE_SYMBOL_FIELDS}
+    merged.update({'timeframe': Config.TIMEFRAME, 'last_funding_update': 0})
+    for index, state in enumerate(states):
+        for field in STATE_SYMBOL_FIELDS:
+            merged[field].update(state[field])
+        merged['timeframe'] = state['timeframe']
+        # Самое раннее обновление фандинга: ставки пар такого шарда самые старые
+        if index == 0 or state['last_funding_update'] < merged['last_funding_update']:
+            merged['last_funding_update'] = state['last_funding_update']
+    return merged
+
+
+# ====================== Процесс-шард ======================
+def run_shard(index, symbols, all_symbols, table_name, weight_usage, stop, state=None, states=None):
+    """Точка входа процесса: свой WebSocket-поток данных и DataHandler для части пар.
+
+    Индикаторы и верх стакана пишутся в общую таблицу (строки только своих пар);
+    ордера, риск и позиции — в координаторе. state — часть снимка состояния по
+    парам шарда: восстанавливается до запуска WebSocket. В очередь states шард
+    периодически кладёт (index, снимок своих пар) для StateStore координатора.
+    """
+    Config.SYMBOLS = list(symbols)
+    Config.REST_WEIGHT_USAGE = weight_usage
+    table = SharedIndicatorTable.attach(table_name, all_symbols)
+    data_handler = DataHandler(indicator_table=table)
+    if state is not None:
+        data_handler.restore_state(state)
+    exchange = Exchange(data_handler)
+
+    def seed_missing():
+        missing = [symbol for symbol in Config.SYMBOLS if symbol not in data_handler.ohlcv]
+        if missing:
+            data_handler.seed_ohlcv(exchange, missing)
+
+    scheduler = Scheduler()
+    scheduler.add_job('market_data', Config.OHLCV_SEED_INTERVAL, seed_missing)
+    scheduler.add_job('ohlcv_cache', Config.OHLCV_CACHE_INTERVAL, data_handler.save_ohlcv_cache,
+                      run_immediately=False)
+    scheduler.add_job('funding_rates', Config.FUNDING_UPDATE_INTERVAL,
+                      lambda: data_handler.update_funding_rates(exchange))
+    scheduler.add_job('mailbox', Config.MAILBOX_REPORT_INTERVAL, exchange.mailbox.report, run_immediately=False)
+    # Калибровку ведёт координатор; шард подхватывает её из файла параметров
+    scheduler.add_job('symbol_params', Config.SHARD_PARAMS_INTERVAL, data_handler.reload_symbol_params,
+                      run_immediately=False)
+    if states is not None:
+        # Сериализует и передаёт снимок поток очереди multiprocessing, а не поток планировщика
+        scheduler.add_job('state', Config.STATE_SNAPSHOT_INTERVAL,
+                          lambda: states.put((index, data_handler.capture_state())), run_immediately=False)
+    scheduler.start()
+    log.info("Шард %s запущен: %s", index, ', '.join(symbols))
+    try:
+        stop.wait()
+    except KeyboardInterrupt:
+        pass  # Ctrl+C получают все процессы группы; останавливает координатор
+    finally:
+        scheduler.stop()
+        exchange.mailbox.stop()
+        if states is not None:
+            states.put((index, data_handler.capture_state()))
+        data_handler.save_ohlcv_cache()
+        if data_handler.ohlcv_cache is not None:
+            data_handler.ohlcv_cache.close()
+        table.close()
+
+
+# ====================== Координатор шардов ======================
+class ShardPool:
+    """Процессы-шарды и общая таблица индикаторов в shared memory.
+
+    Пары делятся между Config.SHARDS процессами, у каждого свои WebSocket,
+    стаканы, свечи и индикаторы — они не делят GIL. Координатор (ScalpingBot с
+    RiskManager и OrderExecutor) читает таблицу; поток наблюдения сравнивает
+    версии строк и вызывает подписчиков для обновившихся пар, как
+    DataHandler.notify_listeners в однопроцессном режиме. Упавший шард
+    перезапускается.
+
+    Рыночное состояние для StateStore ведут сами шарды: restore_state() раздаёт
+    им части снимка при запуске, capture_state() собирает последние присланные.
+    """
+    def __init__(self, symbols=None, shards=None):
+        self.symbols = list(symbols or Config.SYMBOLS)
+        self.shards = split_symbols(self.symbols, shards or Config.SHARDS)
+        self.table = SharedIndicatorTable.create(self.symbols)
+        # Лимит весов REST делится между шардами и координатором
+        self.weight_usage = Config.REST_WEIGHT_USAGE / (len(self.shards) + 1)
+        self.listeners = []
+        self.restarts = 0
+        self.states = {}  # index -> последний снимок пар шарда
+        self._states_lock = threading.Lock()
+        self._context = multiprocessing.get_context('spawn')
+        self._stop = self._context.Event()
+        self._states = self._context.Queue() if Config.STATE_FILE else None
+        self._processes = []
+        self._watching = threading.Event()
+        self._watcher = None
+        self._receiver = None
+
+    def add_listener(self, callback):
+        """callback(symbol) при обновлении строки пары в таблице"""
+        self.listeners.append(callback)
+
+    def restore_state(self, state):
+        """Снимок DataHandler.capture_state(): каждый шард восстановит свои пары до запуска WebSocket"""
+        with self._states_lock:
+            for index, symbols in enumerate(self.shards):
+                self.states[index] = split_state(state, symbols)
+
+    def capture_state(self):
+        """Рыночное состояние всех пар из последних снимков шардов"""
+        with self._states_lock:
+            states = list(self.states.values())
+        return merge_states(states)
+
+    def start(self):
+        self._processes = [self._spawn(index) for index in range(len(self.shards))]
+        self._watcher = threading.Thread(target=self._watch, name='shard-watcher')
+        self._watcher.daemon = True
+        self._watcher.start()
+        if self._states is not None:
+            # Снимки шардов разбираются отдельно, чтобы не задерживать опрос таблицы
+            self._receiver = threading.Thread(target=self._receive_states, name='shard-states')
+            self._receiver.daemon = True
+            self._receiver.start()
+
+    def _spawn(self, index):
+        # Перезапущенный шард восстанавливается из последнего присланного им снимка
+        with self._states_lock:
+            state = self.states.get(index)
+        process = self._context.Process(
+            target=run_shard,
+            args=(index, self.shards[index], self.symbols, self.table.shm.name, self.weight_usage, self._stop,
+                  state, self._states),
+            name=f"shard-{index}"
+        )
+        process.daemon = True
+        process.start()
+        return process
+
+    def _watch(self):
+        versions = self.table.versions.copy()
+        checked = time.monotonic()
+        while not self._watching.wait(Config.SHARD_POLL_INTERVAL):
+            current = self.table.versions.copy()
+            for row in np.flatnonzero(current != versions):
+                symbol = self.symbols[row]
+                for callback in self.listeners:
+                    try:
+                        callback(symbol)
+                    except Exception as e:
+                        log.error("Ошибка подписчика для %s: %s", symbol, e)
+            versions = current
+            if time.monotonic() - checked >= 1:
+                checked = time.monotonic()
+                self._restart_dead()
+
+    def _receive_states(self):
+        # Работает до остановки шардов: их последние снимки приходят при завершении
+        while True:
+            try:
+                index, state = self._states.get(timeout=0.5)
+            except queue.Empty:
+                if self._stop.is_set() and not any(self.alive()):
+                    return
+                continue
+            with self._states_lock:
+                self.states[index] = state
+
+    def _restart_dead(self):
+        for index, process in enumerate(self._processes):
+            if not process.is_alive() and not self._stop.is_set():
+                log.error("Шард %s завершился (код %s), перезапуск", index, process.exitcode)
+                self.restarts += 1
+                # Строки пар шарда могли остаться помеченными как записываемые
+                self.table.release_rows(self.shards[index])
+                self._processes[index] = self._spawn(index)
+
+    def alive(self):
+        return [process.is_alive() for process in self._processes]
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._watching.set()
+        if self._watcher is not None:
+            self._watcher.join()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        if self._receiver is not None:
+            self._receiver.join()
+        self.table.close()
@@ -0,0 +1,94 @@
+import os
+import pickle
+import threading
+import time
+from config import Config
+from utils.logger import get_logger
+
+log = get_logger('StateStore')
+
+
+# ====================== Снимок состояния ======================
+class StateStore:
+    """Периодический снимок состояния бота на диск для быстрого перезапуска.
+
+    capture() только копирует состояние (под блокировками владельцев, без
+    сериализации); pickle и запись выполняются в собственном потоке. Файл
+    заменяется атомарно (tmp + os.replace), так что при падении на диске
+    остаётся предыдущий целый снимок. request() будит поток раньше таймера —
+    например, после открытия или закрытия позиции.
+    """
+    VERSION = 1
+
+    def __init__(self, path=None, interval=None):
+        self.path = path or Config.STATE_FILE
+        self.interval = interval or Config.STATE_SNAPSHOT_INTERVAL
+        self.capture = None
+        self.saved = 0        # Записано снимков
+        self.last_size = 0    # Размер последнего снимка, байт
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, capture):
+        """capture() -> словарь состояния; вызывается в потоке записи"""
+        self.capture = capture
+        self._thread = threading.Thread(target=self._run, name='state-store')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def request(self):
+        self._wake.set()
+
+    def stop(self):
+        """Остановка потока и последний снимок"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.save(self.capture())
+            except Exception as e:
+                log.error("Ошибка записи снимка состояния: %s", e)
+            if self._stop.is_set():
+                return
+
+    def save(self, state):
+        data = pickle.dumps({'version': self.VERSION, 'time': time.time(), 'state': state},
+                            protocol=pickle.HIGHEST_PROTOCOL)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.saved += 1
+        self.last_size = len(data)
+
+    @staticmethod
+    def fresh(age):
+        """Годятся ли рыночные данные снимка такого возраста (позиции берутся из любого)"""
+        return age is not None and age <= Config.STATE_MAX_AGE
+
+    def load(self):
+        """(состояние, возраст в секундах) или (None, None), если снимка нет или он не читается"""
+        if not os.path.exists(self.path):
+            return None, None
+        try:
+            with open(self.path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except Exception as e:
+            log.error("Ошибка чтения снимка %s: %s", self.path, e)
+            return None, None
+        if snapshot.get('version') != self.VERSION:
+            log.warning("Снимок %s другой версии, пропуск", self.path, version=snapshot.get('version'))
+            return None, None
+        return snapshot['state'], time.time() - snapshot['time']
@@ -0,0 +1,135 @@
+import math
+import numpy as np
+
+# ====================== Потоковые перцентили ======================
+class DecayingHistogram:
+    """Логарифмическая гистограмма с экспоненциальным затуханием.
+
+    Каждое значение живёт в гистограмме с момента add() до remove(), а его вклад
+    за каждый тик затухает с коэффициентом r = 1 - 1/window. Вес корзины
+    считается как L*q + r^t*K (q = 1/r), поэтому add/remove стоят O(1),
+    а перцентиль — O(число корзин) без хранения истории.
+    """
+    def __init__(self, window, min_value=1e-2, max_value=1e10, bins_per_decade=100):
+        self.r = 1.0 - 1.0 / window
+        self.q = 1.0 / self.r
+        self.log_min = math.log10(min_value)
+        self.bins_per_decade = bins_per_decade
+        self.n_bins = int(math.ceil((math.log10(max_value) - self.log_min) * bins_per_decade))
+        self.live = np.zeros(self.n_bins)      # L: число "живых" значений в корзине
+        self.acc = np.zeros(self.n_bins)       # K: накопленные q^t0 / q^t1
+        self.scale = 1.0                       # q^t
+
+    def _bin(self, value):
+        if value <= 0:
+            return 0
+        b = int((math.log10(value) - self.log_min) * self.bins_per_decade)
+        return min(max(b, 0), self.n_bins - 1)
+
+    def _bins(self, values):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            b = ((np.log10(values) - self.log_min) * self.bins_per_decade).astype(np.int64)
+        return np.clip(b, 0, self.n_bins - 1)
+
+    def add(self, value):
+        """Значение появилось на текущем тике"""
+        b = self._bin(value)
+        self.live[b] += 1
+        self.acc[b] -= self.scale
+
+    def remove(self, value):
+        """Значение исчезло на текущем тике"""
+        b = self._bin(value)
+        self.live[b] -= 1
+        self.acc[b] += self.scale
+
+    def update_many(self, added, removed):
+        """add() и remove() для массивов значений за один проход"""
+        if not len(added) and not len(removed):
+            return
+        bins = self._bins(np.concatenate((added, removed)))
+        signs = np.concatenate((np.ones(len(added)), -np.ones(len(removed))))
+        np.add.at(self.live, bins, signs)
+        np.add.at(self.acc, bins, -signs * self.scale)
+
+    def observe(self, value):
+        """Разовое наблюдение (живёт ровно один тик)"""
+        self.acc[self._bin(value)] += self.scale * (self.q - 1)
+
+    def clear_live(self):
+        """Все живые значения исчезли (например, стакан пересинхронизирован)"""
+        self.acc += self.live * self.scale
+        self.live[:] = 0
+
+    def advance(self):
+        """Переход к следующему тику"""
+        self.scale *= self.q
+        if self.scale > 1e12:
+            # Перенормировка, чтобы q^t не переполнялся
+            self.acc /= self.scale
+            self.scale = 1.0
+
+    def weights(self):
+        w = self.live * self.q + self.acc / self.scale
+        np.maximum(w, 0, out=w)
+        return w
+
+    def quantiles(self, probs):
+        """Перцентили (probs в долях 0..1); None, если гистограмма пуста"""
+        cum = np.cumsum(self.weights())
+        total = cum[-1]
+        if total <= 0:
+            return [None for _ in probs]
+        result = []
+        for p in probs:
+            target = p * total
+            b = min(int(np.searchsorted(cum, target)), self.n_bins - 1)
+            prev = cum[b - 1] if b > 0 else 0.0
+            width = cum[b] - prev
+            frac = (target - prev) / width if width > 0 else 0.5
+            result.append(10 ** (self.log_min + (b + frac) / self.bins_per_decade))
+        return result
+
+
+class OrderBookPercentiles:
+    """Потоковый расчёт CLUSTER_THRESHOLD / WALL_THRESHOLD / RATIO_MIN по изменениям стакана"""
+    def __init__(self, window=100):
+        self.orders = DecayingHistogram(window)
+        self.ratios = DecayingHistogram(window, min_value=1e-4, max_value=1e4)
+        self.bid_volume = 0.0
+        self.ask_volume = 0.0
+
+    def reset_levels(self):
+        """Стакан загружен заново — текущие уровни больше не существуют"""
+        self.orders.clear_live()
+        self.bid_volume = 0.0
+        self.ask_volume = 0.0
+
+    def update(self, changes):
+        """Учёт изменений стакана [(side, prices, old_qtys, new_qtys)] и расчёт порогов"""
+        added = []
+        removed = []
+        for side, prices, old_qtys, new_qtys in changes:
+            old_values = prices * old_qtys
+            new_values = prices * new_qtys
+            removed.append(old_values[old_qtys != 0])
+            added.append(new_values[new_qtys != 0])
+            delta = new_values.sum() - old_values.sum()
+            if side == 'bid':
+                self.bid_volume += delta
+            else:
+                self.ask_volume += delta
+        if changes:
+            self.orders.update_many(np.concatenate(added), np.concatenate(removed))
+
+        if self.ask_volume > 0:
+            self.ratios.observe(max(self.bid_volume, 0.0) / self.ask_volume)
+        cluster_threshold, wall_threshold = self.orders.quantiles((0.90, 0.99))
+        ratio_min = self.ratios.quantiles((0.50,))[0]
+        self.orders.advance()
+        self.ratios.advance()
+        return {
+            'CLUSTER_THRESHOLD': cluster_threshold,
+            'WALL_THRESHOLD': wall_threshold,
+            'RATIO_MIN': ratio_min,
+        }
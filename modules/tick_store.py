@@ -0,0 +1,302 @@
+import heapq
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import numpy as np
+from config import Config
+from utils.logger import get_logger
+
+log = get_logger('TickRecorder')
+
+# ====================== Хранилище тиков ======================
+# Фиксированные записи, little-endian. Один файл на пару, день и тип события:
+#   <root>/<SYMBOL>/<YYYYMMDD>/{depth,kline,funding}.bin
+FLAG_SNAPSHOT = 1   # Уровень REST-снимка (last_id = lastUpdateId)
+FLAG_EVENT_END = 2  # Последняя запись события
+SIDE_BID = 0
+SIDE_ASK = 1
+SIDE_NONE = 255     # Событие без уровней (сохраняем ради последовательности id)
+
+DEPTH_DTYPE = np.dtype([
+    ('ts', '<i8'), ('first_id', '<i8'), ('last_id', '<i8'), ('prev_id', '<i8'),
+    ('price', '<f8'), ('qty', '<f8'), ('side', 'u1'), ('flags', 'u1'),
+])
+KLINE_DTYPE = np.dtype([
+    ('ts', '<i8'), ('open_time', '<i8'), ('open', '<f8'), ('high', '<f8'),
+    ('low', '<f8'), ('close', '<f8'), ('volume', '<f8'), ('closed', 'u1'),
+])
+FUNDING_DTYPE = np.dtype([('ts', '<i8'), ('rate', '<f8')])
+
+DTYPES = {'depth': DEPTH_DTYPE, 'kline': KLINE_DTYPE, 'funding': FUNDING_DTYPE}
+
+
+def shard_path(root, symbol, day, kind):
+    return os.path.join(root, symbol.replace('/', '').replace(':', '_'), day, f"{kind}.bin")
+
+
+def day_of(ts_ms):
+    return time.strftime('%Y%m%d', time.gmtime(ts_ms / 1000))
+
+
+class RecordFile:
+    """Файл фиксированных записей с заголовком, дописываемый через mmap"""
+    HEADER = struct.Struct('<4sHHQ')  # magic, версия, размер записи, число записей
+    HEADER_SIZE = 64
+    MAGIC = b'TICK'
+
+    def __init__(self, path, dtype, grow_records=65536):
+        self.path = path
+        self.dtype = dtype
+        self.grow_bytes = grow_records * dtype.itemsize
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        exists = os.path.exists(path)
+        self.file = open(path, 'r+b' if exists else 'w+b')
+        if not exists:
+            self.file.truncate(self.HEADER_SIZE + self.grow_bytes)
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+        if exists:
+            magic, _, record_size, self.count = self.HEADER.unpack_from(self.mm, 0)
+            if magic != self.MAGIC or record_size != dtype.itemsize:
+                raise ValueError(f"Несовместимый файл тиков: {path}")
+        else:
+            self.count = 0
+            self._write_header()
+
+    def _write_header(self):
+        self.HEADER.pack_into(self.mm, 0, self.MAGIC, 1, self.dtype.itemsize, self.count)
+
+    def append(self, records):
+        data = records.tobytes()
+        start = self.HEADER_SIZE + self.count * self.dtype.itemsize
+        end = start + len(data)
+        if end > len(self.mm):
+            self.mm.close()
+            self.file.truncate(end + self.grow_bytes)
+            self.mm = mmap.mmap(self.file.fileno(), 0)
+        self.mm[start:end] = data
+        self.count += len(records)
+        self._write_header()
+
+    def flush(self):
+        self.mm.flush()
+
+    def close(self):
+        self.flush()
+        self.mm.close()
+        self.file.close()
+
+
+def read_records(path, kind):
+    """Записи файла как массив numpy без копирования (np.memmap); kind — тип события или dtype"""
+    dtype = DTYPES[kind] if isinstance(kind, str) else kind
+    with open(path, 'rb') as f:
+        magic, _, record_size, count = RecordFile.HEADER.unpack(f.read(RecordFile.HEADER.size))
+    if magic != RecordFile.MAGIC or record_size != dtype.itemsize:
+        raise ValueError(f"Несовместимый файл тиков: {path}")
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=RecordFile.HEADER_SIZE, shape=(count,))
+
+
+class TickRecorder:
+    """Запись рыночных событий на диск в фоновом потоке.
+
+    Методы record_* только кладут событие в очередь и никогда не блокируют:
+    при переполнении очереди событие отбрасывается и учитывается в dropped.
+    """
+    def __init__(self, root=None, flush_interval=None, max_queue=None):
+        self.root = Config.TICK_STORE_DIR if root is None else root
+        self.flush_interval = Config.TICK_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self._queue = queue.Queue(maxsize=Config.TICK_QUEUE_SIZE if max_queue is None else max_queue)
+        self._files = {}  # (symbol, kind) -> (day, RecordFile)
+        self.dropped = 0
+        self.written = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._writer, name='tick-recorder')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    @staticmethod
+    def _now():
+        return int(time.time() * 1000)
+
+    def record_depth(self, symbol, first_id, last_id, prev_id, bids, asks, snapshot=False):
+        self._put(('depth', symbol, self._now(), (first_id, last_id, prev_id, bids, asks, snapshot)))
+
+    def record_kline(self, symbol, bar, closed):
+        self._put(('kline', symbol, self._now(), (bar, closed)))
+
+    def record_funding(self, symbol, rate):
+        self._put(('funding', symbol, self._now(), rate))
+
+    def _writer(self):
+        last_flush = time.monotonic()
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                while len(batch) < 10000:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    log.error("Ошибка записи: %s", e, events=len(batch))
+            if time.monotonic() - last_flush >= self.flush_interval:
+                for _, record_file in self._files.values():
+                    record_file.flush()
+                last_flush = time.monotonic()
+        for _, record_file in self._files.values():
+            record_file.close()
+        self._files = {}
+
+    def _write_batch(self, batch):
+        grouped = {}
+        for kind, symbol, ts, payload in batch:
+            grouped.setdefault((symbol, kind, day_of(ts)), []).append((ts, payload))
+        for (symbol, kind, day), items in grouped.items():
+            records = getattr(self, f"_{kind}_records")(items)
+            self._file(symbol, kind, day).append(records)
+            self.written += len(records)
+
+    def _file(self, symbol, kind, day):
+        current = self._files.get((symbol, kind))
+        if current is not None and current[0] == day:
+            return current[1]
+        if current is not None:
+            current[1].close()
+        record_file = RecordFile(shard_path(self.root, symbol, day, kind), DTYPES[kind])
+        self._files[(symbol, kind)] = (day, record_file)
+        return record_file
+
+    @staticmethod
+    def _depth_records(items):
+        rows = []
+        for ts, (first_id, last_id, prev_id, bids, asks, snapshot) in items:
+            prev_id = -1 if prev_id is None else prev_id
+            flags = FLAG_SNAPSHOT if snapshot else 0
+            levels = [(SIDE_BID, price, qty) for price, qty in bids]
+            levels += [(SIDE_ASK, price, qty) for price, qty in asks]
+            if not levels:
+                levels = [(SIDE_NONE, 0.0, 0.0)]
+            last = len(levels) - 1
+            for i, (side, price, qty) in enumerate(levels):
+                rows.append((ts, first_id, last_id, prev_id, float(price), float(qty), side,
+                             flags | (FLAG_EVENT_END if i == last else 0)))
+        return np.array(rows, dtype=DEPTH_DTYPE)
+
+    @staticmethod
+    def _kline_records(items):
+        return np.array([
+            (ts, int(bar[0]), float(bar[1]), float(bar[2]), float(bar[3]), float(bar[4]), float(bar[5]), closed)
+            for ts, (bar, closed) in items
+        ], dtype=KLINE_DTYPE)
+
+    @staticmethod
+    def _funding_records(items):
+        return np.array([(ts, rate) for ts, rate in items], dtype=FUNDING_DTYPE)
+
+
+class TickReplayer:
+    """Воспроизведение записанных событий через точки входа DataHandler"""
+    def __init__(self, data_handler, root=None):
+        self.data_handler = data_handler
+        self.root = Config.TICK_STORE_DIR if root is None else root
+
+    def load(self, symbol, day, kind):
+        path = shard_path(self.root, symbol, day, kind)
+        if not os.path.exists(path):
+            return np.zeros(0, dtype=DTYPES[kind])
+        return read_records(path, kind)
+
+    def events(self, symbol, day):
+        """События пары за день, упорядоченные по времени: (ts, kind, symbol, payload)"""
+        return heapq.merge(
+            self._depth_events(symbol, self.load(symbol, day, 'depth')),
+            self._kline_events(symbol, self.load(symbol, day, 'kline')),
+            self._funding_events(symbol, self.load(symbol, day, 'funding')),
+            key=lambda event: event[0]
+        )
+
+    @staticmethod
+    def _depth_events(symbol, records):
+        ends = np.flatnonzero(records['flags'] & FLAG_EVENT_END)
+        start = 0
+        for end in ends.tolist():
+            event = records[start:end + 1]
+            start = end + 1
+            head = event[0]
+            side = event['side']
+            bids = event[side == SIDE_BID]
+            asks = event[side == SIDE_ASK]
+            prev_id = int(head['prev_id'])
+            yield (int(head['ts']), 'depth', symbol, (
+                int(head['first_id']), int(head['last_id']), None if prev_id < 0 else prev_id,
+                list(zip(bids['price'].tolist(), bids['qty'].tolist())),
+                list(zip(asks['price'].tolist(), asks['qty'].tolist())),
+                bool(head['flags'] & FLAG_SNAPSHOT),
+            ))
+
+    @staticmethod
+    def _kline_events(symbol, records):
+        for r in records.tolist():
+            ts, open_time, o, h, l, c, v, closed = r
+            yield (ts, 'kline', symbol, ((open_time, o, h, l, c, v), bool(closed)))
+
+    @staticmethod
+    def _funding_events(symbol, records):
+        for ts, rate in records.tolist():
+            yield (ts, 'funding', symbol, rate)
+
+    def replay(self, symbols, days, speed=None):
+        """Прогон событий через DataHandler.
+
+        speed=None — максимально быстро, иначе во столько раз быстрее реального времени.
+        Возвращает число обработанных событий.
+        """
+        streams = [self.events(symbol, day) for day in days for symbol in symbols]
+        count = 0
+        first_ts = None
+        started = time.monotonic()
+        for ts, kind, symbol, payload in heapq.merge(*streams, key=lambda event: event[0]):
+            if speed:
+                if first_ts is None:
+                    first_ts = ts
+                delay = (ts - first_ts) / 1000 / speed - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            self.dispatch(kind, symbol, payload)
+            count += 1
+        return count
+
+    def dispatch(self, kind, symbol, payload):
+        if kind == 'depth':
+            first_id, last_id, prev_id, bids, asks, snapshot = payload
+            if snapshot:
+                self.data_handler.load_order_book_snapshot(symbol, last_id, bids, asks)
+            else:
+                self.data_handler.apply_order_book_diff(symbol, first_id, last_id, prev_id, bids, asks)
+        elif kind == 'kline':
+            bar, closed = payload
+            self.data_handler.on_kline(symbol, bar, closed, allow_gap=True)
+        elif kind == 'funding':
+            self.data_handler.set_funding_rate(symbol, payload)
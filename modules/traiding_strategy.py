@@ -1,38 +1,119 @@
 from config import Config
+import numpy as np
+from utils.logger import get_logger, DEBUG
+
+log = get_logger('Strategy')
+
+# Условия входа: бит в маске отказа -> название условия
+REJECT_NO_DATA = 1 << 0
+REJECT_VOLUME_RATIO = 1 << 1
+REJECT_SPREAD = 1 << 2
+REJECT_ATR = 1 << 3
+REJECT_EMA = 1 << 4
+REJECT_BTC_DOMINANCE = 1 << 5
+REJECT_FUNDING = 1 << 6
+REJECT_OB_RATIO = 1 << 7
+REJECT_NO_LARGE_BIDS = 1 << 8
+REJECT_WALLS = 1 << 9
+
+REJECT_REASONS = {
+    REJECT_NO_DATA: 'no_data',
+    REJECT_VOLUME_RATIO: 'volume_ratio',
+    REJECT_SPREAD: 'spread',
+    REJECT_ATR: 'atr',
+    REJECT_EMA: 'ema',
+    REJECT_BTC_DOMINANCE: 'btc_dominance',
+    REJECT_FUNDING: 'funding',
+    REJECT_OB_RATIO: 'ob_ratio',
+    REJECT_NO_LARGE_BIDS: 'large_bids',
+    REJECT_WALLS: 'walls',
+}
+
+REQUIRED_COLUMNS = ('ema_short', 'ema_long', 'atr', 'volume_ratio', 'close',
+                    'ob_ratio', 'ob_bid_volume', 'ob_ask_volume', 'ob_spread', 'ob_mid_price')
+
+
+def describe_rejection(bits):
+    """Названия невыполненных условий по маске отказа"""
+    return [name for bit, name in REJECT_REASONS.items() if bits & bit]
+
+
+def evaluate_conditions(columns, btc_dominance, spread_threshold, volume_ratio_threshold, atr_threshold=None):
+    """Векторная проверка условий входа.
+
+    columns — отображение имя индикатора -> массив (по парам или по барам).
+    Возвращает маску отказа uint16: 0 — все условия выполнены.
+    """
+    if atr_threshold is None:
+        atr_threshold = Config.ATR_THRESHOLD
+    close = columns['close']
+    size = len(close)
+    bits = np.zeros(size, dtype=np.uint16)
+    with np.errstate(invalid='ignore'):
+        missing = np.zeros(size, dtype=bool)
+        for name in REQUIRED_COLUMNS:
+            missing |= np.isnan(columns[name])
+        bits[missing] |= REJECT_NO_DATA
+        bits[~(columns['volume_ratio'] >= volume_ratio_threshold)] |= REJECT_VOLUME_RATIO
+        bits[~(columns['ob_spread'] <= spread_threshold)] |= REJECT_SPREAD
+        bits[~(columns['atr'] >= close * atr_threshold)] |= REJECT_ATR
+        bits[~(columns['ema_short'] > columns['ema_long'])] |= REJECT_EMA
+        if not btc_dominance < Config.BTC_DOM_THRESHOLD:
+            bits |= REJECT_BTC_DOMINANCE
+        bits[~(columns['funding_rate'] > Config.FUND_RATE_THRESHOLD)] |= REJECT_FUNDING
+        bits[~(columns['ob_ratio'] >= 1.5)] |= REJECT_OB_RATIO
+        bits[~(columns['ob_large_bids'] > 0)] |= REJECT_NO_LARGE_BIDS
+        bits[~(columns['ob_walls'] == 0)] |= REJECT_WALLS
+    return bits
+
 
 # ====================== Торговая стратегия ======================
 class TradingStrategy:
     def __init__(self, data_handler):
         self.data_handler = data_handler
-    
+        self._thresholds = (None, None, None, None)
+
+    def get_thresholds(self):
+        """Пороги спреда, объёма и ATR для всех строк таблицы индикаторов"""
+        table = self.data_handler.indicator_table
+        key = (len(table), self.data_handler.params_version)
+        if self._thresholds[0] != key:
+            thresholds = [self.data_handler.get_thresholds_for_symbol(symbol) for symbol in table.symbols]
+            spread = np.array([t[0] for t in thresholds])
+            volume_ratio = np.array([t[1] for t in thresholds])
+            atr = np.array([self.data_handler.get_param(symbol, 'ATR_THRESHOLD') for symbol in table.symbols])
+            self._thresholds = (key, spread, volume_ratio, atr)
+        return self._thresholds[1:]
+
+    def screen(self, btc_dominance):
+        """Проверка условий входа сразу по всем парам.
+
+        Возвращает (symbols, маска отказа): пара проходит, если её маска равна 0.
+        """
+        table = self.data_handler.indicator_table
+        spread_threshold, volume_ratio_threshold, atr_threshold = self.get_thresholds()
+        data = table.snapshot()[:len(spread_threshold)]
+        columns = {name: data[:, i] for name, i in table.INDEX.items()}
+        bits = evaluate_conditions(columns, btc_dominance, spread_threshold, volume_ratio_threshold, atr_threshold)
+        return table.symbols[:len(bits)], bits
+
     def check_entry_conditions(self, symbol, btc_dominance):
         """Проверка условий для входа в позицию"""
-        if symbol not in self.data_handler.indicators:
-            print(f"[Strategy] Нет индикаторов для {symbol}")
+        table = self.data_handler.indicator_table
+        if symbol not in table.rows:
+            log.debug("Нет индикаторов для %s", symbol)
             return False
-        ind = self.data_handler.indicators[symbol]
-        funding_ok = self.data_handler.funding_rates.get(symbol, 0)
-
-        # Получаем пороги для монеты
-        spread_threshold, volume_ratio_threshold = self.data_handler.get_thresholds_for_symbol(symbol)
-
-        # --- Новый блок: условия с динамическими порогами ---
-        conditions = (
-            ind['volume_ratio'] >= volume_ratio_threshold and
-            ind['ob_spread'] <= spread_threshold and
-            ind['atr'] >= ind['close'] * Config.ATR_THRESHOLD and
-            ind['ema_short'] > ind['ema_long'] and
-            btc_dominance < Config.BTC_DOM_THRESHOLD and
-            funding_ok > Config.FUND_RATE_THRESHOLD and
-            ind['ob_ratio'] >= 1.5 and
-            len(ind['ob_large_bids']) > 0 and
-            len(ind['ob_walls']) == 0
-        )
-        print(f"[Strategy] Условия для {symbol}: "
-              f"funding_ok={funding_ok > Config.FUND_RATE_THRESHOLD}, "
-              f"volume_ratio={ind['volume_ratio'] >= Config.VOLUME_RATIO}, "
-              f"atr={ind['atr'] >= ind['close'] * Config.ATR_THRESHOLD}, "
-              f"ema_long={ind['ema_short'] > ind['ema_long']} -> {'OK' if conditions else 'NO'}")
-        print(f"[Strategy] Условия для {symbol}: funding_ok={funding_ok}, volume_ratio={ind['volume_ratio']}, atr={ind['atr']}, ema_short={ind['ema_short']}, ema_long={ind['ema_long']}, btc_dom={btc_dominance} -> {'OK' if conditions else 'NO'}")
-        return conditions
-
+        row = table.rows[symbol]
+        spread_threshold, volume_ratio_threshold, atr_threshold = self.get_thresholds()
+        data = table.row(symbol)[np.newaxis]
+        columns = {name: data[:, i] for name, i in table.INDEX.items()}
+        bits = int(evaluate_conditions(
+            columns, btc_dominance, spread_threshold[row:row + 1], volume_ratio_threshold[row:row + 1],
+            atr_threshold[row:row + 1]
+        )[0])
+        if bits:
+            if log.enabled(DEBUG):
+                log.debug("Условия для %s: NO", symbol, rejected=describe_rejection(bits))
+        else:
+            log.debug("Условия для %s: OK", symbol)
+        return bits == 0
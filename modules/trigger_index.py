@@ -0,0 +1,71 @@
+import heapq
+from bisect import bisect_left, bisect_right
+
+# ====================== Индекс срабатывания SL/TP ======================
+class TriggerIndex:
+    """Уровни стоп-лоссов, тейк-профитов и дедлайны позиций одной пары.
+
+    Уровни хранятся отсортированными, поэтому поиск сработавших позиций
+    по цене стоит O(log n + k). Дедлайны — в куче с ленивым удалением.
+    """
+    def __init__(self):
+        self._stop_prices = []
+        self._stop_ids = []
+        self._target_prices = []
+        self._target_ids = []
+        self._deadlines = []
+        self._levels = {}  # position_id -> (stop_loss, take_profit)
+
+    def __len__(self):
+        return len(self._levels)
+
+    def __contains__(self, position_id):
+        return position_id in self._levels
+
+    def add(self, position_id, stop_loss, take_profit, deadline):
+        i = bisect_right(self._stop_prices, stop_loss)
+        self._stop_prices.insert(i, stop_loss)
+        self._stop_ids.insert(i, position_id)
+        i = bisect_right(self._target_prices, take_profit)
+        self._target_prices.insert(i, take_profit)
+        self._target_ids.insert(i, position_id)
+        heapq.heappush(self._deadlines, (deadline, position_id))
+        self._levels[position_id] = (stop_loss, take_profit)
+
+    def remove(self, position_id):
+        levels = self._levels.pop(position_id, None)
+        if levels is None:
+            return False
+        stop_loss, take_profit = levels
+        self._delete(self._stop_prices, self._stop_ids, stop_loss, position_id)
+        self._delete(self._target_prices, self._target_ids, take_profit, position_id)
+        # Дедлайн удалится из кучи лениво
+        return True
+
+    @staticmethod
+    def _delete(prices, ids, price, position_id):
+        i = bisect_left(prices, price)
+        while ids[i] != position_id:
+            i += 1
+        del prices[i]
+        del ids[i]
+
+    def triggered(self, price):
+        """Позиции, у которых сработал стоп (price <= stop_loss) или тейк (price >= take_profit)"""
+        fired = [(position_id, 'stop_loss') for position_id in self._stop_ids[bisect_left(self._stop_prices, price):]]
+        stopped = {position_id for position_id, _ in fired}
+        fired += [
+            (position_id, 'take_profit')
+            for position_id in self._target_ids[:bisect_right(self._target_prices, price)]
+            if position_id not in stopped
+        ]
+        return fired
+
+    def expired(self, now):
+        """Позиции с истёкшим временем удержания"""
+        fired = []
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, position_id = heapq.heappop(self._deadlines)
+            if position_id in self._levels:
+                fired.append((position_id, 'timeout'))
+        return fired
@@ -0,0 +1,112 @@
+import threading
+from websocket import create_connection
+from utils.logger import get_logger
+
+log = get_logger('UserStream')
+
+
+# ====================== Поток данных аккаунта ======================
+class UserDataStream:
+    """User-data stream Binance: события ордеров и баланса аккаунта.
+
+    listenKey создаётся через REST при каждом подключении (повторный POST
+    возвращает действующий ключ) и продлевается keepalive() — задачей
+    планировщика. Соединение ведёт отдельный поток с переподключением.
+    Подписчики получают событие по полю "e": executionReport и
+    outboundAccountPosition (спот), ORDER_TRADE_UPDATE и ACCOUNT_UPDATE
+    (фьючерсы). После каждого подключения вызываются подписчики on_connect —
+    события, пропущенные за время разрыва, сверяются через REST.
+    """
+    def __init__(self, exchange, min_backoff=1.0, max_backoff=60.0):
+        self.exchange = exchange
+        self.futures = exchange.rest.futures
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.listen_key = None
+        self.listeners = {}        # тип события -> [callback(event)]
+        self.connect_listeners = []
+        self._ws = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_listener(self, event_type, callback):
+        self.listeners.setdefault(event_type, []).append(callback)
+
+    def add_connect_listener(self, callback):
+        self.connect_listeners.append(callback)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='user-stream')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._close()
+
+    def create_listen_key(self):
+        api = self.exchange.exchange
+        if self.futures:
+            response = self.exchange.rest.request(1, api.fapiPrivatePostListenKey)
+        else:
+            response = self.exchange.rest.request(2, api.publicPostUserDataStream)
+        self.listen_key = response['listenKey']
+        return self.listen_key
+
+    def keepalive(self):
+        """Продление listenKey; если ключ уже истёк — переподключение с новым"""
+        if self.listen_key is None:
+            return
+        api = self.exchange.exchange
+        try:
+            if self.futures:
+                self.exchange.rest.request(1, api.fapiPrivatePutListenKey)
+            else:
+                self.exchange.rest.request(2, api.publicPutUserDataStream, {'listenKey': self.listen_key})
+        except Exception as e:
+            log.error("Ошибка продления listenKey: %s", e)
+            self._close()
+
+    def _close(self):
+        ws = self._ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    def _run(self):
+        backoff = self.min_backoff
+        while not self._stop.is_set():
+            try:
+                url = f"{self.exchange.get_ws_base_url()}/ws/{self.create_listen_key()}"
+                self._ws = create_connection(url)
+                log.info("User-data stream подключён")
+                backoff = self.min_backoff
+                for callback in self.connect_listeners:
+                    self._call(callback)
+                while not self._stop.is_set():
+                    self.dispatch(self.exchange.decoder.decode(self._ws.recv()))
+            except Exception as e:
+                if self._stop.is_set():
+                    return
+                log.error("Ошибка user-data stream: %s", e)
+            finally:
+                self._close()
+                self._ws = None
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def dispatch(self, event):
+        event_type = event.get('e')
+        if event_type == 'listenKeyExpired':
+            raise ConnectionError("listenKey истёк")
+        for callback in self.listeners.get(event_type, ()):
+            self._call(callback, event)
+
+    @staticmethod
+    def _call(callback, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            log.error("Ошибка подписчика user-data stream: %s", e)
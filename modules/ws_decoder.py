@@ -0,0 +1,83 @@
+import json
+import numpy as np
+from config import Config
+from utils.logger import get_logger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+log = get_logger('Decoder')
+
+# ====================== Декодирование JSON ======================
+def get_loads(name=None):
+    """Функция разбора JSON: orjson, msgspec или json (auto — первая доступная)"""
+    name = name or Config.WS_JSON_DECODER
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'msgspec' if msgspec is not None else 'json'
+    if name == 'orjson' and orjson is not None:
+        return orjson.loads
+    if name == 'msgspec' and msgspec is not None:
+        return msgspec.json.Decoder().decode
+    if name != 'json':
+        log.warning("%s не установлен, используется json", name)
+    return json.loads
+
+
+def parse_levels(bids, asks):
+    """Массивы уровней '[["price","qty"],...]' (байты) -> массивы float64 формы (n, 2).
+
+    Скобки и кавычки вырезаются, числа обеих сторон переводит в float64 один
+    вызов numpy — без вложенных списков и float() на уровень.
+    """
+    bid_values = 0 if bids == b'[]' else bids.count(b',') + 1
+    ask_values = 0 if asks == b'[]' else asks.count(b',') + 1
+    text = (bids + b',' + asks).translate(None, b'[]" ').strip(b',')
+    values = np.array(text.split(b','), dtype=np.float64) if text else np.empty(0)
+    if len(values) != bid_values + ask_values or bid_values % 2 or ask_values % 2:
+        raise ValueError("не удалось разобрать уровни стакана")
+    levels = values.reshape(-1, 2)
+    return levels[:bid_values // 2], levels[bid_values // 2:]
+
+
+class MessageDecoder:
+    """Разбор сообщений WebSocket.
+
+    Для diff-событий стакана массивы "b" и "a" (в событии они последние) вырезаются
+    из сырого сообщения и разбираются сразу в numpy; JSON-парсер получает только
+    короткий заголовок (U, u, pu, E). Остальные сообщения разбираются целиком.
+    Быстрый путь включается только с orjson или msgspec: со стандартным json
+    разбор заголовка и уровней выходит медленнее, чем разбор сообщения целиком.
+    """
+    DEPTH_MARKER = b'"e":"depthUpdate"'
+
+    def __init__(self, name=None):
+        self.loads = get_loads(name)
+        self.fast_depth = Config.WS_FAST_DEPTH and self.loads is not json.loads
+
+    def decode(self, raw):
+        if isinstance(raw, str):
+            raw = raw.encode()
+        if self.fast_depth and self.DEPTH_MARKER in raw:
+            try:
+                return self.decode_depth(raw)
+            except ValueError:
+                pass
+        return self.loads(raw)
+
+    def decode_depth(self, raw):
+        bids_at = raw.find(b',"b":[')
+        asks_at = raw.find(b',"a":[', bids_at)
+        end = raw.rfind(b']') + 1
+        if bids_at < 0 or asks_at < 0 or raw[end:].strip(b'} ') or not raw[end:]:
+            raise ValueError("неожиданный формат depthUpdate")
+        message = self.loads(raw[:bids_at] + raw[end:])
+        data = message.get('data', message)
+        data['b'], data['a'] = parse_levels(raw[bids_at + 5:asks_at], raw[asks_at + 5:end])
+        return message
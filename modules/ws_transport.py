@@ -0,0 +1,104 @@
+import asyncio
+import json
+import random
+import threading
+import websockets
+from utils.logger import get_logger
+
+log = get_logger('WSTransport')
+
+# ====================== asyncio WebSocket-транспорт ======================
+class StreamTransport:
+    """Подписка на множество потоков через несколько combined-соединений (/stream).
+
+    Весь ввод-вывод идёт в одном event loop в отдельном потоке. Сообщения
+    маршрутизируются по имени потока в handler(symbol, message).
+    """
+    def __init__(self, base_url, handler, streams_per_connection=200,
+                 min_backoff=1.0, max_backoff=60.0, decode=json.loads):
+        self.base_url = base_url
+        self.handler = handler
+        self.decode = decode  # Разбор сырого сообщения (см. MessageDecoder)
+        self.streams_per_connection = streams_per_connection
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.routes = {}  # stream -> symbol
+        self.loop = None
+        self._thread = None
+        self._tasks = []
+        self._request_id = 0
+
+    def subscribe(self, symbol, streams):
+        """Регистрация потоков пары (до start())"""
+        for stream in streams:
+            self.routes[stream] = symbol
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='ws-transport')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if self.loop is not None:
+            for task in self._tasks:
+                self.loop.call_soon_threadsafe(task.cancel)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._main())
+        except asyncio.CancelledError:
+            pass
+
+    async def _main(self):
+        streams = list(self.routes)
+        chunks = [
+            streams[i:i + self.streams_per_connection]
+            for i in range(0, len(streams), self.streams_per_connection)
+        ]
+        self._tasks = [asyncio.ensure_future(self._connection(i, chunk)) for i, chunk in enumerate(chunks)]
+        await asyncio.gather(*self._tasks)
+
+    async def _connection(self, index, streams):
+        """Одно combined-соединение: подписка, чтение, переподключение с backoff"""
+        backoff = self.min_backoff
+        url = f"{self.base_url}/stream"
+        while True:
+            try:
+                log.info("Подключение #%s: %s потоков", index, len(streams))
+                async with websockets.connect(url, max_queue=None) as ws:
+                    await self._subscribe(ws, streams)
+                    backoff = self.min_backoff
+                    async for raw in ws:
+                        self._dispatch(raw)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error("Ошибка соединения #%s: %s", index, e)
+            # Экспоненциальный backoff с джиттером, чтобы не переподключаться всем сразу
+            delay = backoff * (0.5 + random.random())
+            log.info("Переподключение #%s через %.1f с", index, delay)
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def _subscribe(self, ws, streams):
+        # Binance ограничивает число входящих сообщений, поэтому подписываемся одним запросом
+        self._request_id += 1
+        await ws.send(json.dumps({'method': 'SUBSCRIBE', 'params': streams, 'id': self._request_id}))
+
+    def _dispatch(self, raw):
+        message = self.decode(raw)
+        stream = message.get('stream')
+        if stream is None:
+            # Ответ на SUBSCRIBE: {"result": null, "id": N}
+            if message.get('error'):
+                log.error("Ошибка подписки: %s", message['error'])
+            return
+        symbol = self.routes.get(stream)
+        if symbol is None:
+            return
+        try:
+            self.handler(symbol, message)
+        except Exception as e:
+            log.error("Ошибка обработки %s: %s", stream, e)
@@ -0,0 +1,6 @@
+from utils.logger import NullWriter, set_writer
+
+
+def pytest_configure(config):
+    # Записи модулей в тестах не нужны: без этого поток записи выводит их в stdout
+    set_writer(NullWriter())
@@ -0,0 +1,123 @@
+import time
+from types import SimpleNamespace
+import pytest
+from modules.account_state import AccountState
+
+
+class FakeRest:
+    """REST аккаунта; during_fetch — события потока, пришедшие, пока запрос был в пути"""
+    def __init__(self, futures, balance, positions=()):
+        self.futures = futures
+        self.balance = balance
+        self.positions = list(positions)
+        self.during_fetch = []
+
+    def fetch_balance(self):
+        for callback in self.during_fetch:
+            callback()
+        self.during_fetch = []
+        return self.balance
+
+    def fetch_positions(self):
+        return self.positions
+
+
+def now_ms(offset=0):
+    return int(time.time() * 1000) + offset
+
+
+def spot_account(balance):
+    rest = FakeRest(False, balance)
+    return AccountState(SimpleNamespace(rest=rest), quote='USDT'), rest
+
+
+def futures_account(balance, positions=()):
+    rest = FakeRest(True, balance, positions)
+    return AccountState(SimpleNamespace(rest=rest), quote='USDT'), rest
+
+
+def futures_balance(free, used, wallet, total=None):
+    return {'free': {'USDT': free}, 'used': {'USDT': used}, 'total': {'USDT': total or wallet},
+            'info': {'assets': [{'asset': 'USDT', 'walletBalance': str(wallet)}]}}
+
+
+# ---------- Спот ----------
+def test_stream_update_during_reconcile_is_kept():
+    account, rest = spot_account({'free': {'USDT': 100.0, 'SOL': 1.0}, 'used': {'USDT': 0.0, 'SOL': 0.0}})
+    account.reconcile()
+    # Ответ REST уже собран биржей, а поток успел сообщить о покупке
+    rest.during_fetch.append(lambda: account.on_account_position(
+        {'E': now_ms(1), 'B': [{'a': 'USDT', 'f': '40.0', 'l': '10.0'}]}))
+    account.reconcile()
+    assert (account.free['USDT'], account.locked['USDT']) == (40.0, 10.0)
+    assert account.free['SOL'] == 1.0
+
+
+def test_reconcile_overwrites_older_stream_update():
+    account, rest = spot_account({'free': {'USDT': 100.0}, 'used': {'USDT': 0.0}})
+    account.on_account_position({'E': now_ms(-60000), 'B': [{'a': 'USDT', 'f': '1.0', 'l': '0.0'}]})
+    account.reconcile()
+    assert account.available() == 100.0
+
+
+def test_equity_uses_book_price_or_last_fill():
+    account, _ = spot_account({'free': {'USDT': 100.0, 'SOL': 2.0}, 'used': {'USDT': 0.0, 'SOL': 1.0}})
+    account.reconcile()
+    assert account.equity() == 100.0  # Цена SOL неизвестна — оценка не завышается
+    account.on_execution_report({'s': 'SOLUSDT', 'x': 'TRADE', 'L': '10.0'})
+    account.on_execution_report({'s': 'SOLUSDT', 'x': 'NEW', 'L': '0.0'})
+    assert account.equity() == 130.0
+    account.price_service = SimpleNamespace(get_local_quote=lambda symbol: {'mid': 20.0})
+    assert account.equity() == 160.0 and account.exposure() == 60.0
+
+
+# ---------- Фьючерсы ----------
+def test_futures_wallet_changes_and_margin_from_reconcile():
+    account, rest = futures_account(futures_balance(800.0, 200.0, 1000.0),
+                                    [{'symbol': 'SOL/USDT:USDT', 'contracts': 10, 'side': 'long',
+                                      'entryPrice': 100, 'unrealizedPnl': 5}])
+    account.reconcile()
+    assert (account.available(), account.reserved(), account.equity()) == (800.0, 200.0, 1005.0)
+
+    # Новая позиция: кошелёк теряет только комиссию, маржа в событии не видна
+    account.on_account_update({'E': now_ms(1), 'a': {'B': [{'a': 'USDT', 'wb': '999.5', 'cw': '999.5'}],
+                                                     'P': [{'s': 'SOLUSDT', 'pa': '20', 'ep': '100', 'up': '0'}]}})
+    assert account.available() == pytest.approx(799.5)
+    assert account.equity() == pytest.approx(999.5)
+    assert account.positions['SOL/USDT'][0] == 20.0
+
+    # Прибыль в available — только после сверки
+    account.on_account_update({'E': now_ms(2), 'a': {'B': [{'a': 'USDT', 'wb': '1020', 'cw': '1020'}],
+                                                     'P': [{'s': 'SOLUSDT', 'pa': '0', 'ep': '0', 'up': '0'}]}})
+    assert account.available() == 800.0 and account.equity() == 1020.0
+    assert 'SOL/USDT' not in account.positions
+    time.sleep(0.01)
+    rest.balance = futures_balance(1020.0, 0.0, 1020.0)
+    rest.positions = []
+    account.reconcile()
+    assert (account.available(), account.reserved(), account.equity()) == (1020.0, 0.0, 1020.0)
+
+
+def test_futures_update_during_reconcile_is_kept():
+    account, rest = futures_account(futures_balance(800.0, 200.0, 1000.0))
+    account.reconcile()
+    rest.balance = futures_balance(900.0, 100.0, 1000.0)
+    rest.positions = [{'symbol': 'SOL/USDT:USDT', 'contracts': 5, 'side': 'short', 'entryPrice': 100,
+                       'unrealizedPnl': 0}]
+    rest.during_fetch.append(lambda: account.on_account_update({'E': now_ms(1), 'a': {
+        'B': [{'a': 'USDT', 'wb': '990', 'cw': '990'}],
+        'P': [{'s': 'SOLUSDT', 'pa': '0', 'ep': '0', 'up': '0'}]}}))
+    account.reconcile()
+    # Свежее событие потока не затёрто: позиция закрыта, убыток учтён
+    assert 'SOL/USDT' not in account.positions
+    assert account.equity() == 990.0
+    assert account.available() == 790.0
+
+
+def test_futures_short_position_from_reconcile():
+    account, _ = futures_account(futures_balance(800.0, 200.0, 1000.0),
+                                 [{'symbol': 'SOL/USDT:USDT', 'contracts': 3, 'side': 'short', 'entryPrice': 50,
+                                   'unrealizedPnl': -2}])
+    account.reconcile()
+    assert account.positions['SOL/USDT'] == (-3.0, 50.0, -2.0)
+    assert account.exposure() == 150.0
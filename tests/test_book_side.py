@@ -0,0 +1,52 @@
+import random
+import pytest
+from modules.order_book import BookSide
+
+
+def reference_levels(reference, is_bid):
+    return sorted(((price, qty) for price, qty in reference.items() if qty), reverse=is_bid)
+
+
+@pytest.mark.parametrize('is_bid', [True, False])
+def test_update_matches_dict(is_bid):
+    rng = random.Random(7)
+    side = BookSide(is_bid, capacity=1000)
+    reference = {}
+    for _ in range(300):
+        batch = [(rng.randint(1, 200) / 4, rng.choice([0.0, 0.0, rng.randint(1, 50) / 10]))
+                 for _ in range(rng.randint(1, 20))]
+        expected = {}
+        for price, qty in batch:
+            expected[price] = qty  # Для повторяющейся цены действует последнее значение
+        old = {price: reference.get(price, 0.0) for price in expected}
+
+        prices, old_qtys, new_qtys = side.update([price for price, _ in batch], [qty for _, qty in batch])
+
+        changed = {price: (old[price], qty) for price, qty in expected.items() if old[price] != qty}
+        assert dict(zip(prices.tolist(), zip(old_qtys.tolist(), new_qtys.tolist()))) == changed
+        for price, qty in expected.items():
+            reference[price] = qty
+        assert list(side) == reference_levels(reference, is_bid)
+        assert len(side) == len(reference_levels(reference, is_bid))
+    for price in list(reference)[:20]:
+        assert side.get(price) == reference[price]
+
+
+def test_capacity_keeps_best_levels():
+    side = BookSide(is_bid=True, capacity=3)
+    side.update([1.0, 2.0, 3.0, 4.0], [1.0, 1.0, 1.0, 1.0])
+    assert side.prices.tolist() == [4.0, 3.0, 2.0]
+    side.update([5.0], [2.0])
+    assert side.prices.tolist() == [5.0, 4.0, 3.0]
+    side.update([4.0], [0.0])
+    assert side.prices.tolist() == [5.0, 3.0]
+
+
+def test_best_and_set():
+    side = BookSide(is_bid=False, capacity=10)
+    assert side.best() is None
+    assert side.set(10.0, 2.0) == 0.0
+    assert side.set(9.5, 1.0) == 0.0
+    assert side.best() == (9.5, 1.0)
+    assert side.set(9.5, 0.0) == 1.0
+    assert side.best() == (10.0, 2.0)
@@ -0,0 +1,88 @@
+import threading
+import time
+import numpy as np
+import pytest
+from modules.indicator_table import IndicatorTable, SharedIndicatorTable
+
+
+def test_update_and_row():
+    table = IndicatorTable(['SOL/USDT', 'ARB/USDT'])
+    table.update('SOL/USDT', {'ema_short': 1.5, 'ob_walls': [1, 2, 3], 'close': None, 'unknown': 1})
+    row = table.row('SOL/USDT')
+    assert row[table.INDEX['ema_short']] == 1.5
+    assert row[table.INDEX['ob_walls']] == 3
+    assert np.isnan(row[table.INDEX['close']])
+    assert table.row('ARB/USDT')[table.INDEX['funding_rate']] == 0
+    assert table.versions.tolist() == [2, 0]
+
+
+def test_new_symbol_gets_a_row():
+    table = IndicatorTable()
+    table.update('HBAR/USDT', {'close': 0.1})
+    assert len(table) == 1 and table.row('HBAR/USDT')[table.INDEX['close']] == 0.1
+
+
+def test_failed_write_leaves_row_readable():
+    table = IndicatorTable(['SOL/USDT'])
+    with pytest.raises(ValueError):
+        table.update('SOL/USDT', {'close': 'не число'})
+    assert table.versions[0] % 2 == 0
+
+
+def test_row_left_odd_by_crashed_writer():
+    table = IndicatorTable(['SOL/USDT'])
+    table.update('SOL/USDT', {'close': 1.0})
+    table.versions[0] += 1  # Писатель упал посреди записи
+    start = time.monotonic()
+    assert table.row('SOL/USDT')[table.INDEX['close']] == 1.0
+    assert table.snapshot()[0, table.INDEX['close']] == 1.0
+    assert time.monotonic() - start < 1.0
+    # Следующая запись восстанавливает чётность
+    table.update('SOL/USDT', {'close': 2.0})
+    assert table.versions[0] % 2 == 0
+
+
+def test_release_rows():
+    table = IndicatorTable(['SOL/USDT', 'ARB/USDT'])
+    table.versions[:] = [3, 4]
+    table.release_rows(['SOL/USDT', 'ARB/USDT'])
+    assert table.versions.tolist() == [4, 4]
+
+
+def test_readers_never_see_torn_rows():
+    """Писатель заполняет строку одним числом; читатель не должен увидеть смесь"""
+    table = IndicatorTable(['SOL/USDT', 'ARB/USDT'])
+    columns = list(table.COLUMNS)
+    stop = threading.Event()
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            table.update('SOL/USDT', dict.fromkeys(columns, float(i)))
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(2000):
+            row = table.row('SOL/USDT')
+            assert np.isnan(row).all() or (row == row[0]).all()
+            row = table.snapshot()[0]
+            assert np.isnan(row).all() or (row == row[0]).all()
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_shared_table_between_handles():
+    table = SharedIndicatorTable.create(['SOL/USDT'])
+    try:
+        reader = SharedIndicatorTable.attach(table.shm.name, ['SOL/USDT'])
+        table.update('SOL/USDT', {'close': 3.0})
+        assert reader.row('SOL/USDT')[reader.INDEX['close']] == 3.0
+        assert reader.versions[0] == 2
+        with pytest.raises(KeyError):
+            reader.add_symbol('ARB/USDT')
+        reader.close()
+    finally:
+        table.close()
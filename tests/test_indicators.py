@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+import talib
+from modules.indicators import ATR, EMA, SMA, IndicatorState
+
+
+@pytest.fixture
+def bars():
+    rng = np.random.default_rng(5)
+    n = 600
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.003, n)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.002, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.002, n))
+    volume = rng.uniform(10, 1000, n)
+    timestamp = np.arange(n) * 300000.0
+    return np.column_stack([timestamp, open_, high, low, close, volume])
+
+
+def assert_matches(values, reference):
+    values = np.array([np.nan if value is None else value for value in values], dtype=float)
+    assert np.array_equal(np.isnan(values), np.isnan(reference))
+    valid = ~np.isnan(reference)
+    np.testing.assert_allclose(values[valid], reference[valid], rtol=1e-10)
+
+
+def test_indicator_state_matches_talib(bars):
+    state = IndicatorState(8, 20, 5, volume_sma_period=20)
+    pushed = [state.push(tuple(bar)) for bar in bars]
+    high, low, close, volume = bars[:, 2], bars[:, 3], bars[:, 4], bars[:, 5]
+    assert_matches([values['ema_short'] for values in pushed], talib.EMA(close, 8))
+    assert_matches([values['ema_long'] for values in pushed], talib.EMA(close, 20))
+    assert_matches([values['atr'] for values in pushed], talib.ATR(high, low, close, 5))
+    volume_sma = talib.SMA(volume, 20)
+    assert_matches([values['volume_sma'] for values in pushed], volume_sma)
+    ratio = np.array([values['volume_ratio'] for values in pushed])
+    np.testing.assert_allclose(ratio[19:], volume[19:] / volume_sma[19:], rtol=1e-10)
+    assert (ratio[:19] == 0).all()
+
+
+@pytest.mark.parametrize('period', [1, 2, 14])
+def test_single_indicators_match_talib(bars, period):
+    high, low, close = bars[:, 2], bars[:, 3], bars[:, 4]
+    ema, sma, atr = EMA(period), SMA(period), ATR(period)
+    assert_matches([ema.push(x) for x in close], talib.EMA(close, period))
+    assert_matches([sma.push(x) for x in close], talib.SMA(close, period))
+    assert_matches([atr.push(h, l, c) for h, l, c in zip(high, low, close)], talib.ATR(high, low, close, period))
+
+
+def test_peek_equals_push_and_keeps_state(bars):
+    state = IndicatorState(8, 20, 5)
+    reference = IndicatorState(8, 20, 5)
+    for bar in bars[:100]:
+        bar = tuple(bar)
+        # Формирующийся бар обновляется несколько раз до закрытия
+        forming = (bar[0], bar[1], bar[2] * 1.01, bar[3], bar[4] * 1.005, bar[5] / 2)
+        state.peek(forming)
+        peeked = state.peek(bar)
+        pushed = state.push(bar)
+        assert reference.push(bar) == pytest.approx(pushed, nan_ok=True)
+        assert peeked == pytest.approx(pushed, nan_ok=True)
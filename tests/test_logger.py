@@ -0,0 +1,42 @@
+import json
+from utils.logger import DEBUG, INFO, LogWriter, Logger
+
+
+class ListWriter:
+    def __init__(self):
+        self.records = []
+
+    def put(self, record):
+        self.records.append(record)
+
+
+def test_mutable_fields_are_copied_when_logged():
+    writer = ListWriter()
+    log = Logger('Test', writer)
+    params = {'EMA_SHORT': 8, 'levels': [1, 2]}
+    position = {'size': 1.0}
+    log.info("Параметры %s", position, params=params)
+    params['EMA_SHORT'] = 13
+    params['levels'].append(3)
+    position['size'] = 0.0
+    entry = json.loads(LogWriter.format(writer.records[0]))
+    assert entry['params'] == {'EMA_SHORT': 8, 'levels': [1, 2]}
+    assert entry['msg'] == "Параметры {'size': 1.0}"
+    assert (entry['level'], entry['module']) == ('INFO', 'Test')
+
+
+def test_disabled_level_is_not_recorded():
+    writer = ListWriter()
+    log = Logger('Test', writer, level=INFO)
+    log.debug("не пишется", value=[1])
+    assert writer.records == [] and not log.enabled(DEBUG)
+
+
+def test_rate_limit_counts_suppressed_records():
+    writer = ListWriter()
+    log = Logger('Test', writer, rate=2)
+    for i in range(5):
+        log.info("запись %s", i)
+    log.error("ошибка")
+    assert len(writer.records) == 3
+    assert writer.records[-1][5] == {'suppressed': 3}
@@ -0,0 +1,66 @@
+import numpy as np
+from modules.mailbox import DEPTH, KLINE, SNAPSHOT, coalesce
+from modules.order_book import BookSide
+
+
+def depth(first_id, last_id, bids, asks=(), prev_id=None):
+    return DEPTH, (first_id, last_id, prev_id, np.array(bids, dtype=float).reshape(-1, 2),
+                   np.array(asks, dtype=float).reshape(-1, 2))
+
+
+def test_contiguous_spot_diffs_are_merged():
+    book, klines = coalesce([
+        depth(1, 3, [[10.0, 1.0]]),
+        depth(4, 6, [[10.0, 2.0], [9.0, 1.0]], [[11.0, 1.0]]),
+        depth(7, 7, [[9.0, 0.0]]),
+    ])
+    assert klines == []
+    assert len(book) == 1
+    kind, (first_id, last_id, prev_id, bids, asks) = book[0]
+    assert (kind, first_id, last_id, prev_id) == (DEPTH, 1, 7, None)
+    # Уровни более позднего события перекрывают ранние
+    side = BookSide(is_bid=True, capacity=10)
+    side.update(bids[:, 0], bids[:, 1])
+    assert list(side) == [(10.0, 2.0)]
+    assert asks.tolist() == [[11.0, 1.0]]
+
+
+def test_futures_diffs_are_merged_by_pu():
+    book, _ = coalesce([
+        depth(1, 3, [[10.0, 1.0]], prev_id=0),
+        depth(5, 8, [[10.0, 2.0]], prev_id=3),
+        depth(10, 12, [[10.0, 3.0]], prev_id=9),
+    ])
+    assert [(event[0], event[1], event[2]) for _, event in book] == [(1, 8, 0), (10, 12, 9)]
+
+
+def test_gap_and_snapshot_break_merging():
+    snapshot = (SNAPSHOT, (20, [[10.0, 1.0]], []))
+    book, _ = coalesce([
+        depth(1, 3, [[10.0, 1.0]]),
+        depth(5, 6, [[10.0, 2.0]]),
+        snapshot,
+        depth(7, 7, [[10.0, 3.0]]),
+        depth(8, 8, [[10.0, 4.0]]),
+    ])
+    assert [kind for kind, _ in book] == [DEPTH, DEPTH, SNAPSHOT, DEPTH]
+    assert book[2] == snapshot
+    assert (book[3][1][0], book[3][1][1]) == (7, 8)
+
+
+def test_single_event_keeps_its_levels():
+    event = depth(1, 1, [[10.0, 1.0]])
+    book, _ = coalesce([event])
+    assert book[0][1][3] is event[1][3]
+
+
+def test_klines_keep_last_update_of_open_bar():
+    bar = lambda open_time, close: (open_time, 1.0, 2.0, 0.5, close, 10.0)
+    _, klines = coalesce([
+        (KLINE, (bar(0, 1.0), False)),
+        (KLINE, (bar(0, 1.1), False)),
+        (KLINE, (bar(0, 1.2), True)),
+        (KLINE, (bar(300, 1.3), False)),
+        (KLINE, (bar(300, 1.4), False)),
+    ])
+    assert [(k[0][0], k[0][4], k[1]) for k in klines] == [(0, 1.2, True), (300, 1.4, False)]
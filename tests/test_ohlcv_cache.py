@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from modules.ohlcv_cache import OHLCVCache
+
+SYMBOL = 'BTC/USDT:USDT'
+
+
+def make_bars(start, count, step=60000):
+    times = start + np.arange(count) * step
+    prices = 100.0 + np.arange(count, dtype=float)
+    return np.column_stack([times, prices, prices + 1, prices - 1, prices + 0.5, np.full(count, 10.0)])
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = OHLCVCache(root=str(tmp_path), timeframe='1m')
+    yield cache
+    cache.close()
+
+
+def test_empty_cache(cache):
+    assert cache.load(SYMBOL).shape == (0, 6)
+    assert cache.last_timestamp(SYMBOL) is None
+
+
+def test_only_newer_bars_appended(cache, tmp_path):
+    first = make_bars(0, 10)
+    assert cache.append(SYMBOL, first) == 10
+    # Перекрывающаяся загрузка: старые и последняя сохранённая свечи пропускаются
+    overlap = make_bars(5 * 60000, 10)
+    overlap[:5, 4] = -1.0
+    assert cache.append(SYMBOL, overlap) == 5
+    assert cache.append(SYMBOL, first) == 0
+    assert cache.last_timestamp(SYMBOL) == 14 * 60000
+
+    expected = np.vstack([first, overlap[5:]])
+    np.testing.assert_array_equal(cache.load(SYMBOL), expected)
+    np.testing.assert_array_equal(cache.load(SYMBOL, 3), expected[-3:])
+
+    # Новый экземпляр читает последнюю свечу из файла
+    cache.close()
+    reopened = OHLCVCache(root=str(tmp_path), timeframe='1m')
+    assert reopened.last_timestamp(SYMBOL) == 14 * 60000
+    assert reopened.append(SYMBOL, make_bars(14 * 60000, 3)) == 2
+    assert len(reopened.load(SYMBOL)) == 17
+    reopened.close()
+
+
+def test_timeframes_use_separate_files(tmp_path):
+    minute = OHLCVCache(root=str(tmp_path), timeframe='1m')
+    five = OHLCVCache(root=str(tmp_path), timeframe='5m')
+    minute.append(SYMBOL, make_bars(0, 4))
+    assert five.load(SYMBOL).shape == (0, 6)
+    assert five.append(SYMBOL, make_bars(0, 2, step=300000)) == 2
+    assert len(minute.load(SYMBOL)) == 4
+    minute.close()
+    five.close()
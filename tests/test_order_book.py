@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from modules.order_book import OrderBook
+
+
+@pytest.fixture
+def book():
+    book = OrderBook('SOL/USDT')
+    book.load_snapshot(100, [[10.0, 1.0], [9.0, 2.0]], [[11.0, 1.0], [12.0, 2.0]])
+    return book
+
+
+def levels(side):
+    return [tuple(level) for level in side]
+
+
+# ---------- Спот: U/u ----------
+def test_spot_drops_events_covered_by_snapshot(book):
+    assert book.apply_diff(90, 100, None, [[10.0, 5.0]], []) == []
+    assert book.bids.get(10.0) == 1.0
+
+
+def test_spot_first_event_straddles_snapshot(book):
+    changes = book.apply_diff(95, 103, None, [[10.0, 0.0], [9.5, 3.0]], [])
+    assert book.synced and book.last_update_id == 103
+    side, prices, old, new = changes[0]
+    assert side == 'bid'
+    assert prices.tolist() == [10.0, 9.5] and old.tolist() == [1.0, 0.0] and new.tolist() == [0.0, 3.0]
+    assert levels(book.bids) == [(9.5, 3.0), (9.0, 2.0)]
+
+
+def test_spot_first_event_after_gap_resets(book):
+    assert book.apply_diff(102, 105, None, [[10.0, 5.0]], []) is None
+    assert not book.synced and len(book.bids) == 0
+
+
+def test_spot_gap_between_events_resets(book):
+    book.apply_diff(101, 103, None, [], [[11.0, 3.0]])
+    assert book.apply_diff(105, 107, None, [], [[11.0, 4.0]]) is None
+    assert not book.synced
+    # Событие после разрыва ждёт нового снимка в буфере
+    changes = book.load_snapshot(104, [[10.0, 1.0]], [[11.0, 3.0]])
+    assert changes is not None and book.last_update_id == 107
+    assert book.asks.get(11.0) == 4.0
+
+
+# ---------- Фьючерсы: pu ----------
+def test_futures_first_event_ending_at_snapshot_is_applied(book):
+    changes = book.apply_diff(95, 100, 94, [[10.0, 7.0]], [])
+    assert changes and book.bids.get(10.0) == 7.0
+
+
+def test_futures_drops_events_before_snapshot(book):
+    assert book.apply_diff(90, 99, 89, [[10.0, 7.0]], []) == []
+    assert book.bids.get(10.0) == 1.0
+
+
+def test_futures_first_event_must_contain_snapshot_id(book):
+    # U = lastUpdateId + 1 подходит споту, но не фьючерсам
+    assert book.apply_diff(101, 105, 100, [[10.0, 7.0]], []) is None
+    assert not book.synced
+
+
+def test_futures_events_chain_by_pu(book):
+    book.apply_diff(98, 102, 97, [], [])
+    assert book.apply_diff(110, 115, 102, [[9.0, 0.0]], []) is not None
+    assert book.last_update_id == 115 and book.bids.get(9.0) == 0.0
+    assert book.apply_diff(120, 125, 116, [], []) is None
+    assert not book.synced
+
+
+# ---------- Буфер до снимка ----------
+def test_events_before_snapshot_are_buffered():
+    book = OrderBook('SOL/USDT')
+    assert book.apply_diff(95, 99, None, [[10.0, 9.0]], []) is None
+    assert book.apply_diff(100, 102, None, [[10.0, 2.0]], []) is None
+    changes = book.load_snapshot(100, [[10.0, 1.0]], [[11.0, 1.0]])
+    assert book.last_update_id == 102 and book.bids.get(10.0) == 2.0
+    # Уровни снимка и применённое событие
+    assert [change[0] for change in changes] == ['bid', 'ask', 'bid']
+
+
+def test_snapshot_not_matching_buffer_waits_for_next_snapshot():
+    book = OrderBook('SOL/USDT')
+    book.apply_diff(110, 112, None, [[10.0, 2.0]], [])
+    assert book.load_snapshot(100, [[10.0, 1.0]], []) is None
+    assert not book.synced
+    assert book.load_snapshot(111, [[10.0, 1.0]], []) is not None
+    assert book.last_update_id == 112
+
+
+def test_string_levels_are_parsed(book):
+    book.apply_diff(101, 101, None, [['10.5', '4.25']], np.empty((0, 2)))
+    assert book.bids.best() == (10.5, 4.25)
+    assert book.mid_price() == pytest.approx((10.5 + 11.0) / 2)
@@ -0,0 +1,140 @@
+from types import SimpleNamespace
+import ccxt
+import pytest
+from modules.order_gateway import (
+    CANCELED, FILLED, NEW, PARTIALLY_FILLED, PENDING, REJECTED, OrderGateway, TrackedOrder
+)
+
+
+# ---------- TrackedOrder ----------
+def make_order():
+    return TrackedOrder('c1', 'SOL/USDT', 'buy', 'limit', 2.0, 100.0)
+
+
+def test_forward_transitions():
+    order = make_order()
+    assert order.update(NEW, 0.0, order_id=42)
+    assert order.update(PARTIALLY_FILLED, 0.5, 100.0)
+    assert order.update(PARTIALLY_FILLED, 1.5, 100.1)
+    assert order.update(FILLED, 2.0, 100.05)
+    assert (order.status, order.filled, order.average, order.id, order.done) == (FILLED, 2.0, 100.05, '42', True)
+
+
+def test_stale_events_are_ignored():
+    order = make_order()
+    order.update(PARTIALLY_FILLED, 1.5)
+    assert not order.update(NEW, 0.0)
+    assert not order.update(PARTIALLY_FILLED, 1.0)
+    assert not order.update(PARTIALLY_FILLED, 1.5)
+    order.update(CANCELED, 1.5)
+    assert not order.update(FILLED, 2.0)
+    assert not order.update(None)
+    assert (order.status, order.filled) == (CANCELED, 1.5)
+
+
+def test_listener_added_after_ack_is_called_at_once():
+    order = make_order()
+    calls = []
+    order.add_listener(lambda o: calls.append(o.status))
+    assert calls == []
+    order.update(NEW)
+    order.notify()
+    order.add_listener(lambda o: calls.append(('late', o.status)))
+    assert calls == [NEW, ('late', NEW)]
+
+
+def test_failing_listener_does_not_stop_others():
+    order = make_order()
+    calls = []
+    order.add_listener(lambda o: 1 / 0)
+    order.add_listener(lambda o: calls.append(o.status))
+    order.update(FILLED, 2.0)
+    order.notify()
+    assert calls == [FILLED]
+
+
+# ---------- OrderGateway ----------
+class FakeApi:
+    has = {}
+    markets = {}
+
+    def __init__(self):
+        self.responses = []
+        self.fetched = {}
+
+    def create_order(self, symbol, type, side, amount, price, params):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def fetch_order(self, order_id, symbol, params):
+        response = self.fetched.get(order_id or params.get('origClientOrderId'))
+        if response is None:
+            raise ccxt.OrderNotFound('нет ордера')
+        return response
+
+    def cancel_order(self, order_id, symbol):
+        return dict(self.fetched[order_id], status='canceled')
+
+
+@pytest.fixture
+def gateway():
+    rest = SimpleNamespace(futures=False, request=lambda weight, method, *args: method(*args))
+    return OrderGateway(SimpleNamespace(exchange=FakeApi(), rest=rest), asynchronous=False)
+
+
+def test_ack_and_stream_updates(gateway):
+    gateway.exchange.exchange.responses.append({'id': 7, 'status': 'open', 'filled': 0.0})
+    order = gateway.submit('SOL/USDT', 'buy', 2.0, 100.0)
+    statuses = []
+    order.add_listener(lambda o: statuses.append((o.status, o.filled)))
+    assert order.ack.result()['id'] == 7 and order.status == NEW
+    assert gateway.on_update(order.client_id, PARTIALLY_FILLED, 1.0, 100.0)
+    assert not gateway.on_update(order.client_id, NEW, 0.0)
+    gateway.on_order({'id': '7', 'status': 'closed', 'filled': 2.0, 'average': 100.0})
+    assert statuses == [(NEW, 0.0), (PARTIALLY_FILLED, 1.0), (FILLED, 2.0)]
+    assert order.client_id not in gateway.orders and '7' not in gateway.by_id
+    assert gateway.history[-1] is order
+
+
+def test_rejected_order(gateway):
+    gateway.exchange.exchange.responses.append(ccxt.InsufficientFunds('нет средств'))
+    order = gateway.submit('SOL/USDT', 'buy', 2.0, 100.0)
+    assert order.status == REJECTED and order.done
+    with pytest.raises(ccxt.InsufficientFunds):
+        order.ack.result()
+    assert not gateway.orders
+
+
+def test_timeout_keeps_order_pending_until_reconcile(gateway):
+    api = gateway.exchange.exchange
+    api.responses.append(ccxt.RequestTimeout('нет ответа'))
+    order = gateway.submit('SOL/USDT', 'buy', 2.0, 100.0)
+    assert order.status == PENDING and order.client_id in gateway.orders
+    api.fetched[order.client_id] = {'id': 9, 'status': 'closed', 'filled': 2.0, 'average': 100.0}
+    gateway.reconcile()
+    assert (order.status, order.filled, order.id) == (FILLED, 2.0, '9')
+    assert not gateway.orders
+
+
+def test_timeout_for_order_that_never_arrived(gateway):
+    gateway.exchange.exchange.responses.append(ccxt.RequestTimeout('нет ответа'))
+    order = gateway.submit('SOL/USDT', 'buy', 2.0, 100.0)
+    gateway.reconcile()
+    assert order.status == REJECTED
+
+
+def test_cancel_keeps_partial_fill(gateway):
+    api = gateway.exchange.exchange
+    api.responses.append({'id': 3, 'status': 'open', 'filled': 0.0})
+    order = gateway.submit('SOL/USDT', 'buy', 2.0, 100.0)
+    api.fetched['3'] = {'id': 3, 'status': 'open', 'filled': 0.5, 'average': 100.0}
+    gateway.cancel(order)
+    assert (order.status, order.filled) == (CANCELED, 0.5)
+
+
+def test_zero_amount_is_rejected_locally(gateway):
+    order = gateway.submit('SOL/USDT', 'buy', 0.0, 100.0)
+    assert order.status == REJECTED
+    assert isinstance(order.error, ccxt.InvalidOrder)
@@ -0,0 +1,200 @@
+import threading
+from types import SimpleNamespace
+import ccxt
+import pytest
+from modules.account_state import AccountState
+from modules.order_book import OrderBook
+from modules.paper_exchange import PaperBroker
+
+FEE = 0.001
+
+
+class FakeDataHandler:
+    """Стакан и подписчики на изменения уровней — то, что движок берёт у DataHandler"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.books = {}
+        self.book_listeners = []
+        self.update_id = 100
+
+    def add_book_listener(self, callback):
+        self.book_listeners.append(callback)
+
+    def get_order_book(self, symbol):
+        return self.books.setdefault(symbol, OrderBook(symbol))
+
+    def snapshot(self, symbol, bids, asks):
+        self.get_order_book(symbol).load_snapshot(self.update_id, bids, asks)
+
+    def diff(self, symbol, bids=(), asks=()):
+        self.update_id += 1
+        with self.lock:
+            changes = self.get_order_book(symbol).apply_diff(self.update_id, self.update_id, None,
+                                                             list(bids), list(asks))
+        for callback in self.book_listeners:
+            callback(symbol, changes)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def market():
+    data = FakeDataHandler()
+    data.snapshot('SOL/USDT', [[10.0, 5.0], [9.9, 5.0]], [[11.0, 5.0], [11.1, 5.0]])
+    return data
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def broker(market, clock):
+    return PaperBroker(market, balances={'USDT': 1000.0, 'SOL': 10.0}, maker_fee=FEE, taker_fee=FEE,
+                       latency_ms=0, clock=clock)
+
+
+def balance(broker, currency):
+    return broker.account.free.get(currency, 0.0), broker.account.used.get(currency, 0.0)
+
+
+# ---------- Тейкер ----------
+def test_taker_fill_walks_levels_and_rests_remainder(broker):
+    order = broker.create_order('SOL/USDT', 'limit', 'buy', 8.0, 11.05)
+    assert (order['filled'], order['status']) == (5.0, 'open')
+    assert order['average'] == 11.0
+    reserved = 8.0 * 11.05 * (1 + FEE)
+    # Резерв освобождается пропорционально исполненной части
+    free, used = balance(broker, 'USDT')
+    assert used == pytest.approx(reserved * 3 / 8)
+    assert free == pytest.approx(1000.0 - reserved * 3 / 8 - 55.0 * (1 + FEE))
+    assert balance(broker, 'SOL')[0] == 15.0
+
+
+def test_taken_liquidity_is_not_taken_twice(broker, market):
+    broker.create_order('SOL/USDT', 'limit', 'buy', 3.0, 11.0)
+    second = broker.create_order('SOL/USDT', 'limit', 'buy', 3.0, 11.0)
+    assert second['filled'] == 2.0
+    # Новое значение уровня из потока заменяет учтённый нами объём
+    market.diff('SOL/USDT', asks=[[11.0, 4.0]])
+    assert broker.fetch_order(second['id'])['filled'] == 3.0
+
+
+def test_market_buy_is_limited_by_free_quote(market, clock):
+    broker = PaperBroker(market, balances={'USDT': 33.0}, maker_fee=FEE, taker_fee=FEE, latency_ms=0, clock=clock)
+    order = broker.create_order('SOL/USDT', 'market', 'buy', 5.0)
+    assert order['status'] == 'canceled'
+    assert order['filled'] == pytest.approx(33.0 / (11.0 * (1 + FEE)))
+    assert balance(broker, 'USDT')[0] == pytest.approx(0.0, abs=1e-9)
+
+
+# ---------- FOK / IOC ----------
+def test_fok_without_liquidity_is_canceled_and_releases_reserve(broker):
+    order = broker.create_order('SOL/USDT', 'limit', 'buy', 6.0, 11.0, {'timeInForce': 'FOK'})
+    assert (order['status'], order['filled']) == ('canceled', 0.0)
+    assert balance(broker, 'USDT') == (1000.0, 0.0)
+
+
+def test_ioc_fills_what_it_can(broker):
+    order = broker.create_order('SOL/USDT', 'limit', 'buy', 6.0, 11.0, {'timeInForce': 'IOC'})
+    assert (order['status'], order['filled']) == ('canceled', 5.0)
+    assert balance(broker, 'USDT') == (pytest.approx(1000.0 - 55.0 * (1 + FEE)), 0.0)
+
+
+# ---------- Очередь мейкера ----------
+def test_queue_position_then_partial_fill(broker, market):
+    order = broker.create_order('SOL/USDT', 'limit', 'sell', 2.0, 11.0)
+    assert order['status'] == 'open' and balance(broker, 'SOL') == (8.0, 2.0)
+    market.diff('SOL/USDT', asks=[[11.0, 1.0]])  # Сделки на 4 съедают очередь перед ордером
+    assert broker.fetch_order(order['id'])['filled'] == 0.0
+    market.diff('SOL/USDT', asks=[[11.0, 0.0]])  # Очередь перед ордером закончилась
+    assert broker.fetch_order(order['id'])['filled'] == 0.0
+    market.diff('SOL/USDT', asks=[[11.0, 3.0]])
+    market.diff('SOL/USDT', asks=[[11.0, 2.0]])  # Сделка на 1 — уже по нашему ордеру
+    filled = broker.fetch_order(order['id'])
+    assert (filled['filled'], filled['status']) == (1.0, 'open')
+    assert balance(broker, 'SOL') == (8.0, 1.0)
+    assert balance(broker, 'USDT')[0] == pytest.approx(1000.0 + 11.0 * (1 - FEE))
+    assert broker.trades[-1]['takerOrMaker'] == 'maker'
+
+    broker.cancel_order(order['id'])
+    assert balance(broker, 'SOL') == (9.0, 0.0)
+    with pytest.raises(ccxt.OrderNotFound):
+        broker.cancel_order(order['id'])
+
+
+def test_crossed_order_fills_at_its_own_price(broker, market):
+    order = broker.create_order('SOL/USDT', 'limit', 'buy', 3.0, 10.5)
+    assert order['status'] == 'open'
+    market.diff('SOL/USDT', asks=[[10.4, 2.0], [10.45, 2.0]])
+    filled = broker.fetch_order(order['id'])
+    assert (filled['filled'], filled['status'], filled['average']) == (3.0, 'closed', 10.5)
+    reserved_left = balance(broker, 'USDT')[1]
+    assert reserved_left == pytest.approx(0.0, abs=1e-9)
+    assert balance(broker, 'USDT')[0] == pytest.approx(1000.0 - 3.0 * 10.5 * (1 + FEE))
+
+
+# ---------- Задержка ----------
+def test_orders_wait_for_latency(market, clock):
+    broker = PaperBroker(market, balances={'USDT': 1000.0}, maker_fee=FEE, taker_fee=FEE, latency_ms=50,
+                         clock=clock)
+    first = broker.create_order('SOL/USDT', 'limit', 'buy', 1.0, 11.0)
+    clock.now += 0.01
+    second = broker.create_order('SOL/USDT', 'limit', 'buy', 1.0, 11.0)
+    assert broker.fetch_order(first['id'])['filled'] == 0.0
+    clock.now += 0.045
+    broker.poll()
+    assert broker.fetch_order(first['id'])['filled'] == 1.0
+    assert broker.fetch_order(second['id'])['filled'] == 0.0
+    clock.now += 0.01
+    assert broker.fetch_order(second['id'])['filled'] == 1.0
+
+
+def test_canceled_while_in_flight_is_never_activated(market, clock):
+    broker = PaperBroker(market, balances={'USDT': 1000.0}, latency_ms=50, clock=clock)
+    order = broker.create_order('SOL/USDT', 'limit', 'buy', 1.0, 11.0)
+    broker.cancel_order(order['id'])
+    clock.now += 1
+    broker.poll()
+    assert broker.fetch_order(order['id'])['status'] == 'canceled'
+    assert balance(broker, 'USDT') == (1000.0, 0.0)
+
+
+# ---------- События ----------
+def test_listeners_see_fills_and_balances(broker, market):
+    orders, balances = [], {}
+    broker.add_listener(lambda order: orders.append((order['status'], order['filled'])))
+    broker.account.add_listener(lambda event: balances.update({item['a']: (item['f'], item['l'])
+                                                                for item in event['B']}))
+    broker.create_order('SOL/USDT', 'limit', 'buy', 6.0, 11.0)
+    market.diff('SOL/USDT', asks=[[11.0, 0.0], [10.9, 5.0]])
+    assert orders == [('open', 5.0), ('open', 6.0), ('closed', 6.0)]
+    assert balances == {currency: balance(broker, currency) for currency in ('USDT', 'SOL')}
+
+
+def test_account_state_follows_paper_balances_without_reconcile(broker, market):
+    rest = SimpleNamespace(futures=False, fetch_balance=broker.fetch_balance)
+    account = AccountState(SimpleNamespace(rest=rest))
+    account.reconcile()
+    rest.fetch_balance = None  # Дальше — только события счёта
+    broker.account.add_listener(account.on_account_position)
+    broker.create_order('SOL/USDT', 'limit', 'buy', 2.0, 11.0)
+    broker.create_order('SOL/USDT', 'limit', 'buy', 1.0, 10.5)
+    assert account.available() == pytest.approx(broker.account.free['USDT'])
+    assert account.reserved() == pytest.approx(broker.account.used['USDT'])
+    assert account.total('SOL') == 12.0
+
+
+def test_insufficient_funds(broker):
+    with pytest.raises(ccxt.InsufficientFunds):
+        broker.create_order('SOL/USDT', 'limit', 'sell', 11.0, 11.0)
+    with pytest.raises(ccxt.InsufficientFunds):
+        broker.create_order('SOL/USDT', 'limit', 'buy', 100.0, 11.0)
+    assert balance(broker, 'SOL') == (10.0, 0.0) and balance(broker, 'USDT') == (1000.0, 0.0)
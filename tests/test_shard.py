@@ -0,0 +1,129 @@
+import queue
+import threading
+import numpy as np
+import pytest
+from config import Config
+from modules import shard
+from modules.data_handler import STATE_SYMBOL_FIELDS, DataHandler
+from modules.indicator_table import SharedIndicatorTable
+
+SYMBOLS = ['SOL/USDT', 'ARB/USDT', 'HBAR/USDT']
+BAR_MS = 300000
+
+
+@pytest.fixture(autouse=True)
+def config(monkeypatch, tmp_path):
+    monkeypatch.setattr(Config, 'SYMBOLS', list(SYMBOLS))
+    monkeypatch.setattr(Config, 'TIMEFRAME', '5m')
+    monkeypatch.setattr(Config, 'OHLCV_CACHE_DIR', None)
+    monkeypatch.setattr(Config, 'SYMBOL_PARAMS_FILE', str(tmp_path / 'symbol_params.json'))
+    monkeypatch.setattr(Config, 'REST_WEIGHT_USAGE', Config.REST_WEIGHT_USAGE)
+
+
+def captured_state():
+    """Снимок однопроцессного DataHandler со свечами, стаканом и фандингом всех пар"""
+    handler = DataHandler()
+    rng = np.random.default_rng(0)
+    for n, symbol in enumerate(SYMBOLS):
+        close = 10 * (n + 1) + np.cumsum(rng.normal(0, 0.1, 40))
+        for i, price in enumerate(close):
+            handler.on_kline(symbol, (i * BAR_MS, price, price + 0.1, price - 0.1, price, 5 + i),
+                             closed=True, allow_gap=True)
+        bids = [[round(close[-1] - 0.01 * (i + 1), 3), 1.0 + i] for i in range(10)]
+        asks = [[round(close[-1] + 0.01 * (i + 1), 3), 1.0 + i] for i in range(10)]
+        handler.load_order_book_snapshot(symbol, 1, bids, asks)
+        handler.set_funding_rate(symbol, 0.0001 * (n + 1))
+    handler.last_funding_update = 1000.0
+    return handler.capture_state()
+
+
+class FakeExchange:
+    """Exchange шарда без сети: запоминает, какие свечи были на момент запуска потоков"""
+    started_with = None
+
+    def __init__(self, data_handler):
+        FakeExchange.started_with = sorted(data_handler.ohlcv)
+        self.mailbox = self
+
+    def report(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.jobs = {}
+
+    def add_job(self, name, interval, func, run_immediately=True):
+        self.jobs[name] = func
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+def test_split_and_merge_state():
+    state = captured_state()
+    groups = shard.split_symbols(SYMBOLS, 2)
+    parts = [shard.split_state(state, symbols) for symbols in groups]
+    for part, symbols in zip(parts, groups):
+        for field in STATE_SYMBOL_FIELDS:
+            assert set(part[field]) <= set(symbols)
+    parts[1]['last_funding_update'] = 2000.0
+    merged = shard.merge_states(parts)
+    for field in STATE_SYMBOL_FIELDS:
+        assert merged[field].keys() == state[field].keys()
+    assert merged['timeframe'] == '5m' and merged['last_funding_update'] == 1000.0
+    assert shard.merge_states([])['ohlcv'] == {}
+
+
+def test_run_shard_restores_before_streaming(monkeypatch):
+    monkeypatch.setattr(shard, 'Exchange', FakeExchange)
+    monkeypatch.setattr(shard, 'Scheduler', FakeScheduler)
+    state = captured_state()
+    table = SharedIndicatorTable.create(SYMBOLS)
+    try:
+        groups = shard.split_symbols(SYMBOLS, 2)
+        stop = threading.Event()
+        stop.set()
+        states = queue.Queue()
+        shard.run_shard(1, groups[1], SYMBOLS, table.shm.name, 1.0, stop,
+                        state=shard.split_state(state, groups[1]), states=states)
+
+        assert FakeExchange.started_with == sorted(groups[1])
+        # Шард пишет только строки своих пар, метрики стакана до живого стакана не определены
+        for symbol in SYMBOLS:
+            row = table.row(symbol)
+            ema_short = row[table.INDEX['ema_short']]
+            if symbol in groups[1]:
+                assert ema_short == state['indicators'][symbol]['ema_short']
+                assert np.isnan(row[table.INDEX['ob_ratio']])
+            else:
+                assert table.versions[table.rows[symbol]] == 0 and np.isnan(ema_short)
+
+        # При остановке шард отдаёт снимок своих пар координатору
+        index, final = states.get_nowait()
+        assert index == 1 and final['ohlcv'].keys() == set(groups[1])
+        np.testing.assert_array_equal(final['ohlcv'][groups[1][0]].rows(),
+                                      state['ohlcv'][groups[1][0]].rows())
+    finally:
+        table.close()
+
+
+def test_pool_hands_out_and_collects_state(monkeypatch):
+    monkeypatch.setattr(Config, 'STATE_FILE', None)
+    pool = shard.ShardPool(SYMBOLS, shards=2)
+    try:
+        state = captured_state()
+        pool.restore_state(state)
+        assert set(pool.states[0]['ohlcv']) == set(pool.shards[0])
+        # До первых снимков от шардов сохраняется восстановленное состояние
+        collected = pool.capture_state()
+        for field in STATE_SYMBOL_FIELDS:
+            assert collected[field].keys() == state[field].keys()
+    finally:
+        pool.table.close()
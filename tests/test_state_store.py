@@ -0,0 +1,133 @@
+import math
+import os
+import time
+import numpy as np
+import pytest
+from config import Config
+from modules.data_handler import BOOK_INDICATORS, DataHandler
+from modules.state_store import StateStore
+
+SYMBOL = 'SOL/USDT'
+BAR_MS = 300000
+
+
+@pytest.fixture(autouse=True)
+def config(monkeypatch, tmp_path):
+    monkeypatch.setattr(Config, 'SYMBOLS', [SYMBOL, 'ARB/USDT'])
+    monkeypatch.setattr(Config, 'TIMEFRAME', '5m')
+    monkeypatch.setattr(Config, 'OHLCV_CACHE_DIR', None)
+    monkeypatch.setattr(Config, 'SYMBOL_PARAMS_FILE', str(tmp_path / 'symbol_params.json'))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return StateStore(path=str(tmp_path / 'state' / 'state.pkl'), interval=60)
+
+
+def filled_handler():
+    """DataHandler со свечами, стаканом и фандингом по SYMBOL"""
+    handler = DataHandler()
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(0, 0.5, 60))
+    for i, price in enumerate(close):
+        bar = (i * BAR_MS, price, price + 0.5, price - 0.5, price, 10 + i)
+        handler.on_kline(SYMBOL, bar, closed=i < len(close) - 1, allow_gap=True)
+    bids = [[round(close[-1] - 0.1 * (i + 1), 2), 1.0 + i] for i in range(20)]
+    asks = [[round(close[-1] + 0.1 * (i + 1), 2), 2.0 + i] for i in range(20)]
+    assert handler.load_order_book_snapshot(SYMBOL, 1, bids, asks)
+    handler.set_funding_rate(SYMBOL, 0.0002)
+    return handler
+
+
+def test_save_and_load(store, monkeypatch):
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, 'fsync', lambda fd: synced.append(fd) or real_fsync(fd))
+    store.save({'positions': {'SOL/USDT': 1}})
+    assert synced
+    assert not os.path.exists(store.path + '.tmp')
+    state, age = store.load()
+    assert state == {'positions': {'SOL/USDT': 1}}
+    assert 0 <= age < 5 and store.fresh(age)
+    assert store.saved == 1 and store.last_size == os.path.getsize(store.path)
+
+
+def test_failed_save_keeps_previous_snapshot(store):
+    store.save({'value': 1})
+    with pytest.raises(Exception):
+        store.save({'value': lambda: None})  # не сериализуется
+    assert store.load()[0] == {'value': 1}
+
+
+def test_missing_and_corrupt_files(store):
+    assert store.load() == (None, None)
+    os.makedirs(os.path.dirname(store.path))
+    with open(store.path, 'wb') as f:
+        f.write(b'not a pickle')
+    assert store.load() == (None, None)
+
+
+def test_stale_and_wrong_version_rejected(store, monkeypatch):
+    monkeypatch.setattr(time, 'time', lambda: 1000.0)
+    store.save({'value': 1})
+    monkeypatch.setattr(time, 'time', lambda: 1000.0 + Config.STATE_MAX_AGE + 1)
+    state, age = store.load()
+    assert state == {'value': 1} and not store.fresh(age)
+
+    monkeypatch.setattr(StateStore, 'VERSION', StateStore.VERSION + 1)
+    assert store.load() == (None, None)
+
+
+def test_background_thread_writes_on_request(store):
+    captured = []
+    store.start(lambda: captured.append(1) or {'count': len(captured)})
+    store.request()
+    store.stop()
+    assert store.saved >= 1
+    assert store.load()[0] == {'count': len(captured)}
+
+
+def test_restore_round_trip(store):
+    source = filled_handler()
+    store.save({'data': source.capture_state()})
+    state, _ = store.load()
+
+    target = DataHandler()
+    target.restore_state(state['data'])
+    np.testing.assert_array_equal(target.ohlcv[SYMBOL].rows(), source.ohlcv[SYMBOL].rows())
+    next_bar = (60 * BAR_MS, 101.0, 102.0, 100.0, 101.5, 50.0)
+    assert target.indicator_state[SYMBOL].push(next_bar) == source.indicator_state[SYMBOL].push(next_bar)
+    assert target.funding_rates[SYMBOL] == 0.0002
+    assert target.dynamic_order_book_settings == source.dynamic_order_book_settings
+    assert SYMBOL in target.order_book_stats and SYMBOL in target.book_history
+
+    # Метрики стакана снимка отброшены: до живого стакана они не определены
+    assert set(BOOK_INDICATORS) & set(source.indicators[SYMBOL])
+    indicators = target.indicators[SYMBOL]
+    assert not set(BOOK_INDICATORS) & set(indicators)
+    assert indicators['ema_short'] == source.indicators[SYMBOL]['ema_short']
+    row = target.indicator_table.row(SYMBOL)
+    assert all(math.isnan(row[index]) for name, index in target.indicator_table.INDEX.items()
+               if name in BOOK_INDICATORS)
+    assert not math.isnan(row[target.indicator_table.INDEX['ema_short']])
+    assert 'ARB/USDT' not in target.ohlcv
+
+
+def test_restore_skips_changed_periods(store, monkeypatch):
+    store.save({'data': filled_handler().capture_state()})
+    state, _ = store.load()
+    monkeypatch.setattr(Config, 'EMA_SHORT', Config.EMA_SHORT + 1)
+    target = DataHandler()
+    target.restore_state(state['data'])
+    # Свечи и состояние индикаторов с другими периодами не берутся, остальное восстанавливается
+    assert SYMBOL not in target.ohlcv and SYMBOL not in target.indicator_state
+    assert target.funding_rates[SYMBOL] == 0.0002
+
+
+def test_restore_skips_other_timeframe(store, monkeypatch):
+    store.save({'data': filled_handler().capture_state()})
+    state, _ = store.load()
+    monkeypatch.setattr(Config, 'TIMEFRAME', '1m')
+    target = DataHandler()
+    target.restore_state(state['data'])
+    assert not target.ohlcv and not target.funding_rates
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from benchmarks.bench_order_book_settings import generate_diffs, legacy_settings
+from modules.order_book import OrderBook
+from modules.streaming_stats import DecayingHistogram, OrderBookPercentiles
+
+PROBS = (0.10, 0.50, 0.90, 0.99)
+
+
+def test_live_values_give_their_percentiles():
+    # Значения, живущие всё окно, должны давать их собственные перцентили
+    values = np.random.default_rng(1).lognormal(3.0, 1.0, 5000)
+    hist = DecayingHistogram(window=50)
+    for value in values:
+        hist.add(value)
+    for _ in range(200):
+        hist.advance()
+    expected = np.percentile(values, [p * 100 for p in PROBS])
+    np.testing.assert_allclose(hist.quantiles(PROBS), expected, rtol=0.02)
+
+
+def test_observations_follow_known_distribution():
+    # Разовые наблюдения из лог-нормального распределения: квантили exp(mu + sigma*z)
+    rng = np.random.default_rng(2)
+    hist = DecayingHistogram(window=200)
+    for _ in range(2000):
+        for value in rng.lognormal(1.0, 0.5, 50):
+            hist.observe(value)
+        hist.advance()
+    z = np.array([-1.2816, 0.0, 1.2816, 2.3263])
+    np.testing.assert_allclose(hist.quantiles(PROBS), np.exp(1.0 + 0.5 * z), rtol=0.05)
+
+
+def test_old_regime_decays():
+    rng = np.random.default_rng(3)
+    hist = DecayingHistogram(window=20)
+    for scale in (1.0, 100.0):
+        for _ in range(300):
+            for value in rng.uniform(1, 2, 20) * scale:
+                hist.observe(value)
+            hist.advance()
+    low, high = hist.quantiles((0.01, 0.99))
+    assert 100 <= low and high <= 200 * 1.03
+
+
+def test_update_many_matches_add_remove():
+    rng = np.random.default_rng(4)
+    single = DecayingHistogram(window=30)
+    batch = DecayingHistogram(window=30)
+    live = []
+    for _ in range(100):
+        added = rng.lognormal(2.0, 1.0, 5)
+        removed = np.array(live[:3])
+        live = live[3:] + list(added)
+        for value in added:
+            single.add(value)
+        for value in removed:
+            single.remove(value)
+        batch.update_many(added, removed)
+        single.advance()
+        batch.advance()
+    np.testing.assert_allclose(batch.weights(), single.weights())
+    np.testing.assert_allclose(batch.quantiles(PROBS), single.quantiles(PROBS))
+
+
+def test_clear_live_drops_current_levels():
+    hist = DecayingHistogram(window=10)
+    hist.add(5.0)
+    hist.clear_live()
+    for _ in range(500):
+        hist.advance()
+    assert hist.weights().sum() == pytest.approx(0, abs=1e-9)
+    assert hist.quantiles((0.5,)) == [None]
+
+
+def test_order_book_thresholds_follow_windowed_percentiles():
+    window = 50
+    snapshot, diffs = generate_diffs(ticks=600, levels=100, changes_per_tick=10, seed=7)
+    legacy_book = OrderBook('TEST')
+    legacy_book.load_snapshot(*snapshot)
+    book = OrderBook('TEST')
+    stats = OrderBookPercentiles(window=window)
+    stats.update(book.load_snapshot(*snapshot))
+    history = []
+    errors = {'CLUSTER_THRESHOLD': [], 'WALL_THRESHOLD': [], 'RATIO_MIN': []}
+    for tick, diff in enumerate(diffs):
+        legacy_book.apply_diff(*diff)
+        expected = legacy_settings(history, legacy_book, depth=window)
+        actual = stats.update(book.apply_diff(*diff))
+        if tick < window:
+            continue
+        for key in errors:
+            errors[key].append(abs(actual[key] - expected[key]) / expected[key])
+    # Экспоненциальное окно отличается от прямоугольного, но пороги в среднем совпадают
+    assert np.median(errors['CLUSTER_THRESHOLD']) < 0.03
+    assert np.median(errors['WALL_THRESHOLD']) < 0.05
+    assert np.median(errors['RATIO_MIN']) < 0.08
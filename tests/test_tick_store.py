@@ -0,0 +1,118 @@
+import itertools
+import os
+import numpy as np
+import pytest
+from modules.tick_store import (
+    DEPTH_DTYPE, FLAG_EVENT_END, KLINE_DTYPE, SIDE_NONE,
+    RecordFile, TickRecorder, TickReplayer, day_of, read_records, shard_path,
+)
+
+BASE_TS = 1700000000000
+
+
+class FakeDataHandler:
+    """Точки входа DataHandler, записывающие вызовы по порядку"""
+    def __init__(self):
+        self.calls = []
+
+    def load_order_book_snapshot(self, symbol, last_update_id, bids, asks):
+        self.calls.append(('snapshot', symbol, last_update_id, bids, asks))
+
+    def apply_order_book_diff(self, symbol, first_id, last_id, prev_id, bids, asks):
+        self.calls.append(('diff', symbol, first_id, last_id, prev_id, bids, asks))
+
+    def on_kline(self, symbol, bar, closed, allow_gap=False):
+        self.calls.append(('kline', symbol, bar, closed, allow_gap))
+
+    def set_funding_rate(self, symbol, rate):
+        self.calls.append(('funding', symbol, rate))
+
+
+@pytest.fixture
+def recorder(tmp_path, monkeypatch):
+    clock = itertools.count(BASE_TS, 100)
+    monkeypatch.setattr(TickRecorder, '_now', staticmethod(lambda: next(clock)))
+    recorder = TickRecorder(root=str(tmp_path), flush_interval=0.01, max_queue=1000)
+    recorder.start()
+    yield recorder
+    recorder.stop()
+
+
+def test_replay_in_recorded_order(recorder, tmp_path):
+    symbol = 'BTC/USDT:USDT'
+    bar = (BASE_TS, 100.0, 101.0, 99.0, 100.5, 12.0)
+    recorder.record_depth(symbol, 0, 10, None, [(100.0, 1.0), (99.5, 2.0)], [(100.5, 3.0)], snapshot=True)
+    recorder.record_depth(symbol, 11, 12, 10, [(100.0, 0.0)], [])
+    recorder.record_kline(symbol, bar, False)
+    recorder.record_depth(symbol, 13, 13, 12, [], [])
+    recorder.record_funding(symbol, 0.0001)
+    recorder.record_depth(symbol, 14, 15, 13, [], [(100.5, 1.5), (101.0, 4.0)])
+    recorder.record_kline(symbol, bar, True)
+    recorder.stop()
+    assert recorder.written == 10 and recorder.dropped == 0
+
+    handler = FakeDataHandler()
+    count = TickReplayer(handler, root=str(tmp_path)).replay([symbol], [day_of(BASE_TS)])
+    assert count == 7
+    assert handler.calls == [
+        ('snapshot', symbol, 10, [(100.0, 1.0), (99.5, 2.0)], [(100.5, 3.0)]),
+        ('diff', symbol, 11, 12, 10, [(100.0, 0.0)], []),
+        ('kline', symbol, bar, False, True),
+        ('diff', symbol, 13, 13, 12, [], []),
+        ('funding', symbol, 0.0001),
+        ('diff', symbol, 14, 15, 13, [], [(100.5, 1.5), (101.0, 4.0)]),
+        ('kline', symbol, bar, True, True),
+    ]
+
+
+def test_event_end_groups_levels(recorder, tmp_path):
+    symbol = 'ETHUSDT'
+    recorder.record_depth(symbol, 1, 2, None, [(10.0, 1.0)], [(11.0, 1.0), (12.0, 2.0)])
+    recorder.record_depth(symbol, 3, 3, None, [], [])
+    recorder.record_depth(symbol, 4, 4, None, [(10.0, 0.0)], [])
+    recorder.stop()
+
+    records = read_records(shard_path(str(tmp_path), symbol, day_of(BASE_TS), 'depth'), 'depth')
+    ends = (records['flags'] & FLAG_EVENT_END) != 0
+    assert ends.tolist() == [False, False, True, True, True]
+    assert records['side'][3] == SIDE_NONE
+    assert records['prev_id'].tolist() == [-1] * 5
+    events = list(TickReplayer._depth_events(symbol, records))
+    assert [event[3][:3] for event in events] == [(1, 2, None), (3, 3, None), (4, 4, None)]
+    assert events[1][3][3:] == ([], [], False)
+
+
+def test_record_file_grows(tmp_path):
+    path = str(tmp_path / 'kline.bin')
+    record_file = RecordFile(path, KLINE_DTYPE, grow_records=4)
+    initial_size = os.path.getsize(path)
+    records = np.zeros(3, dtype=KLINE_DTYPE)
+    for i in range(5):
+        records['open_time'] = np.arange(3) + 3 * i
+        record_file.append(records)
+    record_file.close()
+    assert os.path.getsize(path) > initial_size
+
+    loaded = read_records(path, 'kline')
+    assert loaded['open_time'].tolist() == list(range(15))
+    # Повторное открытие продолжает запись после сохранённых записей
+    record_file = RecordFile(path, KLINE_DTYPE, grow_records=4)
+    assert record_file.count == 15
+    record_file.append(records[:1])
+    record_file.close()
+    assert len(read_records(path, 'kline')) == 16
+
+
+def test_incompatible_header_rejected(tmp_path):
+    path = str(tmp_path / 'depth.bin')
+    RecordFile(path, DEPTH_DTYPE).close()
+    with pytest.raises(ValueError):
+        RecordFile(path, KLINE_DTYPE)
+    with pytest.raises(ValueError):
+        read_records(path, 'kline')
+    with open(path, 'r+b') as f:
+        f.write(b'JUNK')
+    with pytest.raises(ValueError):
+        RecordFile(path, DEPTH_DTYPE)
+    with pytest.raises(ValueError):
+        read_records(path, 'depth')
@@ -0,0 +1,105 @@
+import random
+import pytest
+from config import Config
+from modules.position_monitor import PositionMonitor
+from modules.trigger_index import TriggerIndex
+
+
+def brute_triggered(positions, price):
+    fired = []
+    for position_id, (stop_loss, take_profit, _) in positions.items():
+        if price <= stop_loss:
+            fired.append((position_id, 'stop_loss'))
+        elif price >= take_profit:
+            fired.append((position_id, 'take_profit'))
+    return sorted(fired)
+
+
+def test_matches_brute_force():
+    rng = random.Random(3)
+    index = TriggerIndex()
+    positions = {}
+    reported = set()
+    now = 0.0
+    for step in range(2000):
+        action = rng.random()
+        if action < 0.4 or not positions:
+            # Цены на сетке, чтобы совпадения уровней и точные границы встречались часто
+            stop_loss = rng.randint(80, 99) / 2
+            take_profit = rng.randint(101, 120) / 2
+            deadline = now + rng.randint(1, 50)
+            positions[step] = (stop_loss, take_profit, deadline)
+            index.add(step, stop_loss, take_profit, deadline)
+        elif action < 0.6:
+            position_id = rng.choice(list(positions))
+            del positions[position_id]
+            assert index.remove(position_id)
+            assert not index.remove(position_id)
+        else:
+            price = rng.randint(78, 122) / 2
+            assert sorted(index.triggered(price)) == brute_triggered(positions, price)
+            now += rng.randint(0, 5)
+            expected = sorted(position_id for position_id, (_, _, deadline) in positions.items()
+                              if deadline <= now and position_id not in reported)
+            expired = index.expired(now)
+            assert sorted(position_id for position_id, _ in expired) == expected
+            assert all(status == 'timeout' for _, status in expired)
+            reported.update(expected)
+        assert len(index) == len(positions)
+        assert all(position_id in index for position_id in positions)
+
+
+def test_exact_boundaries():
+    index = TriggerIndex()
+    index.add('a', 95.0, 105.0, 10)
+    index.add('b', 95.0, 110.0, 10)
+    assert sorted(index.triggered(95.0)) == [('a', 'stop_loss'), ('b', 'stop_loss')]
+    assert index.triggered(95.01) == []
+    assert index.triggered(105.0) == [('a', 'take_profit')]
+    assert index.expired(9.99) == []
+    index.remove('b')
+    assert index.expired(10) == [('a', 'timeout')]
+
+
+class FakeExecutor:
+    def __init__(self):
+        self.closed = []
+
+    def close_position(self, position, on_failed=None):
+        self.closed.append(dict(position))
+
+
+@pytest.fixture
+def monitor():
+    return PositionMonitor(exchange=None, order_executor=FakeExecutor(), price_service=None)
+
+
+def position(symbol='SOL/USDT', size=1.0, entry_time=1000.0):
+    return {'symbol': symbol, 'entry_price': 100.0, 'stop_loss': 99.0, 'take_profit': 102.0,
+            'size': size, 'entry_time': entry_time}
+
+
+def test_increased_position_closes_with_full_size(monitor):
+    position_id = monitor.add_position(position(size=1.0))
+    assert monitor.increase_position(position_id, 0.5)
+    assert monitor.on_price('SOL/USDT', 100.0, now=1001.0) == []
+    assert monitor.on_price('SOL/USDT', 99.0, now=1001.0) == [(position_id, 'stop_loss')]
+    assert monitor.order_executor.closed[0]['size'] == 1.5
+    assert not monitor.has_position('SOL/USDT')
+    assert not monitor.increase_position(position_id, 0.5)
+
+
+def test_removed_position_does_not_fire(monitor):
+    position_id = monitor.add_position(position())
+    assert monitor.remove_position(position_id)['size'] == 1.0
+    assert monitor.on_price('SOL/USDT', 50.0, now=1e9) == []
+    assert monitor.order_executor.closed == []
+
+
+def test_timeout_and_other_symbols(monitor):
+    first = monitor.add_position(position())
+    monitor.add_position(position(symbol='ARB/USDT'))
+    deadline = 1000.0 + Config.POSITION_TIMEOUT
+    assert monitor.on_price('SOL/USDT', 100.0, now=deadline - 1) == []
+    assert monitor.on_price('SOL/USDT', None, now=deadline) == [(first, 'timeout')]
+    assert monitor.symbols_with_positions() == ['ARB/USDT']
@@ -0,0 +1,224 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils.logger import get_logger
+
+log = get_logger('Metrics')
+
+# ====================== Вспомогательные функции ======================
+TIMEFRAME_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+def timeframe_to_ms(timeframe):
+    """Длительность таймфрейма ('5m', '1h', ...) в миллисекундах"""
+    return int(timeframe[:-1]) * TIMEFRAME_UNITS[timeframe[-1]] * 1000
+
+
+# ====================== Метрики ======================
+class LatencyHistogram:
+    """HDR-гистограмма задержек в микросекундах.
+
+    Корзины лог-линейные: до 2 * 2^sub_bits мкс — по одной на микросекунду,
+    дальше на каждую степень двойки 2^sub_bits корзин, т.е. относительная
+    ошибка не больше 1 / 2^sub_bits (1.6% при sub_bits=6). Запись — O(1) без
+    блокировок: при одновременной записи из нескольких потоков может потеряться
+    единичный отсчёт, для мониторинга это допустимо.
+    """
+    def __init__(self, sub_bits=6, max_us=1 << 32):
+        self.sub_bits = sub_bits
+        self.sub_buckets = 1 << sub_bits
+        self.max_us = max_us
+        self.counts = [0] * self._index(max_us) + [0]
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def _index(self, value):
+        if value < 2 * self.sub_buckets:
+            return value
+        exponent = value.bit_length() - self.sub_bits - 1
+        return self.sub_buckets * exponent + (value >> exponent)
+
+    def _lower_bound(self, index):
+        if index < 2 * self.sub_buckets:
+            return index
+        exponent = index // self.sub_buckets - 1
+        return (index - self.sub_buckets * exponent) << exponent
+
+    def record(self, seconds):
+        """Задержка в секундах"""
+        value = int(seconds * 1e6)
+        if value < 0:
+            value = 0
+        elif value > self.max_us:
+            value = self.max_us
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentiles(self, quantiles):
+        """Значения (сек) для отсортированных квантилей; середина корзины"""
+        total = self.count
+        result = []
+        if not total:
+            return [None] * len(quantiles)
+        targets = iter(quantiles)
+        target = next(targets)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            while seen >= target * total and count:
+                low = self._lower_bound(index)
+                high = self._lower_bound(index + 1)
+                result.append(min((low + high) / 2e6, self.max))
+                target = next(targets, None)
+                if target is None:
+                    return result
+        return result + [self.max] * (len(quantiles) - len(result))
+
+
+class Counter:
+    """Монотонный счётчик"""
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+
+class Metrics:
+    """Реестр гистограмм и счётчиков с выгрузкой в текстовом формате Prometheus.
+
+    Метрика определяется именем и метками; объект лучше получить один раз и
+    записывать в него напрямую — так запись в горячем пути не ищет по словарю.
+    collectors — функции, возвращающие [(имя, тип, {метки}, значение)] для
+    значений, которые хранятся в других объектах (очереди, пулы).
+    """
+    QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.help = {}  # имя -> описание (# HELP)
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def _get(self, registry, factory, name, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = registry.get(key)
+        if metric is None:
+            with self._lock:
+                metric = registry.setdefault(key, factory())
+        return metric
+
+    def histogram(self, name, **labels):
+        return self._get(self.histograms, LatencyHistogram, name, labels)
+
+    def counter(self, name, **labels):
+        return self._get(self.counters, Counter, name, labels)
+
+    def observe(self, name, seconds, **labels):
+        self.histogram(name, **labels).record(seconds)
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        """Снимок всех метрик в формате Prometheus text exposition"""
+        lines = []
+        families = {}
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        for (name, labels), histogram in histograms:
+            families.setdefault(name, ('summary', []))[1].append((labels, histogram))
+        for (name, labels), counter in counters:
+            families.setdefault(name, ('counter', []))[1].append((labels, counter.value))
+        for collector in self.collectors:
+            try:
+                for name, kind, labels, value in collector():
+                    families.setdefault(name, (kind, []))[1].append((tuple(sorted(labels.items())), value))
+            except Exception as e:
+                log.error("Ошибка сборщика метрик: %s", e)
+
+        for name, (kind, samples) in families.items():
+            if name in self.help:
+                lines.append(f"# HELP {name} {self.help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if kind != 'summary':
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+                    continue
+                for quantile, seconds in zip(self.QUANTILES, value.percentiles(self.QUANTILES)):
+                    if seconds is not None:
+                        lines.append(f"{name}{format_labels(labels + (('quantile', quantile),))} {seconds:.6f}")
+                lines.append(f"{name}_sum{format_labels(labels)} {value.sum:.6f}")
+                lines.append(f"{name}_count{format_labels(labels)} {value.count}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Атомарная запись снимка в файл (для textfile-коллектора node_exporter)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+class MetricsServer:
+    """HTTP-эндпоинт /metrics для Prometheus в отдельном потоке"""
+    def __init__(self, registry, port, host='127.0.0.1'):
+        self.registry = registry
+        self.port = port
+        self.host = host
+        self._server = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        thread = threading.Thread(target=self._server.serve_forever, name='metrics-http')
+        thread.daemon = True
+        thread.start()
+        log.info("Метрики доступны на http://%s:%s/metrics", self.host, self.port)
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+
+# Общий реестр метрик процесса
+metrics = Metrics()
+metrics.help.update({
+    'stage_latency_seconds': 'Задержка этапа: ws_to_book, book_to_signal, signal_to_order, order_ack',
+    'rest_request_seconds': 'Длительность REST-запроса по эндпоинтам (без ожидания лимитера)',
+    'rest_errors_total': 'Ошибки REST-запросов по эндпоинтам',
+    'signals_total': 'Проверки условий входа по результату',
+    'orders_total': 'Отправленные ордера по результату',
+})
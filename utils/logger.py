@@ -0,0 +1,262 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from config import Config
+
+# ====================== Уровни ======================
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVELS = {'DEBUG': DEBUG, 'INFO': INFO, 'WARNING': WARNING, 'ERROR': ERROR}
+LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+
+
+def freeze(value):
+    """Копия изменяемых контейнеров на момент вызова: запись форматируется позже, в потоке записи"""
+    if isinstance(value, dict):
+        return {key: freeze(item) for key, item in value.items()}
+    if isinstance(value, (list, set, deque)):
+        return [freeze(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def json_default(value):
+    """numpy-скаляры и прочие объекты в JSON"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+# ====================== Фоновая запись ======================
+class LogWriter:
+    """Очередь записей и поток, который форматирует их и пишет JSON-строками.
+
+    Запись в очередь — deque.append без блокировок; при переполнении теряются
+    самые старые записи. Поток сбрасывает очередь каждые flush_interval секунд.
+    path=None — stdout (берётся в момент записи, чтобы работало перенаправление).
+    """
+    def __init__(self, path=None, queue_size=None, flush_interval=None):
+        self.path = path
+        self.queue_size = queue_size or Config.LOG_QUEUE_SIZE
+        self.flush_interval = flush_interval or Config.LOG_FLUSH_INTERVAL
+        self.dropped = 0
+        self._queue = deque(maxlen=self.queue_size)
+        self._file = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, record):
+        if self._pid != os.getpid():
+            # Первый вызов или дочерний процесс после fork: поток записи не унаследован
+            self._start()
+        if len(self._queue) >= self.queue_size:
+            self.dropped += 1
+        self._queue.append(record)
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='log-writer')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            stopping = self._stop.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                sys.stderr.write(f"[Logger] Ошибка записи лога: {e}\n")
+            if stopping:
+                return
+
+    def flush(self):
+        if not self._queue:
+            return
+        lines = []
+        while self._queue:
+            try:
+                lines.append(self.format(self._queue.popleft()))
+            except IndexError:
+                break
+            except Exception as e:
+                lines.append(json.dumps({'level': 'ERROR', 'module': 'Logger', 'msg': f"Ошибка форматирования: {e}"}))
+        if self.dropped:
+            lines.append(json.dumps({'ts': round(time.time(), 3), 'level': 'WARNING', 'module': 'Logger',
+                                     'msg': 'Очередь лога переполнена', 'dropped': self.dropped}))
+            self.dropped = 0
+        stream = self._stream()
+        stream.write('\n'.join(lines) + '\n')
+        stream.flush()
+
+    def _stream(self):
+        if self.path is None:
+            return sys.stdout
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        return self._file
+
+    @staticmethod
+    def format(record):
+        """Форматирование выполняется здесь, в потоке записи, а не в вызывающем"""
+        timestamp, level, module, msg, args, fields = record
+        if args:
+            msg = msg % args
+        entry = {'ts': round(timestamp, 3), 'level': LEVEL_NAMES[level], 'module': module, 'msg': msg}
+        if fields:
+            entry.update(fields)
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'), default=json_default)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class NullWriter:
+    """Писатель, который отбрасывает записи (тесты)"""
+    dropped = 0
+
+    def put(self, record):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# ====================== Логгер модуля ======================
+class Logger:
+    """Логгер модуля с уровнем, выборкой и ограничением частоты.
+
+    Сообщение форматируется лениво ('%s'-аргументы и поля подставляются в потоке
+    записи; изменяемые контейнеры в них копируются при постановке в очередь);
+    отключённый уровень стоит одно сравнение. sample=N оставляет каждую
+    N-ю запись, rate — не больше rate записей в секунду (token bucket), число
+    подавленных записей попадает в поле suppressed следующей записи.
+    """
+    def __init__(self, name, writer, level=INFO, sample=1, rate=None):
+        self.name = name
+        self.writer = writer
+        self.level = level
+        self.sample = sample
+        self.rate = rate
+        self._seen = 0
+        self._tokens = rate or 0.0
+        self._updated = time.monotonic()
+        self._suppressed = 0
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def debug(self, msg, *args, **fields):
+        if DEBUG >= self.level:
+            self._log(DEBUG, msg, args, fields)
+
+    def info(self, msg, *args, **fields):
+        if INFO >= self.level:
+            self._log(INFO, msg, args, fields)
+
+    def warning(self, msg, *args, **fields):
+        if WARNING >= self.level:
+            self._log(WARNING, msg, args, fields)
+
+    def error(self, msg, *args, **fields):
+        if ERROR >= self.level:
+            self._log(ERROR, msg, args, fields)
+
+    def _log(self, level, msg, args, fields):
+        if self.sample > 1:
+            self._seen += 1
+            if self._seen % self.sample:
+                return
+        if self.rate is not None and level < ERROR:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                self._suppressed += 1
+                return
+            self._tokens -= 1
+        if args:
+            args = freeze(args)
+        for key, value in fields.items():
+            if isinstance(value, (dict, list, set, deque, tuple)):
+                fields[key] = freeze(value)
+        if self._suppressed:
+            fields['suppressed'] = self._suppressed
+            self._suppressed = 0
+        self.writer.put((time.time(), level, self.name, msg, args, fields))
+
+
+_writer = None
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        _writer = LogWriter(Config.LOG_FILE)
+        atexit.register(_writer.close)
+    return _writer
+
+
+def set_writer(writer):
+    """Замена писателя у всех логгеров, в том числе созданных позже (NullWriter — без вывода)"""
+    global _writer
+    with _loggers_lock:
+        _writer = writer
+        for logger in _loggers.values():
+            logger.writer = writer
+
+
+def get_logger(name):
+    """Логгер модуля; уровень, выборка и лимит — из Config.LOG_MODULES[name] или общих настроек"""
+    with _loggers_lock:
+        logger = _loggers.get(name)
+        if logger is None:
+            settings = Config.LOG_MODULES.get(name, {})
+            logger = Logger(
+                name,
+                get_writer(),
+                level=LEVELS[settings.get('level', Config.LOG_LEVEL)],
+                sample=settings.get('sample', 1),
+                rate=settings.get('rate', Config.LOG_RATE_LIMIT)
+            )
+            _loggers[name] = logger
+        return logger
+
+
+def set_level(name, level):
+    """Смена уровня модуля на лету ('DEBUG', 'INFO', ...)"""
+    get_logger(name).level = LEVELS[level]
+
+
+def set_default_level(level):
+    """Смена общего уровня: для созданных и будущих логгеров без своего уровня в Config.LOG_MODULES"""
+    Config.LOG_LEVEL = level
+    with _loggers_lock:
+        for name, logger in _loggers.items():
+            if 'level' not in Config.LOG_MODULES.get(name, {}):
+                logger.level = LEVELS[level]